@@ -1,4 +1,4 @@
-from passlib.context import CryptContext
+from functools import lru_cache
 from fastapi.security import OAuth2PasswordBearer
 from datetime import datetime, timedelta, timezone
 import jwt
@@ -11,8 +11,16 @@ from app.config import SECRET_KEY, ALGORITHM
 from app.db_depends import get_async_db
 
 
-# Создаём контекст для хеширования с использованием bcrypt
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+@lru_cache(maxsize=1)
+def get_pwd_context():
+    """
+    Контекст для хеширования с использованием bcrypt.
+    passlib загружается при первом обращении, а не при импорте: воркерам каталога он не нужен.
+    """
+    from passlib.context import CryptContext
+
+    return CryptContext(schemes=["bcrypt"], deprecated="auto")
+
 
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 REFRESH_TOKEN_EXPIRE_DAYS = 7
@@ -23,14 +31,14 @@ def hash_password(password: str) -> str:
     """
     Преобразует пароль в хеш с использованием bcrypt.
     """
-    return pwd_context.hash(password)
+    return get_pwd_context().hash(password)
 
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """
     Проверяет, соответствует ли введённый пароль сохранённому хешу.
     """
-    return pwd_context.verify(plain_password, hashed_password)
+    return get_pwd_context().verify(plain_password, hashed_password)
 
 
 def create_access_token(data: dict):
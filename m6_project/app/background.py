@@ -0,0 +1,205 @@
+import asyncio
+import logging
+import random
+from collections import defaultdict
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass, field
+from time import monotonic
+from typing import Any
+
+from app.config import (
+    BACKGROUND_DRAIN_TIMEOUT, BACKGROUND_MAX_RETRIES, BACKGROUND_QUEUE_SIZE, BACKGROUND_RETRY_DELAY,
+    BACKGROUND_WORKERS,
+)
+
+
+logger = logging.getLogger("app.background")
+
+# Предел задержки между повторами, секунды
+RETRY_MAX_DELAY = 30.0
+
+
+@dataclass
+class BackgroundTask:
+    name: str
+    func: Callable[..., Awaitable[Any]]
+    args: tuple
+    kwargs: dict
+    enqueued_at: float = field(default_factory=monotonic)
+    attempt: int = 0
+
+
+@dataclass
+class RunnerStats:
+    """
+    Счётчики по имени задачи. Обновляются из потока event loop, поэтому без блокировок.
+    """
+    submitted: dict[str, int] = field(default_factory=lambda: defaultdict(int))
+    completed: dict[str, int] = field(default_factory=lambda: defaultdict(int))
+    retried: dict[str, int] = field(default_factory=lambda: defaultdict(int))
+    failed: dict[str, int] = field(default_factory=lambda: defaultdict(int))
+    dropped: dict[str, int] = field(default_factory=lambda: defaultdict(int))
+    lag_total: float = 0.0  # сумма ожиданий в очереди от постановки до старта попытки
+    lag_count: int = 0
+    lag_max: float = 0.0
+
+    def record_lag(self, lag: float) -> None:
+        self.lag_total += lag
+        self.lag_count += 1
+        self.lag_max = max(self.lag_max, lag)
+
+
+class TaskRunner:
+    """
+    Очередь второстепенной работы после commit (инвалидация кэшей, уведомления): ответ
+    не ждёт её выполнения. Ограниченная очередь, несколько воркеров, повторы с экспоненциальной
+    задержкой и дожидание очереди при остановке. Задачи живут только в памяти процесса —
+    то, что нельзя потерять при падении воркера, сюда не ставится.
+    """
+
+    def __init__(self, workers: int, queue_size: int, max_retries: int, retry_delay: float):
+        self.workers = workers
+        self.queue_size = queue_size
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.stats = RunnerStats()
+        self._queue: asyncio.Queue[BackgroundTask] | None = None
+        self._workers: list[asyncio.Task] = []
+        self._retries: set[asyncio.Task] = set()
+        self._running = 0
+        self._closed = False
+
+    def _ensure_started(self) -> asyncio.Queue[BackgroundTask]:
+        # Без lifespan (скрипты, тестовые клиенты) воркеры поднимаются при первой задаче
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=self.queue_size)
+            self._closed = False
+            self._workers = [
+                asyncio.create_task(self._worker(), name=f"background-worker-{index}")
+                for index in range(self.workers)
+            ]
+        return self._queue
+
+    def start(self) -> None:
+        self._ensure_started()
+
+    def submit(self, name: str, func: Callable[..., Awaitable[Any]], *args, **kwargs) -> bool:
+        """
+        Ставит задачу в очередь. Возвращает False, если очередь переполнена или воркер
+        останавливается — задача отбрасывается, а не замедляет запрос.
+        """
+        if self._closed:
+            self.stats.dropped[name] += 1
+            logger.warning("Background task %s dropped: runner is shutting down", name)
+            return False
+        queue = self._ensure_started()
+        try:
+            queue.put_nowait(BackgroundTask(name, func, args, kwargs))
+        except asyncio.QueueFull:
+            self.stats.dropped[name] += 1
+            logger.warning("Background task %s dropped: queue is full (%s)", name, self.queue_size)
+            return False
+        self.stats.submitted[name] += 1
+        return True
+
+    async def _worker(self) -> None:
+        queue = self._queue
+        while True:
+            task = await queue.get()
+            self._running += 1
+            self.stats.record_lag(monotonic() - task.enqueued_at)
+            try:
+                await task.func(*task.args, **task.kwargs)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                self._retry_or_fail(task)
+            else:
+                self.stats.completed[task.name] += 1
+            finally:
+                self._running -= 1
+                queue.task_done()
+
+    def _retry_or_fail(self, task: BackgroundTask) -> None:
+        if task.attempt >= self.max_retries:
+            self.stats.failed[task.name] += 1
+            logger.error("Background task %s failed after %s attempts", task.name, task.attempt + 1, exc_info=True)
+            return
+        task.attempt += 1
+        self.stats.retried[task.name] += 1
+        # Экспоненциальная задержка с джиттером, чтобы воркеры не повторяли синхронно
+        delay = min(self.retry_delay * 2 ** (task.attempt - 1), RETRY_MAX_DELAY) * random.uniform(0.5, 1.0)
+        logger.warning("Background task %s failed, retry %s in %.2f s", task.name, task.attempt, delay, exc_info=True)
+        retry = asyncio.create_task(self._requeue(task, delay))
+        self._retries.add(retry)
+        retry.add_done_callback(self._retries.discard)
+
+    async def _requeue(self, task: BackgroundTask, delay: float) -> None:
+        await asyncio.sleep(delay)
+        task.enqueued_at = monotonic()
+        await self._queue.put(task)
+
+    async def drain(self, timeout: float = BACKGROUND_DRAIN_TIMEOUT) -> None:
+        """
+        Перестаёт принимать задачи и ждёт (не дольше timeout) выполнения очереди и отложенных повторов.
+        """
+        if self._queue is None:
+            return
+        self._closed = True
+        queue = self._queue
+
+        async def wait_all() -> None:
+            while self._retries or queue.qsize() or self._running:
+                if self._retries:
+                    await asyncio.gather(*self._retries, return_exceptions=True)
+                await queue.join()
+
+        try:
+            await asyncio.wait_for(wait_all(), timeout=timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Shutdown: %s background tasks not finished in %.1f s", self.depth(), timeout)
+        for task in [*self._workers, *self._retries]:
+            task.cancel()
+        await asyncio.gather(*self._workers, *self._retries, return_exceptions=True)
+        self._workers = []
+        self._queue = None
+
+    def depth(self) -> int:
+        return (self._queue.qsize() if self._queue is not None else 0) + len(self._retries)
+
+    def prometheus_lines(self) -> list[str]:
+        """
+        Метрики очереди для /metrics.
+        """
+        stats = self.stats
+        lines = [
+            "# TYPE background_queue_depth gauge",
+            f"background_queue_depth {self.depth()}",
+            "# TYPE background_tasks_running gauge",
+            f"background_tasks_running {self._running}",
+            "# TYPE background_queue_lag_seconds summary",
+            f"background_queue_lag_seconds_sum {stats.lag_total:.6f}",
+            f"background_queue_lag_seconds_count {stats.lag_count}",
+            "# TYPE background_queue_lag_seconds_max gauge",
+            f"background_queue_lag_seconds_max {stats.lag_max:.6f}",
+            "# TYPE background_tasks_total counter",
+        ]
+        for kind in ("submitted", "completed", "retried", "failed", "dropped"):
+            for name, value in getattr(stats, kind).items():
+                lines.append(f'background_tasks_total{{task="{name}",result="{kind}"}} {value}')
+        return lines
+
+
+runner = TaskRunner(
+    workers=BACKGROUND_WORKERS,
+    queue_size=BACKGROUND_QUEUE_SIZE,
+    max_retries=BACKGROUND_MAX_RETRIES,
+    retry_delay=BACKGROUND_RETRY_DELAY,
+)
+
+
+def submit(name: str, func: Callable[..., Awaitable[Any]], *args, **kwargs) -> bool:
+    """
+    Ставит второстепенную работу в фоновую очередь воркера. Вызывать после успешного commit.
+    """
+    return runner.submit(name, func, *args, **kwargs)
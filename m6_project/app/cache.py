@@ -0,0 +1,154 @@
+from collections import OrderedDict, defaultdict
+from collections.abc import Callable, Hashable, Iterable
+from time import monotonic
+from typing import Any
+
+
+class LocalCache:
+    """
+    LRU-кэш в памяти воркера с TTL записей. Актуальность между воркерами
+    поддерживает шина инвалидации (app/invalidation.py), TTL — страховка на случай её сбоя.
+    """
+
+    def __init__(self, namespace: str, maxsize: int, ttl: float):
+        self.namespace = namespace
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        # Версия ключа — пара (поколение кэша, поколение ключа): результат запроса, начатого до инвалидации
+        # ключа, в кэш не попадёт, а инвалидация одного ключа не мешает кэшировать остальные
+        self._generation = 0  # растёт при clear()
+        self._cleared_at = float("-inf")
+        # Поколение ключа растёт при evict(), рядом — время последней инвалидации
+        self._key_generations: dict[Hashable, tuple[int, float]] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable) -> Any | None:
+        entry = self._data.get(key)
+        if entry is None or entry[0] < monotonic():
+            if entry is not None:
+                del self._data[key]
+            self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def version(self, key: Hashable) -> tuple[int, int]:
+        return self._generation, self._key_generations.get(key, (0, 0.0))[0]
+
+    def invalidated_within(self, key: Hashable, seconds: float) -> bool:
+        """
+        Инвалидировали ли ключ (или весь кэш) за последние seconds секунд.
+        """
+        invalidated_at = self._key_generations.get(key, (0, self._cleared_at))[1]
+        return monotonic() - max(invalidated_at, self._cleared_at) < seconds
+
+    def set(self, key: Hashable, value: Any, version: tuple[int, int] | None = None) -> None:
+        """
+        Сохраняет значение. version — self.version(key) на момент начала запроса к БД:
+        если с тех пор ключ инвалидировали, значение могло устареть и не сохраняется.
+        """
+        if version is not None and version != self.version(key):
+            return
+        self._data[key] = (monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def evict(self, keys: Iterable[Hashable]) -> None:
+        now = monotonic()
+        for key in keys:
+            self._key_generations[key] = (self.version(key)[1] + 1, now)
+            if self._data.pop(key, None) is not None:
+                self.evictions += 1
+        if len(self._key_generations) > self.maxsize:
+            # Поколения ключей нельзя просто забыть (версия вернулась бы к прежней) — начинаем новое поколение кэша
+            self._start_generation()
+
+    def _start_generation(self) -> None:
+        self._generation += 1
+        self._cleared_at = monotonic()
+        self._key_generations.clear()
+
+    def clear(self) -> None:
+        self._start_generation()
+        self.evictions += len(self._data)
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+# Все кэши воркера по пространствам имён: products, categories, users
+_caches: dict[str, LocalCache] = {}
+# Прочие кэши, зависящие от пространства имён (например, кэш ответов): получают keys или None.
+# Пространство может не иметь своего LocalCache — как "catalog" у списков товаров
+_subscribers: dict[str, list[Callable[[list | None], None]]] = defaultdict(list)
+
+
+def register_cache(namespace: str, maxsize: int, ttl: float) -> LocalCache:
+    """
+    Создаёт кэш пространства имён (или возвращает уже созданный).
+    """
+    cache = _caches.get(namespace)
+    if cache is None:
+        cache = _caches[namespace] = LocalCache(namespace, maxsize, ttl)
+    return cache
+
+
+def subscribe(namespace: str, callback: Callable[[list | None], None]) -> None:
+    """
+    Подписывает кэш другого вида на инвалидацию пространства имён.
+    """
+    _subscribers[namespace].append(callback)
+
+
+def is_registered(namespace: str) -> bool:
+    return namespace in _caches or namespace in _subscribers
+
+
+def evict(namespace: str, keys: Iterable[Hashable] | None) -> None:
+    """
+    Удаляет ключи из кэшей пространства имён; keys=None — очищает их целиком.
+    """
+    keys = None if keys is None else list(keys)
+    cache = _caches.get(namespace)
+    if cache is not None:
+        if keys is None:
+            cache.clear()
+        else:
+            cache.evict(keys)
+    for callback in _subscribers.get(namespace, ()):
+        callback(keys)
+
+
+def flush_all() -> None:
+    """
+    Очищает все кэши воркера, например когда часть событий инвалидации могла быть потеряна.
+    """
+    for cache in _caches.values():
+        cache.clear()
+    for callbacks in _subscribers.values():
+        for callback in callbacks:
+            callback(None)
+
+
+def prometheus_lines() -> list[str]:
+    """
+    Метрики кэшей для /metrics.
+    """
+    families = (
+        ("local_cache_entries", "gauge", len),
+        ("local_cache_hits_total", "counter", lambda cache: cache.hits),
+        ("local_cache_misses_total", "counter", lambda cache: cache.misses),
+        ("local_cache_evictions_total", "counter", lambda cache: cache.evictions),
+    )
+    lines = []
+    for metric, kind, value in families:
+        lines.append(f"# TYPE {metric} {kind}")
+        for namespace, cache in _caches.items():
+            lines.append(f'{metric}{{namespace="{namespace}"}} {value(cache)}')
+    return lines
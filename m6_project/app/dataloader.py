@@ -0,0 +1,151 @@
+import asyncio
+from collections.abc import Awaitable, Callable, Hashable, Iterable
+from dataclasses import dataclass
+from typing import Any
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.products import Product as ProductModel
+
+
+BatchFn = Callable[[AsyncSession, list], Awaitable[dict[Hashable, Any]]]
+
+
+@dataclass
+class LoaderStats:
+    """
+    Счётчики загрузчика по всем запросам воркера.
+    """
+    calls: int = 0  # вызовы load() и load_many()
+    loads: int = 0  # запрошенные ключи, включая ключи load_many()
+    cache_hits: int = 0  # ответ из кэша загрузчика без запроса к БД
+    keys_fetched: int = 0
+    queries: int = 0
+
+    @property
+    def queries_saved(self) -> int:
+        # Без загрузчика каждый вызов был бы одним запросом (load_many — тоже одним, с IN),
+        # так что экономия — только ответы из кэша и вызовы, объединённые в общий запрос
+        return self.calls - self.queries
+
+
+_stats: dict[str, LoaderStats] = {}
+
+
+class DataLoader:
+    """
+    Загрузчик строк по ключу в рамках одной сессии (одного запроса): обращения за один проход
+    event loop собираются в один запрос с IN, а результат запоминается до конца сессии.
+    Отсутствующий ключ даёт None.
+    """
+
+    def __init__(self, name: str, db: AsyncSession, batch_fn: BatchFn, lock: asyncio.Lock):
+        self.name = name
+        self.stats = _stats.setdefault(name, LoaderStats())
+        self._db = db
+        self._batch_fn = batch_fn
+        # Одна AsyncSession не выполняет запросы параллельно — загрузчики сессии ходят в БД по очереди
+        self._lock = lock
+        self._futures: dict[Hashable, asyncio.Future] = {}
+        self._pending: list[Hashable] = []
+        self._tasks: set[asyncio.Task] = set()
+
+    def load(self, key: Hashable) -> Awaitable[Any]:
+        self.stats.calls += 1
+        return self._load(key)
+
+    def _load(self, key: Hashable) -> Awaitable[Any]:
+        self.stats.loads += 1
+        future = self._futures.get(key)
+        if future is not None:
+            self.stats.cache_hits += 1
+            return future
+        loop = asyncio.get_running_loop()
+        future = self._futures[key] = loop.create_future()
+        if not self._pending:
+            loop.call_soon(self._dispatch)
+        self._pending.append(key)
+        return future
+
+    async def load_many(self, keys: Iterable[Hashable]) -> list[Any]:
+        self.stats.calls += 1
+        return list(await asyncio.gather(*(self._load(key) for key in keys)))
+
+    def prime(self, key: Hashable, value: Any) -> None:
+        """
+        Запоминает уже загруженную строку, чтобы следующие load(key) не ходили в БД.
+        """
+        if key not in self._futures:
+            future = self._futures[key] = asyncio.get_running_loop().create_future()
+            future.set_result(value)
+
+    def _dispatch(self) -> None:
+        keys, self._pending = self._pending, []
+        task = asyncio.create_task(self._fetch(keys))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _fetch(self, keys: list[Hashable]) -> None:
+        try:
+            async with self._lock:
+                rows = await self._batch_fn(self._db, keys)
+        except asyncio.CancelledError:
+            for key in keys:
+                self._futures.pop(key).cancel()
+            raise
+        except Exception as exc:
+            # Ошибку получают ожидающие; ключи забываем, чтобы следующий load() попробовал снова
+            for key in keys:
+                future = self._futures.pop(key)
+                if not future.done():
+                    future.set_exception(exc)
+                    future.exception()
+            return
+        self.stats.queries += 1
+        self.stats.keys_fetched += len(keys)
+        for key in keys:
+            future = self._futures[key]
+            if not future.done():
+                future.set_result(rows.get(key))
+
+
+async def _products_by_id(db: AsyncSession, ids: list[int]) -> dict[int, ProductModel]:
+    result = await db.scalars(select(ProductModel).where(ProductModel.id.in_(ids)))
+    return {product.id: product for product in result}
+
+
+def _loader(db: AsyncSession, name: str, batch_fn: BatchFn) -> DataLoader:
+    # Загрузчики живут в info сессии, а сессия создаётся на запрос (см. app/db_depends.py)
+    info = db.info
+    loaders = info.setdefault("dataloaders", {})
+    loader = loaders.get(name)
+    if loader is None:
+        lock = info.setdefault("dataloader_lock", asyncio.Lock())
+        loader = loaders[name] = DataLoader(name, db, batch_fn, lock)
+    return loader
+
+
+def product_loader(db: AsyncSession) -> DataLoader:
+    """
+    Товары по id (включая неактивные — проверку is_active делает вызывающий код).
+    """
+    return _loader(db, "products", _products_by_id)
+
+def prometheus_lines() -> list[str]:
+    """
+    Метрики загрузчиков для /metrics.
+    """
+    families = (
+        ("dataloader_calls_total", lambda stats: stats.calls),
+        ("dataloader_loads_total", lambda stats: stats.loads),
+        ("dataloader_cache_hits_total", lambda stats: stats.cache_hits),
+        ("dataloader_queries_total", lambda stats: stats.queries),
+        ("dataloader_queries_saved_total", lambda stats: stats.queries_saved),
+    )
+    lines = []
+    for metric, value in families:
+        lines.append(f"# TYPE {metric} counter")
+        for name, stats in _stats.items():
+            lines.append(f'{metric}{{loader="{name}"}} {value(stats)}')
+    return lines
@@ -1,10 +1,88 @@
 from collections.abc import AsyncGenerator
-from sqlalchemy.ext.asyncio import AsyncSession
-from app.database import async_session_maker
+from fastapi import Request
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from sqlalchemy.orm import Session
 
-async def get_async_db() -> AsyncGenerator[AsyncSession, None]:
+from app.database import async_read_session_maker, async_session_maker
+from app.db_metrics import session_stats
+from app.metrics import is_warmup
+
+
+@event.listens_for(Session, "after_begin")
+def _mark_connection_used(session, transaction, connection):
+    session.info["connection_used"] = True
+
+
+class LazySession:
+    """
+    Ленивая обёртка над AsyncSession с тем же интерфейсом.
+    Сессия создаётся при первом обращении, а соединение из пула берётся только при первом запросе к БД,
+    поэтому ответы из кэша и отказы валидации не занимают пул.
+    """
+    __slots__ = ("_session_maker", "_session", "_request_state")
+
+    def __init__(self, session_maker: async_sessionmaker[AsyncSession], request_state: dict):
+        self._session_maker = session_maker
+        self._session: AsyncSession | None = None
+        self._request_state = request_state
+
+    @property
+    def session(self) -> AsyncSession:
+        if self._session is None:
+            self._session = self._session_maker()
+        return self._session
+
+    def __getattr__(self, name: str):
+        return getattr(self.session, name)
+
+    async def release(self) -> None:
+        """
+        Закрывает сессию (если она создавалась) и возвращает соединение в пул.
+        """
+        session, self._session = self._session, None
+        if session is None:
+            return
+        if not self._request_state["counted"]:
+            await session.close()
+            return
+        session_stats.sessions_opened += 1
+        if session.sync_session.info.get("connection_used") and not self._request_state["connection_used"]:
+            self._request_state["connection_used"] = True
+            session_stats.connections_used += 1
+        await session.close()
+
+
+async def _lazy_session(
+    request: Request, session_maker: async_sessionmaker[AsyncSession]
+) -> AsyncGenerator[LazySession, None]:
+    # Запрос может получить несколько сессий (get_read_db в обработчике и get_async_db в get_current_user),
+    # а счётчики запросов и взятых соединений ведутся по запросу — состояние общее в scope
+    request_state = request.scope.get("db_session_stats")
+    if request_state is None:
+        counted = not is_warmup(request.scope)
+        request_state = request.scope["db_session_stats"] = {"counted": counted, "connection_used": False}
+        session_stats.requests += counted
+    lazy = LazySession(session_maker, request_state)
+    try:
+        yield lazy
+    finally:
+        await lazy.release()
+
+
+async def get_async_db(request: Request) -> AsyncGenerator[LazySession, None]:
     """
     Предоставляет асинхронную сессию SQLAlchemy для работы с базой данных PostgreSQL.
+    Соединение из пула берётся только при первом запросе к БД.
+    """
+    async for session in _lazy_session(request, async_session_maker):
+        yield session
+
+
+async def get_read_db(request: Request) -> AsyncGenerator[LazySession, None]:
+    """
+    Предоставляет сессию для read-only обработчиков: идёт в реплику, если она настроена.
+    Не использовать там, где нужно прочитать только что записанные данные.
     """
-    async with async_session_maker() as session:
-        yield session
\ No newline at end of file
+    async for session in _lazy_session(request, async_read_session_maker):
+        yield session
@@ -0,0 +1,155 @@
+from dataclasses import dataclass
+from time import perf_counter
+
+from sqlalchemy import event, exc
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+
+@dataclass
+class PoolStats:
+    """
+    Счётчики пула одного движка. Обновляются из потока event loop, поэтому без блокировок.
+    """
+    name: str
+    checkouts: int = 0
+    checkout_wait_total: float = 0.0
+    checkout_wait_max: float = 0.0
+    checkout_timeouts: int = 0
+    connects: int = 0
+    connect_time_total: float = 0.0
+    connect_time_max: float = 0.0
+
+    def record_checkout(self, wait: float) -> None:
+        self.checkouts += 1
+        self.checkout_wait_total += wait
+        self.checkout_wait_max = max(self.checkout_wait_max, wait)
+
+    def record_connect(self, duration: float) -> None:
+        self.connects += 1
+        self.connect_time_total += duration
+        self.connect_time_max = max(self.connect_time_max, duration)
+
+
+class InstrumentedAsyncPool(AsyncAdaptedQueuePool):
+    """
+    Очередь соединений, замеряющая время ожидания checkout (включая открытие новых соединений).
+    """
+    stats: PoolStats | None = None
+
+    def _do_get(self):
+        start = perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            if self.stats is not None:
+                self.stats.checkout_timeouts += 1
+            raise
+        finally:
+            if self.stats is not None:
+                self.stats.record_checkout(perf_counter() - start)
+
+    def recreate(self):
+        # dispose() пересоздаёт пул — счётчики переносим в новый экземпляр
+        pool = super().recreate()
+        pool.stats = self.stats
+        return pool
+
+
+_engines: dict[str, tuple[AsyncEngine, PoolStats]] = {}
+
+
+def instrument_engine(engine: AsyncEngine, name: str) -> PoolStats:
+    """
+    Подключает сбор статистики пула и времени установки соединений к движку.
+    """
+    stats = PoolStats(name=name)
+    if isinstance(engine.pool, InstrumentedAsyncPool):
+        engine.pool.stats = stats
+
+    @event.listens_for(engine.sync_engine, "do_connect")
+    def _timed_connect(dialect, conn_rec, cargs, cparams):
+        start = perf_counter()
+        connection = dialect.connect(*cargs, **cparams)
+        stats.record_connect(perf_counter() - start)
+        return connection
+
+    _engines[name] = (engine, stats)
+    return stats
+
+
+def pool_snapshot() -> dict[str, dict]:
+    """
+    Текущее состояние пулов всех инструментированных движков.
+    """
+    snapshot = {}
+    for name, (engine, stats) in _engines.items():
+        pool = engine.pool
+        snapshot[name] = {
+            "pool_class": type(pool).__name__,
+            "size": pool.size() if hasattr(pool, "size") else None,
+            "checked_in": pool.checkedin() if hasattr(pool, "checkedin") else None,
+            "checked_out": pool.checkedout() if hasattr(pool, "checkedout") else None,
+            "overflow": pool.overflow() if hasattr(pool, "overflow") else None,
+            "checkouts": stats.checkouts,
+            "checkout_wait_avg_ms": round(stats.checkout_wait_total / stats.checkouts * 1000, 3)
+            if stats.checkouts else 0.0,
+            "checkout_wait_max_ms": round(stats.checkout_wait_max * 1000, 3),
+            "checkout_timeouts": stats.checkout_timeouts,
+            "connects": stats.connects,
+            "connect_avg_ms": round(stats.connect_time_total / stats.connects * 1000, 3)
+            if stats.connects else 0.0,
+            "connect_max_ms": round(stats.connect_time_max * 1000, 3),
+        }
+    return snapshot
+
+
+@dataclass
+class SessionStats:
+    """
+    Счётчики ленивых сессий запросов (см. app/db_depends.py).
+    """
+    requests: int = 0  # запросы хотя бы с одной сессией, каждый считается один раз
+    sessions_opened: int = 0  # созданные сессии (одному запросу их может понадобиться несколько)
+    connections_used: int = 0  # запросы, которым понадобилось соединение
+
+    def snapshot(self) -> dict:
+        return {
+            "requests": self.requests,
+            "sessions_opened": self.sessions_opened,
+            "connections_used": self.connections_used,
+            "requests_without_connection": self.requests - self.connections_used,
+        }
+
+
+session_stats = SessionStats()
+
+
+def prometheus_lines() -> list[str]:
+    """
+    Метрики пулов и ленивых сессий для /metrics.
+    """
+    snapshot = pool_snapshot()
+    families = (
+        ("db_pool_checked_out", "gauge", lambda pool, stats: pool["checked_out"]),
+        ("db_pool_overflow", "gauge", lambda pool, stats: pool["overflow"]),
+        ("db_pool_checkouts_total", "counter", lambda pool, stats: stats.checkouts),
+        ("db_pool_checkout_wait_seconds_total", "counter", lambda pool, stats: f"{stats.checkout_wait_total:.6f}"),
+        ("db_pool_checkout_timeouts_total", "counter", lambda pool, stats: stats.checkout_timeouts),
+        ("db_pool_connect_seconds_total", "counter", lambda pool, stats: f"{stats.connect_time_total:.6f}"),
+    )
+    # Формат Prometheus требует, чтобы значения семейства шли сразу за его строкой TYPE
+    lines = []
+    for metric, kind, value in families:
+        lines.append(f"# TYPE {metric} {kind}")
+        for name, (_, stats) in _engines.items():
+            sample = value(snapshot[name], stats)
+            if sample is not None:  # размер пула известен не для всех классов пулов
+                lines.append(f'{metric}{{pool="{name}"}} {sample}')
+    lines += [
+        "# TYPE db_request_sessions_total counter",
+        f'db_request_sessions_total{{kind="requests"}} {session_stats.requests}',
+        f'db_request_sessions_total{{kind="opened"}} {session_stats.sessions_opened}',
+        f'db_request_sessions_total{{kind="connection_used"}} {session_stats.connections_used}',
+    ]
+    return lines
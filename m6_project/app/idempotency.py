@@ -0,0 +1,235 @@
+import asyncio
+import hashlib
+import json
+from collections import OrderedDict
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from time import monotonic
+from typing import Any
+
+from fastapi import HTTPException, Response, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+from sqlalchemy import delete, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import IDEMPOTENCY_KEY_TTL
+from app.models.idempotency_keys import IdempotencyKey as IdempotencyKeyModel
+
+
+IDEMPOTENCY_CACHE_SIZE = 10_000
+
+
+@dataclass(frozen=True)
+class StoredResponse:
+    endpoint: str
+    request_hash: str
+    status_code: int
+    body: Any
+    expires_at: float  # по monotonic(): после этого ключ считается новым
+
+
+# LRU-кэш завершённых ответов перед таблицей idempotency_keys
+_completed: OrderedDict[tuple[int, str], StoredResponse] = OrderedDict()
+# Запросы, которые выполняются прямо сейчас в этом воркере
+_in_flight: dict[tuple[int, str], asyncio.Future] = {}
+
+
+def _cache_get(cache_key: tuple[int, str]) -> StoredResponse | None:
+    stored = _completed.get(cache_key)
+    if stored is None:
+        return None
+    if stored.expires_at < monotonic():
+        del _completed[cache_key]
+        return None
+    _completed.move_to_end(cache_key)
+    return stored
+
+
+def _cache_put(cache_key: tuple[int, str], stored: StoredResponse) -> None:
+    _completed[cache_key] = stored
+    _completed.move_to_end(cache_key)
+    while len(_completed) > IDEMPOTENCY_CACHE_SIZE:
+        _completed.popitem(last=False)
+
+
+def _request_hash(endpoint: str, payload: Any) -> str:
+    raw = json.dumps([endpoint, jsonable_encoder(payload)], sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def _to_response(stored: StoredResponse, endpoint: str, request_hash: str, replayed: bool = True) -> Response:
+    """
+    Возвращает сохранённый ответ, если ключ использовался для того же запроса.
+    """
+    if stored.endpoint != endpoint or stored.request_hash != request_hash:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="Idempotency-Key was already used for a different request",
+        )
+    headers = {"Idempotent-Replayed": "true"} if replayed else None
+    if stored.body is None:
+        return Response(status_code=stored.status_code, headers=headers)
+    return JSONResponse(content=stored.body, status_code=stored.status_code, headers=headers)
+
+
+def _ttl_left(record: IdempotencyKeyModel) -> float:
+    """
+    Сколько секунд ещё действует сохранённый ключ (отрицательное значение — срок истёк).
+    """
+    created_at = record.created_at
+    if created_at.tzinfo is None:  # SQLite возвращает даты без часового пояса, в UTC
+        created_at = created_at.replace(tzinfo=timezone.utc)
+    return IDEMPOTENCY_KEY_TTL - (datetime.now(timezone.utc) - created_at).total_seconds()
+
+
+def _from_record(record: IdempotencyKeyModel, ttl_left: float) -> StoredResponse:
+    if record.status_code is None:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="A request with this Idempotency-Key is still in progress",
+        )
+    return StoredResponse(
+        endpoint=record.endpoint,
+        request_hash=record.request_hash,
+        status_code=record.status_code,
+        body=record.response_body,
+        expires_at=monotonic() + ttl_left,
+    )
+
+
+async def _load_record(db: AsyncSession, user_id: int, key: str) -> IdempotencyKeyModel | None:
+    result = await db.scalars(
+        select(IdempotencyKeyModel).where(
+            IdempotencyKeyModel.user_id == user_id,
+            IdempotencyKeyModel.key == key,
+        )
+    )
+    return result.first()
+
+
+async def _execute_once(
+    db: AsyncSession,
+    *,
+    user_id: int,
+    key: str,
+    endpoint: str,
+    request_hash: str,
+    response_model: type[BaseModel] | None,
+    status_code: int,
+    handler: Callable[[], Awaitable[Any]],
+) -> tuple[StoredResponse, bool]:
+    """
+    Выполняет обработчик и сохраняет ответ в той же транзакции, что и его изменения.
+    Второй элемент результата — был ли ответ взят из ранее сохранённой записи.
+    """
+    record = await _load_record(db, user_id, key)
+    if record is not None:
+        ttl_left = _ttl_left(record)
+        if ttl_left > 0:
+            return _from_record(record, ttl_left), True
+        # Срок хранения истёк — запрос выполняется как новый. Удаление по id без ошибки,
+        # если конкурентный запрос успел удалить запись раньше: тогда он же захватит ключ
+        await db.execute(delete(IdempotencyKeyModel).where(IdempotencyKeyModel.id == record.id))
+        db.expunge(record)
+
+    record = IdempotencyKeyModel(
+        user_id=user_id,
+        key=key,
+        endpoint=endpoint,
+        request_hash=request_hash,
+    )
+    db.add(record)
+    try:
+        # Захватываем ключ: конкурентная транзакция другого воркера будет ждать
+        # на уникальном индексе, пока эта не завершится
+        await db.flush()
+        result = await handler()
+    except IntegrityError:
+        await db.rollback()
+        record = await _load_record(db, user_id, key)
+        if record is None:
+            raise
+        return _from_record(record, _ttl_left(record)), True
+    except BaseException:
+        await db.rollback()
+        raise
+
+    body = None
+    if response_model is not None:
+        body = jsonable_encoder(response_model.model_validate(result))
+    record.status_code = status_code
+    record.response_body = body
+    await db.commit()
+    return _from_record(record, IDEMPOTENCY_KEY_TTL), False
+
+
+async def execute_idempotent(
+    db: AsyncSession,
+    *,
+    user_id: int,
+    key: str | None,
+    endpoint: str,
+    payload: Any = None,
+    response_model: type[BaseModel] | None,
+    status_code: int,
+    handler: Callable[[], Awaitable[Any]],
+) -> Any:
+    """
+    Выполняет изменяющий обработчик не более одного раза для пары (пользователь, Idempotency-Key).
+    Обработчик не коммитит сам — коммит делает эта функция вместе с сохранением ответа.
+    Повторный ключ возвращает сохранённый ответ, не затрагивая корзину и остатки,
+    а конкурентный дубликат ждёт результата уже выполняющегося запроса.
+    """
+    if key is None:
+        result = await handler()
+        await db.commit()
+        if response_model is None:
+            return Response(status_code=status_code)
+        return result
+
+    cache_key = (user_id, key)
+    request_hash = _request_hash(endpoint, payload)
+
+    stored = _cache_get(cache_key)
+    if stored is not None:
+        return _to_response(stored, endpoint, request_hash)
+
+    in_flight = _in_flight.get(cache_key)
+    if in_flight is not None:
+        stored = await asyncio.shield(in_flight)
+        return _to_response(stored, endpoint, request_hash)
+
+    future = asyncio.get_running_loop().create_future()
+    _in_flight[cache_key] = future
+    try:
+        stored, replayed = await _execute_once(
+            db,
+            user_id=user_id,
+            key=key,
+            endpoint=endpoint,
+            request_hash=request_hash,
+            response_model=response_model,
+            status_code=status_code,
+            handler=handler,
+        )
+    except HTTPException as exc:
+        future.set_exception(exc)
+        future.exception()  # ожидающих может не быть — помечаем исключение как полученное
+        raise
+    except BaseException:
+        future.set_exception(HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="The original request with this Idempotency-Key failed, retry it",
+        ))
+        future.exception()
+        raise
+    finally:
+        _in_flight.pop(cache_key, None)
+
+    future.set_result(stored)
+    _cache_put(cache_key, stored)
+    return _to_response(stored, endpoint, request_hash, replayed=replayed)
@@ -0,0 +1,197 @@
+import asyncio
+import json
+import logging
+import os
+import secrets
+from collections.abc import Hashable, Iterable
+from dataclasses import dataclass
+
+from sqlalchemy import func, select
+from sqlalchemy.engine import make_url
+
+from app import background, cache
+from app.config import (
+    CACHE_INVALIDATION_CHANNEL, CACHE_INVALIDATION_ENABLED, CACHE_INVALIDATION_PING_INTERVAL,
+    CACHE_INVALIDATION_RECONNECT_MAX, DATABASE_URL,
+)
+from app.database import IS_SQLITE, async_engine
+
+
+logger = logging.getLogger("app.invalidation")
+
+# Предел размера payload у NOTIFY — 8000 байт. Если ключи не помещаются, событие очищает пространство имён целиком.
+NOTIFY_PAYLOAD_LIMIT = 7900
+RECONNECT_MIN_DELAY = 0.5
+
+# Отличает события этого воркера: свои ключи он уже удалил при публикации
+WORKER_ID = f"{os.getpid()}-{secrets.token_hex(4)}"
+
+
+@dataclass
+class InvalidationStats:
+    published: int = 0
+    received: int = 0
+    reconnects: int = 0
+    full_flushes: int = 0
+    connected: bool = False
+
+
+stats = InvalidationStats()
+
+
+def _payload(namespace: str, keys: list[Hashable] | None) -> str:
+    payload = json.dumps({"o": WORKER_ID, "n": namespace, "k": keys}, separators=(",", ":"))
+    if len(payload.encode()) > NOTIFY_PAYLOAD_LIMIT:
+        payload = json.dumps({"o": WORKER_ID, "n": namespace, "k": None}, separators=(",", ":"))
+    return payload
+
+
+def publish(namespace: str, keys: Iterable[Hashable] | None = None) -> None:
+    """
+    Сообщает всем воркерам, что ключи пространства имён устарели (keys=None — всё пространство).
+    Вызывается после commit: локальный кэш очищается сразу, NOTIFY уходит из фоновой очереди,
+    и ответ его не ждёт. Если отправить не удалось, устаревшие записи доживут до TTL.
+    """
+    # Кэши регистрируются при импорте роутеров, поэтому набор пространств имён во всех воркерах одинаков
+    if not cache.is_registered(namespace):
+        return
+    keys = None if keys is None else list(keys)
+    cache.evict(namespace, keys)
+    if IS_SQLITE or not CACHE_INVALIDATION_ENABLED:
+        return
+    background.submit("cache_invalidation", _notify, _payload(namespace, keys))
+
+
+async def _notify(payload: str) -> None:
+    async with async_engine.connect() as conn:
+        await conn.execute(select(func.pg_notify(CACHE_INVALIDATION_CHANNEL, payload)))
+        await conn.commit()
+    stats.published += 1
+
+
+def _on_notification(connection, pid: int, channel: str, payload: str) -> None:
+    try:
+        event = json.loads(payload)
+    except ValueError:
+        logger.warning("Malformed invalidation payload: %r", payload)
+        return
+    stats.received += 1
+    if event.get("o") == WORKER_ID:
+        return
+    cache.evict(event["n"], event.get("k"))
+
+
+class InvalidationListener:
+    """
+    Подписка воркера на канал инвалидации через отдельное соединение asyncpg (не из пула:
+    LISTEN живёт, пока живо соединение). При обрыве переподключается с экспоненциальной задержкой
+    и очищает все кэши — события, пришедшие без подписки, потеряны.
+    """
+
+    def __init__(self, dsn: str, channel: str):
+        self.dsn = dsn
+        self.channel = channel
+        self._task: asyncio.Task | None = None
+        self._connection = None
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run(), name="cache-invalidation-listener")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self._close()
+
+    async def _close(self) -> None:
+        connection, self._connection = self._connection, None
+        stats.connected = False
+        if connection is not None and not connection.is_closed():
+            try:
+                await asyncio.wait_for(connection.close(), timeout=5)
+            except Exception:
+                connection.terminate()
+
+    async def _listen(self, reconnect: bool) -> None:
+        import asyncpg
+
+        connection = self._connection = await asyncpg.connect(self.dsn)
+        lost = asyncio.Event()
+        connection.add_termination_listener(lambda _: lost.set())
+        await connection.add_listener(self.channel, _on_notification)
+        stats.connected = True
+        if reconnect:
+            # Очищаем сразу после подписки: всё, что изменилось до неё, перечитается из БД
+            cache.flush_all()
+            stats.full_flushes += 1
+        while True:
+            try:
+                await asyncio.wait_for(lost.wait(), timeout=CACHE_INVALIDATION_PING_INTERVAL)
+                return
+            except asyncio.TimeoutError:
+                pass
+            # Сетевой обрыв сам по себе не закрывает соединение — проверяем его запросом
+            await connection.fetchval("SELECT 1", timeout=CACHE_INVALIDATION_PING_INTERVAL)
+
+    async def _run(self) -> None:
+        delay = RECONNECT_MIN_DELAY
+        first = True
+        while True:
+            if not first:
+                stats.reconnects += 1
+            try:
+                await self._listen(reconnect=not first)
+                logger.warning("Invalidation listener connection lost")
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.warning("Invalidation listener failed, retrying in %.1f s", delay, exc_info=True)
+            else:
+                delay = RECONNECT_MIN_DELAY
+            first = False
+            await self._close()
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, CACHE_INVALIDATION_RECONNECT_MAX)
+
+
+_listener: InvalidationListener | None = None
+
+
+def start_listener() -> None:
+    """
+    Запускает подписку воркера. В режиме SQLite работает один процесс — подписка не нужна.
+    """
+    global _listener
+    if IS_SQLITE or not CACHE_INVALIDATION_ENABLED or _listener is not None:
+        return
+    dsn = make_url(DATABASE_URL).set(drivername="postgresql").render_as_string(hide_password=False)
+    _listener = InvalidationListener(dsn, CACHE_INVALIDATION_CHANNEL)
+    _listener.start()
+
+
+async def stop_listener() -> None:
+    global _listener
+    if _listener is not None:
+        await _listener.stop()
+        _listener = None
+
+
+def prometheus_lines() -> list[str]:
+    """
+    Метрики шины инвалидации для /metrics.
+    """
+    return [
+        "# TYPE cache_invalidation_events_total counter",
+        f'cache_invalidation_events_total{{kind="published"}} {stats.published}',
+        f'cache_invalidation_events_total{{kind="received"}} {stats.received}',
+        "# TYPE cache_invalidation_reconnects_total counter",
+        f"cache_invalidation_reconnects_total {stats.reconnects}",
+        "# TYPE cache_invalidation_full_flushes_total counter",
+        f"cache_invalidation_full_flushes_total {stats.full_flushes}",
+        "# TYPE cache_invalidation_listener_connected gauge",
+        f"cache_invalidation_listener_connected {int(stats.connected)}",
+    ]
@@ -0,0 +1,238 @@
+"""
+Списание и изменение остатков товаров.
+
+Обычный товар хранит остаток в products.stock, и все заказы товара ждут блокировки этой строки.
+Для товаров флеш-распродаж включается шардированный режим (products.stock_sharded): остаток
+делится между строками product_stock_shards, а списание блокирует одну случайную строку
+с достаточным остатком. Чтение общего остатка — Product.available_stock.
+"""
+from sqlalchemy import Row, delete, func, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import STOCK_SHARDS
+from app.models.product_stock_shards import ProductStockShard as ShardModel
+from app.models.products import Product as ProductModel
+
+
+def split_stock(total: int, shards: int) -> list[int]:
+    """
+    Делит остаток поровну: первые total % shards шардов получают на единицу больше.
+    """
+    base, extra = divmod(total, shards)
+    return [base + 1 if index < extra else base for index in range(shards)]
+
+
+async def _lock_shards(db: AsyncSession, product_id: int) -> list[Row]:
+    # Всегда в порядке номера шарда, чтобы блокирующие всё транзакции не взаимоблокировались
+    result = await db.execute(
+        select(ShardModel.shard, ShardModel.stock)
+        .where(ShardModel.product_id == product_id)
+        .order_by(ShardModel.shard)
+        .with_for_update()
+    )
+    return list(result)
+
+
+async def _write_shards(db: AsyncSession, product_id: int, values: list[int]) -> None:
+    await db.execute(
+        update(ShardModel),
+        [{"product_id": product_id, "shard": index, "stock": stock} for index, stock in enumerate(values)],
+    )
+
+
+async def enable_sharding(db: AsyncSession, product_id: int, shards: int = STOCK_SHARDS) -> bool:
+    """
+    Переносит остаток товара в shards строк. Возвращает False, если товар не найден или уже шардирован.
+    """
+    product = (await db.execute(
+        select(ProductModel.stock, ProductModel.stock_sharded).where(ProductModel.id == product_id).with_for_update()
+    )).first()
+    if product is None or product.stock_sharded:
+        return False
+    await db.execute(
+        insert(ShardModel),
+        [
+            {"product_id": product_id, "shard": index, "stock": stock}
+            for index, stock in enumerate(split_stock(product.stock, shards))
+        ],
+    )
+    await db.execute(
+        update(ProductModel).where(ProductModel.id == product_id).values(stock=0, stock_sharded=True)
+    )
+    return True
+
+
+async def disable_sharding(db: AsyncSession, product_id: int) -> bool:
+    """
+    Собирает шарды обратно в products.stock. Возвращает False, если товар не шардирован.
+    """
+    sharded = await db.scalar(
+        select(ProductModel.stock_sharded).where(ProductModel.id == product_id).with_for_update()
+    )
+    if not sharded:
+        return False
+    total = sum(shard.stock for shard in await _lock_shards(db, product_id))
+    await db.execute(delete(ShardModel).where(ShardModel.product_id == product_id))
+    await db.execute(
+        update(ProductModel).where(ProductModel.id == product_id).values(stock=total, stock_sharded=False)
+    )
+    return True
+
+
+async def set_stock(db: AsyncSession, product_id: int, total: int) -> None:
+    """
+    Задаёт общий остаток шардированного товара, распределяя его поровну между шардами.
+    """
+    shards = await _lock_shards(db, product_id)
+    await _write_shards(db, product_id, split_stock(total, len(shards)))
+
+
+async def rebalance(db: AsyncSession, product_id: int) -> bool:
+    """
+    Выравнивает остатки шардов товара, если они разошлись больше чем на единицу.
+    Возвращает True, если шарды были перераспределены.
+    """
+    shards = await _lock_shards(db, product_id)
+    if not shards:
+        return False
+    values = [shard.stock for shard in shards]
+    if max(values) - min(values) <= 1:
+        return False
+    await _write_shards(db, product_id, split_stock(sum(values), len(values)))
+    return True
+
+
+# Сколько раз ждать блокировку случайного шарда с достаточным остатком, прежде чем списывать из нескольких
+SHARD_WAIT_ATTEMPTS = 3
+
+
+def _random_shard(product_id: int, quantity: int):
+    return (
+        select(ShardModel.shard)
+        .where(ShardModel.product_id == product_id, ShardModel.stock >= quantity)
+        .order_by(func.random())
+        .limit(1)
+    )
+
+
+async def _decrement_shard(db: AsyncSession, product_id: int, quantity: int, shard) -> bool:
+    result = await db.execute(
+        update(ShardModel)
+        .where(ShardModel.product_id == product_id, ShardModel.shard == shard, ShardModel.stock >= quantity)
+        .values(stock=ShardModel.stock - quantity)
+        .returning(ShardModel.shard)
+        .execution_options(synchronize_session=False)
+    )
+    return result.first() is not None
+
+
+async def _wait_and_decrement_shard(db: AsyncSession, product_id: int, quantity: int, shard: int) -> bool:
+    # Если шард после ожидания уже не подходит, PostgreSQL оставляет его строку заблокированной.
+    # С такой блокировкой ждать другие шарды нельзя (взаимоблокировка), поэтому неудачная попытка
+    # откатывается к точке сохранения вместе с блокировкой
+    savepoint = await db.begin_nested()
+    if await _decrement_shard(db, product_id, quantity, shard):
+        await savepoint.commit()
+        return True
+    await savepoint.rollback()
+    return False
+
+
+async def _decrement_shards(db: AsyncSession, product_id: int, quantity: int) -> bool:
+    # Случайный свободный шард с достаточным остатком; занятые другими транзакциями пропускаются
+    free = _random_shard(product_id, quantity).with_for_update(skip_locked=True).scalar_subquery()
+    if await _decrement_shard(db, product_id, quantity, free):
+        return True
+
+    # Подходящие шарды заняты: ждём блокировку одного случайного из них (выбранного без блокировки).
+    # Пока другие транзакции держат по одному шарду, остальные шарды остаются доступны
+    for _ in range(SHARD_WAIT_ATTEMPTS):
+        shard = await db.scalar(_random_shard(product_id, quantity))
+        if shard is None:
+            break
+        if await _wait_and_decrement_shard(db, product_id, quantity, shard):
+            return True
+
+    # Ни в одном шарде нет quantity единиц (или их раз за разом разбирали): ждём все шарды
+    # и списываем из нескольких
+    shards = await _lock_shards(db, product_id)
+    if sum(shard.stock for shard in shards) < quantity:
+        return False
+    values, remaining = [], quantity
+    for shard in sorted(shards, key=lambda shard: shard.stock, reverse=True):
+        if not remaining:
+            break
+        taken = min(shard.stock, remaining)
+        remaining -= taken
+        values.append({"product_id": product_id, "shard": shard.shard, "stock": shard.stock - taken})
+    await db.execute(update(ShardModel), values)
+    return True
+
+
+async def decrement_stock(db: AsyncSession, product: ProductModel, quantity: int) -> bool:
+    """
+    Атомарно списывает quantity единиц товара. Возвращает False, если остатка не хватает.
+    """
+    if product.stock_sharded:
+        return await _decrement_shards(db, product.id, quantity)
+    result = await db.execute(
+        update(ProductModel)
+        .where(ProductModel.id == product.id, ProductModel.stock_sharded == False, ProductModel.stock >= quantity)
+        .values(stock=ProductModel.stock - quantity)
+        .execution_options(synchronize_session="fetch")
+    )
+    return result.rowcount == 1
+
+
+async def _release_to_product(db: AsyncSession, product_id: int, quantity: int) -> bool:
+    result = await db.execute(
+        update(ProductModel)
+        .where(ProductModel.id == product_id, ProductModel.stock_sharded == False)
+        .values(stock=ProductModel.stock + quantity)
+        .returning(ProductModel.id)
+        .execution_options(synchronize_session=False)
+    )
+    return result.first() is not None
+
+
+async def _release_to_shard(db: AsyncSession, product_id: int, quantity: int) -> bool:
+    # В шард с наименьшим остатком: списания берут шарды с достаточным остатком и редко его ждут,
+    # а шарды заодно выравниваются
+    emptiest = (
+        select(ShardModel.shard)
+        .where(ShardModel.product_id == product_id)
+        .order_by(ShardModel.stock, ShardModel.shard)
+        .limit(1)
+        .scalar_subquery()
+    )
+    result = await db.execute(
+        update(ShardModel)
+        .where(ShardModel.product_id == product_id, ShardModel.shard == emptiest)
+        .values(stock=ShardModel.stock + quantity)
+        .returning(ShardModel.shard)
+        .execution_options(synchronize_session=False)
+    )
+    return result.first() is not None
+
+
+async def release_stock(db: AsyncSession, quantities: dict[int, int]) -> None:
+    """
+    Возвращает на склад quantities ({product_id: количество}) — например, снятые резервы корзины.
+    Шардированным товарам остаток возвращается в шард с наименьшим остатком, строка товара не блокируется.
+    """
+    quantities = {product_id: quantity for product_id, quantity in quantities.items() if quantity > 0}
+    if not quantities:
+        return
+    # Флаг читаем без блокировки: UPDATE ниже сами проверяют режим товара
+    sharded = dict((await db.execute(
+        select(ProductModel.id, ProductModel.stock_sharded).where(ProductModel.id.in_(quantities))
+    )).all())
+    # По одному товару в порядке id (как оформление заказа), чтобы встречные транзакции не взаимоблокировались
+    for product_id, quantity in sorted(quantities.items()):
+        release, fallback = (
+            (_release_to_shard, _release_to_product) if sharded.get(product_id)
+            else (_release_to_product, _release_to_shard)
+        )
+        # Режим товара мог переключиться после чтения флага — тогда подходит другой способ
+        if not await release(db, product_id, quantity):
+            await fallback(db, product_id, quantity)
@@ -0,0 +1,57 @@
+"""
+Удаление ключей идемпотентности старше IDEMPOTENCY_KEY_TTL.
+
+Такие ключи уже не используются для повторов (см. app/idempotency.py), но без очистки
+таблица idempotency_keys растёт на строку с каждым изменяющим запросом.
+
+Запуск: python -m app.jobs.purge_idempotency_keys --batch-size 5000
+"""
+import argparse
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import delete, select
+
+from app.config import IDEMPOTENCY_KEY_TTL
+from app.database import async_session_maker
+from app.models.idempotency_keys import IdempotencyKey as IdempotencyKeyModel
+
+
+async def purge_batch(cutoff: datetime, batch_size: int) -> int:
+    """
+    Удаляет пачку ключей, созданных раньше cutoff. Возвращает число удалённых.
+    """
+    expired = (
+        select(IdempotencyKeyModel.id)
+        .where(IdempotencyKeyModel.created_at < cutoff)
+        .order_by(IdempotencyKeyModel.created_at)
+        .limit(batch_size)
+    )
+    async with async_session_maker() as db:
+        result = await db.execute(
+            delete(IdempotencyKeyModel)
+            .where(IdempotencyKeyModel.id.in_(expired))
+            .execution_options(synchronize_session=False)
+        )
+        await db.commit()
+        return result.rowcount
+
+
+async def purge_idempotency_keys(batch_size: int = 5000) -> int:
+    """
+    Удаляет истёкшие ключи короткими транзакциями, пока они не закончатся.
+    """
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=IDEMPOTENCY_KEY_TTL)
+    total = 0
+    while True:
+        deleted = await purge_batch(cutoff, batch_size)
+        total += deleted
+        if deleted < batch_size:
+            return total
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Удаление истёкших ключей идемпотентности")
+    parser.add_argument("--batch-size", type=int, default=5000)
+    args = parser.parse_args()
+    print(f"Удалено ключей: {asyncio.run(purge_idempotency_keys(args.batch_size))}")
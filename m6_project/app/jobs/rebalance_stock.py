@@ -0,0 +1,82 @@
+"""
+Выравнивание шардированных остатков товаров и включение/выключение режима.
+
+Случайный выбор шарда со временем оставляет часть шардов пустыми, и заказы уходят
+в медленный путь, блокирующий все шарды товара. Задание возвращает остатки к равному делению.
+
+Запуск:
+    python -m app.jobs.rebalance_stock --batch-size 100
+    python -m app.jobs.rebalance_stock --enable 42 --shards 16
+    python -m app.jobs.rebalance_stock --disable 42
+"""
+import argparse
+import asyncio
+
+from sqlalchemy import select
+
+from app.config import STOCK_SHARDS
+from app.database import async_session_maker
+from app.inventory import disable_sharding, enable_sharding, rebalance
+from app.models.products import Product as ProductModel
+
+
+async def rebalance_batch(after_id: int, batch_size: int) -> tuple[int | None, int]:
+    """
+    Выравнивает шарды пачки шардированных товаров с id > after_id.
+    Возвращает последний обработанный id (None, если товаров больше нет) и число выровненных.
+    """
+    async with async_session_maker() as db:
+        ids = list(await db.scalars(
+            select(ProductModel.id)
+            .where(ProductModel.id > after_id, ProductModel.stock_sharded == True)
+            .order_by(ProductModel.id)
+            .limit(batch_size)
+        ))
+        if not ids:
+            return None, 0
+        rebalanced = 0
+        for product_id in ids:
+            rebalanced += await rebalance(db, product_id)
+            # Короткие транзакции: шарды товара заблокированы только на время его выравнивания
+            await db.commit()
+        return ids[-1], rebalanced
+
+
+async def rebalance_stock(batch_size: int = 100) -> int:
+    """
+    Проходит по всем шардированным товарам пачками и выравнивает их шарды.
+    """
+    last_id, total = 0, 0
+    while True:
+        last_id, rebalanced = await rebalance_batch(last_id, batch_size)
+        if last_id is None:
+            return total
+        total += rebalanced
+
+
+async def set_sharding(product_id: int, enabled: bool, shards: int) -> bool:
+    async with async_session_maker() as db:
+        if enabled:
+            changed = await enable_sharding(db, product_id, shards)
+        else:
+            changed = await disable_sharding(db, product_id)
+        await db.commit()
+        return changed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Выравнивание шардированных остатков товаров")
+    parser.add_argument("--batch-size", type=int, default=100)
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--enable", type=int, metavar="PRODUCT_ID", help="включить шардирование товара")
+    mode.add_argument("--disable", type=int, metavar="PRODUCT_ID", help="собрать остаток товара обратно в products.stock")
+    parser.add_argument("--shards", type=int, default=STOCK_SHARDS, help="число шардов для --enable")
+    args = parser.parse_args()
+    if args.enable is not None:
+        changed = asyncio.run(set_sharding(args.enable, True, args.shards))
+        print("Шардирование включено" if changed else "Товар не найден или уже шардирован")
+    elif args.disable is not None:
+        changed = asyncio.run(set_sharding(args.disable, False, args.shards))
+        print("Шардирование выключено" if changed else "Товар не шардирован")
+    else:
+        print(f"Выровнено товаров: {asyncio.run(rebalance_stock(args.batch_size))}")
@@ -0,0 +1,92 @@
+"""
+Сверка агрегатов рейтинга товаров с таблицей отзывов.
+
+Запуск: python -m app.jobs.reconcile_ratings --batch-size 1000
+"""
+import argparse
+import asyncio
+
+from sqlalchemy import case, func, select, update
+
+from app.database import async_session_maker
+from app.models.products import Product as ProductModel
+from app.models.reviews import Review as ReviewModel
+from app.ratings import rating_from_aggregates
+
+
+GRADES = range(1, 6)
+AGGREGATE_FIELDS = ("rating_sum", "review_count", *(f"grade_{grade}_count" for grade in GRADES))
+
+
+async def reconcile_batch(after_id: int, batch_size: int) -> tuple[int | None, int]:
+    """
+    Пересчитывает агрегаты для пачки товаров с id > after_id.
+    Возвращает последний обработанный id (None, если товаров больше нет) и число исправленных.
+    """
+    async with async_session_maker() as db:
+        # Блокируем пачку, чтобы параллельные отзывы не потерялись между чтением и записью
+        products = (await db.execute(
+            select(ProductModel.id, *(getattr(ProductModel, field) for field in AGGREGATE_FIELDS))
+            .where(ProductModel.id > after_id)
+            .order_by(ProductModel.id)
+            .limit(batch_size)
+            .with_for_update()
+        )).all()
+        if not products:
+            return None, 0
+
+        ids = [row.id for row in products]
+        actual_rows = await db.execute(
+            select(
+                ReviewModel.product_id,
+                func.coalesce(func.sum(ReviewModel.grade), 0).label("rating_sum"),
+                func.count(ReviewModel.id).label("review_count"),
+                *(
+                    func.count(case((ReviewModel.grade == grade, 1))).label(f"grade_{grade}_count")
+                    for grade in GRADES
+                ),
+            )
+            .where(ReviewModel.product_id.in_(ids), ReviewModel.is_active == True)
+            .group_by(ReviewModel.product_id)
+        )
+        actual = {row.product_id: row for row in actual_rows}
+
+        drifted = []
+        for product in products:
+            expected = actual.get(product.id)
+            values = {
+                field: getattr(expected, field) if expected is not None else 0
+                for field in AGGREGATE_FIELDS
+            }
+            if any(getattr(product, field) != values[field] for field in AGGREGATE_FIELDS):
+                drifted.append({"id": product.id, **values})
+
+        if drifted:
+            await db.execute(update(ProductModel), drifted)
+            await db.execute(
+                update(ProductModel)
+                .where(ProductModel.id.in_([row["id"] for row in drifted]))
+                .values(rating=rating_from_aggregates(ProductModel.rating_sum, ProductModel.review_count))
+                .execution_options(synchronize_session=False)
+            )
+        await db.commit()
+        return ids[-1], len(drifted)
+
+
+async def reconcile_ratings(batch_size: int = 1000) -> int:
+    """
+    Проходит по всем товарам пачками и исправляет разошедшиеся агрегаты.
+    """
+    last_id, total_fixed = 0, 0
+    while True:
+        last_id, fixed = await reconcile_batch(last_id, batch_size)
+        if last_id is None:
+            return total_fixed
+        total_fixed += fixed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Сверка агрегатов рейтинга товаров")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+    print(f"Исправлено товаров: {asyncio.run(reconcile_ratings(args.batch_size))}")
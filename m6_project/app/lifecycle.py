@@ -0,0 +1,113 @@
+import asyncio
+import logging
+from time import perf_counter
+
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.orm import configure_mappers
+from starlette.types import ASGIApp, Message
+
+from app.config import DB_POOL_SIZE, DB_SHUTDOWN_TIMEOUT, DB_WARMUP_CONNECTIONS
+from app.database import async_engine, read_engine
+from app.metrics import WARMUP_SCOPE_KEY
+
+
+logger = logging.getLogger("app.lifecycle")
+
+# Горячие публичные GET-запросы: прогоняются через всё приложение, чтобы заранее скомпилировать
+# их SQL в кэше SQLAlchemy, собрать сериализаторы pydantic и прогреть middleware.
+# Несуществующие id дают 404, но запросы к БД при этом выполняются те же.
+# Запросы отмечены WARMUP_SCOPE_KEY и не попадают в метрики HTTP, статистику SQL и ленивых сессий.
+WARMUP_REQUESTS = (
+    ("/categories/", ""),
+    ("/products/", "page=1&page_size=20"),
+    ("/products/", "search=warmup&page_size=20"),
+    ("/products/0", ""),
+    ("/products/batch", "ids=0"),
+    ("/products/category/0", ""),
+    ("/reviews/products/0/reviews/", "include_distribution=true"),
+)
+
+
+def _engines() -> list[AsyncEngine]:
+    return [async_engine] if read_engine is async_engine else [async_engine, read_engine]
+
+
+async def _open_connections(engine: AsyncEngine, count: int) -> None:
+    """
+    Одновременно берёт count соединений и возвращает их в пул уже установленными.
+    """
+    connections = await asyncio.gather(*(engine.connect().start() for _ in range(count)))
+    for connection in connections:
+        await connection.close()
+
+
+async def _asgi_get(app: ASGIApp, path: str, query: str) -> int:
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": query.encode(),
+        "root_path": "",
+        "headers": [(b"host", b"warmup")],
+        "client": None,
+        "server": ("warmup", 80),
+        WARMUP_SCOPE_KEY: True,
+    }
+    status_code = 0
+
+    async def receive() -> Message:
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message: Message) -> None:
+        nonlocal status_code
+        if message["type"] == "http.response.start":
+            status_code = message["status"]
+
+    await app(scope, receive, send)
+    return status_code
+
+
+async def warm_up(app: ASGIApp) -> None:
+    """
+    Готовит воркер к первому запросу: настраивает мапперы, открывает соединения пула
+    и выполняет горячие запросы. Ошибки прогрева не мешают старту — только логируются.
+    """
+    start = perf_counter()
+    configure_mappers()
+
+    connections = min(DB_WARMUP_CONNECTIONS, DB_POOL_SIZE)
+    if connections > 0:
+        for engine in _engines():
+            try:
+                await _open_connections(engine, connections)
+            except Exception:
+                logger.warning("Warmup: could not open connections for %s", engine.url, exc_info=True)
+
+    for path, query in WARMUP_REQUESTS:
+        try:
+            status_code = await _asgi_get(app, path, query)
+        except Exception:
+            logger.warning("Warmup request %s?%s failed", path, query, exc_info=True)
+            continue
+        if status_code >= 500:
+            logger.warning("Warmup request %s?%s returned %s", path, query, status_code)
+
+    logger.info("Warmup finished in %.1f ms", (perf_counter() - start) * 1000)
+
+
+async def shutdown() -> None:
+    """
+    Ждёт (не дольше DB_SHUTDOWN_TIMEOUT), пока соединения вернутся в пул, и закрывает движки.
+    """
+    deadline = perf_counter() + DB_SHUTDOWN_TIMEOUT
+    for engine in _engines():
+        checkedout = getattr(engine.pool, "checkedout", None)
+        while checkedout is not None and checkedout() > 0 and perf_counter() < deadline:
+            await asyncio.sleep(0.05)
+        if checkedout is not None and checkedout() > 0:
+            logger.warning("Shutdown: %s connections still checked out from %s", checkedout(), engine.url)
+        await engine.dispose()
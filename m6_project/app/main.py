@@ -1,14 +1,60 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
+
+from app.config import METRICS_ENABLED, STARTUP_WARMUP
+from app import background, cache, dataloader, invalidation, reservations, response_cache, singleflight
+from app.database import Base, IS_SQLITE, async_engine
+from app.db_metrics import prometheus_lines
+from app.lifecycle import shutdown, warm_up
+from app.metrics import MetricsMiddleware, register_collector, render_metrics
+from app.profiling import ProfilingMiddleware
+from app.sql_stats import SqlStatsMiddleware
+from app.routers import categories, products, users, reviews, cart, orders, internal
 
-from app.routers import categories, products, users, reviews, cart, orders
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if IS_SQLITE:
+        # Миграции Alembic рассчитаны на PostgreSQL — схему SQLite создаём по моделям
+        async with async_engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+    background.runner.start()
+    # Подписка до прогрева: всё, что попадёт в кэши, уже под защитой шины инвалидации
+    invalidation.start_listener()
+    reservations.start_sweeper()
+    if STARTUP_WARMUP:
+        await warm_up(app)
+    yield
+    await reservations.stop_sweeper()
+    # Фоновым задачам нужна БД, поэтому очередь дожидаемся до закрытия движков
+    await background.runner.drain()
+    await invalidation.stop_listener()
+    await shutdown()
 
 
 # Создаём приложение FastAPI
 app = FastAPI(
     title="FastAPI Интернет-магазин",
     version="0.1.0",
+    lifespan=lifespan,
 )
 
+app.add_middleware(SqlStatsMiddleware)
+if METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+    register_collector(prometheus_lines)
+    register_collector(cache.prometheus_lines)
+    register_collector(invalidation.prometheus_lines)
+    register_collector(background.runner.prometheus_lines)
+    register_collector(singleflight.prometheus_lines)
+    register_collector(response_cache.prometheus_lines)
+    register_collector(dataloader.prometheus_lines)
+    register_collector(reservations.prometheus_lines)
+# Внешним слоем, чтобы профиль покрывал и остальные middleware
+app.add_middleware(ProfilingMiddleware)
+
 # Подключаем маршруты категорий и товаров
 app.include_router(categories.router)
 app.include_router(products.router)
@@ -16,6 +62,7 @@ app.include_router(users.router)
 app.include_router(reviews.router)
 app.include_router(cart.router) 
 app.include_router(orders.router)
+app.include_router(internal.router)
 
 
 # Корневой эндпоинт для проверки
@@ -25,3 +72,11 @@ async def root():
     Корневой маршрут, подтверждающий, что API работает.
     """
     return {"message": "Добро пожаловать в API интернет-магазина!"}
+
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """
+    Метрики воркера в формате Prometheus.
+    """
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
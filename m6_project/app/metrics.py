@@ -0,0 +1,148 @@
+import os
+from bisect import bisect_left
+from collections.abc import Callable, Iterable
+from time import perf_counter
+
+from starlette.routing import Route
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+
+# Границы корзин гистограммы задержек, секунды
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+UNMATCHED_ROUTE = "<unmatched>"
+STATUS_CLASSES = ("1xx", "2xx", "3xx", "4xx", "5xx")
+# Отметка в scope запросов прогрева (app/lifecycle.py): их не учитывают метрики и статистика запросов к БД
+WARMUP_SCOPE_KEY = "app.warmup"
+
+
+def is_warmup(scope: Scope) -> bool:
+    return scope.get(WARMUP_SCOPE_KEY, False)
+
+
+class RouteMetrics:
+    """
+    Счётчики одного маршрута (метод + шаблон пути). Воркер однопоточный — обновления без блокировок.
+    """
+    __slots__ = ("statuses", "buckets", "latency_sum", "latency_count")
+
+    def __init__(self):
+        self.statuses = [0] * len(STATUS_CLASSES)
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)  # последняя — +Inf
+        self.latency_sum = 0.0
+        self.latency_count = 0
+
+    def observe(self, status_code: int, duration: float) -> None:
+        self.statuses[min(max(status_code // 100, 1), 5) - 1] += 1
+        self.buckets[bisect_left(LATENCY_BUCKETS, duration)] += 1
+        self.latency_sum += duration
+        self.latency_count += 1
+
+
+_routes: dict[tuple[str, str], RouteMetrics] = {}
+# Запросы в обработке. Маршрут известен только после роутинга, поэтому in-flight
+# по маршрутам считается при выдаче метрик по scope["route"] активных запросов
+_active: dict[int, Scope] = {}
+_collectors: list[Callable[[], Iterable[str]]] = []
+
+
+def _route_metrics(method: str, route: str) -> RouteMetrics:
+    key = (method, route)
+    metrics = _routes.get(key)
+    if metrics is None:
+        metrics = _routes[key] = RouteMetrics()
+    return metrics
+
+
+def register_collector(collector: Callable[[], Iterable[str]]) -> None:
+    """
+    Добавляет источник дополнительных строк в формате Prometheus (пул соединений, очереди и т.п.).
+    """
+    _collectors.append(collector)
+
+
+def _route_path(scope: Scope) -> str:
+    route = scope.get("route")
+    return route.path if isinstance(route, Route) else UNMATCHED_ROUTE
+
+
+class MetricsMiddleware:
+    """
+    ASGI-middleware: число запросов по классам статусов и гистограмма задержек
+    для каждого шаблона маршрута (а не сырого URL).
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or is_warmup(scope):
+            await self.app(scope, receive, send)
+            return
+
+        start = perf_counter()
+        status_code = 500
+        request_key = id(scope)
+        _active[request_key] = scope
+
+        async def send_with_status(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            del _active[request_key]
+            _route_metrics(scope["method"], _route_path(scope)).observe(status_code, perf_counter() - start)
+
+
+def _labels(**labels: str) -> str:
+    return ",".join(f'{name}="{value}"' for name, value in labels.items())
+
+
+def render_metrics() -> str:
+    """
+    Текущее состояние метрик воркера в текстовом формате Prometheus.
+    """
+    worker = str(os.getpid())
+    routes = sorted(_routes.items())
+    lines = [
+        "# HELP http_requests_total Total HTTP requests by route and status class.",
+        "# TYPE http_requests_total counter",
+    ]
+    for (method, path), metrics in routes:
+        for status_class, count in zip(STATUS_CLASSES, metrics.statuses):
+            if count:
+                labels = _labels(worker=worker, method=method, route=path, status=status_class)
+                lines.append(f"http_requests_total{{{labels}}} {count}")
+
+    lines += [
+        "# HELP http_requests_in_flight Requests currently being handled.",
+        "# TYPE http_requests_in_flight gauge",
+    ]
+    in_flight = dict.fromkeys(_routes, 0)
+    for scope in list(_active.values()):
+        key = (scope["method"], _route_path(scope))
+        in_flight[key] = in_flight.get(key, 0) + 1
+    for (method, path), count in sorted(in_flight.items()):
+        lines.append(f"http_requests_in_flight{{{_labels(worker=worker, method=method, route=path)}}} {count}")
+
+    lines += [
+        "# HELP http_request_duration_seconds Request latency by route.",
+        "# TYPE http_request_duration_seconds histogram",
+    ]
+    for (method, path), metrics in routes:
+        if not metrics.latency_count:
+            continue
+        labels = _labels(worker=worker, method=method, route=path)
+        cumulative = 0
+        for bound, count in zip((*LATENCY_BUCKETS, "+Inf"), metrics.buckets):
+            cumulative += count
+            lines.append(f'http_request_duration_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+        lines.append(f"http_request_duration_seconds_sum{{{labels}}} {metrics.latency_sum:.6f}")
+        lines.append(f"http_request_duration_seconds_count{{{labels}}} {metrics.latency_count}")
+
+    for collector in _collectors:
+        lines.extend(collector())
+    return "\n".join(lines) + "\n"
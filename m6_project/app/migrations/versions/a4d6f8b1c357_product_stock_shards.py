@@ -0,0 +1,42 @@
+"""product stock shards
+
+Revision ID: a4d6f8b1c357
+Revises: f2b8d4c6e913
+Create Date: 2026-10-19 16:42:10.518304
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a4d6f8b1c357'
+down_revision: Union[str, Sequence[str], None] = 'f2b8d4c6e913'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('products', sa.Column('stock_sharded', sa.Boolean(), server_default='false', nullable=False))
+    op.create_table('product_stock_shards',
+    sa.Column('product_id', sa.Integer(), nullable=False),
+    sa.Column('shard', sa.Integer(), nullable=False),
+    sa.Column('stock', sa.Integer(), nullable=False),
+    sa.CheckConstraint('stock >= 0', name='ck_product_stock_shards_stock_non_negative'),
+    sa.ForeignKeyConstraint(['product_id'], ['products.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('product_id', 'shard')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # Остатки шардов возвращаются в products.stock, чтобы откат не терял товар
+    op.execute(
+        "UPDATE products SET stock = (SELECT COALESCE(SUM(stock), 0) FROM product_stock_shards "
+        "WHERE product_stock_shards.product_id = products.id) WHERE stock_sharded"
+    )
+    op.drop_table('product_stock_shards')
+    op.drop_column('products', 'stock_sharded')
@@ -0,0 +1,32 @@
+"""orders keyset index
+
+Revision ID: c41f8e2a7b63
+Revises: b7e2c41d9a05
+Create Date: 2026-10-19 11:02:17.514902
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c41f8e2a7b63'
+down_revision: Union[str, Sequence[str], None] = 'b7e2c41d9a05'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Составной индекс покрывает и фильтр по user_id, поэтому одиночный больше не нужен
+    op.create_index('ix_orders_user_id_created_at_id', 'orders',
+                    ['user_id', sa.text('created_at DESC'), 'id'], unique=False)
+    op.drop_index(op.f('ix_orders_user_id'), table_name='orders')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.create_index(op.f('ix_orders_user_id'), 'orders', ['user_id'], unique=False)
+    op.drop_index('ix_orders_user_id_created_at_id', table_name='orders')
@@ -0,0 +1,53 @@
+"""stock reservations
+
+Revision ID: c8e1a3f5d702
+Revises: a4d6f8b1c357
+Create Date: 2026-10-19 18:15:27.904631
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c8e1a3f5d702'
+down_revision: Union[str, Sequence[str], None] = 'a4d6f8b1c357'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('stock_reservations',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('product_id', sa.Integer(), nullable=False),
+    sa.Column('quantity', sa.Integer(), nullable=False),
+    sa.Column('expires_at', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.CheckConstraint('quantity > 0', name='ck_stock_reservations_quantity_positive'),
+    sa.ForeignKeyConstraint(['product_id'], ['products.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('user_id', 'product_id', name='uq_stock_reservations_user_product')
+    )
+    op.create_index(op.f('ix_stock_reservations_expires_at'), 'stock_reservations', ['expires_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # Зарезервированный остаток возвращается на склад (у шардированных товаров — в шард 0)
+    op.execute(
+        "UPDATE products SET stock = stock + r.quantity FROM "
+        "(SELECT product_id, SUM(quantity) AS quantity FROM stock_reservations GROUP BY product_id) AS r "
+        "WHERE products.id = r.product_id AND NOT products.stock_sharded"
+    )
+    op.execute(
+        "UPDATE product_stock_shards SET stock = stock + r.quantity FROM "
+        "(SELECT product_id, SUM(quantity) AS quantity FROM stock_reservations GROUP BY product_id) AS r "
+        "WHERE product_stock_shards.product_id = r.product_id AND product_stock_shards.shard = 0"
+    )
+    op.drop_index(op.f('ix_stock_reservations_expires_at'), table_name='stock_reservations')
+    op.drop_table('stock_reservations')
@@ -0,0 +1,28 @@
+"""idempotency keys created_at index
+
+Revision ID: d2f4b6a8c019
+Revises: c8e1a3f5d702
+Create Date: 2026-10-19 20:04:51.227730
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd2f4b6a8c019'
+down_revision: Union[str, Sequence[str], None] = 'c8e1a3f5d702'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index(op.f('ix_idempotency_keys_created_at'), 'idempotency_keys', ['created_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_idempotency_keys_created_at'), table_name='idempotency_keys')
@@ -0,0 +1,44 @@
+"""order_items product snapshot
+
+Revision ID: d9a3b5e1f274
+Revises: c41f8e2a7b63
+Create Date: 2026-10-19 11:47:52.031468
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd9a3b5e1f274'
+down_revision: Union[str, Sequence[str], None] = 'c41f8e2a7b63'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('order_items', sa.Column('product_name', sa.String(length=100), nullable=True))
+    op.add_column('order_items', sa.Column('product_image_url', sa.String(length=200), nullable=True))
+    op.add_column('order_items', sa.Column('product_category_id', sa.Integer(), nullable=True))
+    # Для старых заказов снимок берём из текущего состояния товара
+    op.execute(
+        """
+        UPDATE order_items AS oi
+        SET product_name = p.name,
+            product_image_url = p.image_url,
+            product_category_id = p.category_id
+        FROM products AS p
+        WHERE p.id = oi.product_id
+        """
+    )
+    op.alter_column('order_items', 'product_name', existing_type=sa.String(length=100), nullable=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('order_items', 'product_category_id')
+    op.drop_column('order_items', 'product_image_url')
+    op.drop_column('order_items', 'product_name')
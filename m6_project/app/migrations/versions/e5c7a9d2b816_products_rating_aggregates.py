@@ -0,0 +1,59 @@
+"""products rating aggregates
+
+Revision ID: e5c7a9d2b816
+Revises: d9a3b5e1f274
+Create Date: 2026-10-19 12:31:06.774120
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5c7a9d2b816'
+down_revision: Union[str, Sequence[str], None] = 'd9a3b5e1f274'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+AGGREGATE_COLUMNS = ['rating_sum', 'review_count'] + [f'grade_{grade}_count' for grade in range(1, 6)]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    for column in AGGREGATE_COLUMNS:
+        op.add_column('products', sa.Column(column, sa.Integer(), server_default='0', nullable=False))
+    op.execute(
+        """
+        UPDATE products AS p
+        SET rating_sum = a.rating_sum,
+            review_count = a.review_count,
+            grade_1_count = a.grade_1_count,
+            grade_2_count = a.grade_2_count,
+            grade_3_count = a.grade_3_count,
+            grade_4_count = a.grade_4_count,
+            grade_5_count = a.grade_5_count
+        FROM (
+            SELECT product_id,
+                   sum(grade) AS rating_sum,
+                   count(*) AS review_count,
+                   count(*) FILTER (WHERE grade = 1) AS grade_1_count,
+                   count(*) FILTER (WHERE grade = 2) AS grade_2_count,
+                   count(*) FILTER (WHERE grade = 3) AS grade_3_count,
+                   count(*) FILTER (WHERE grade = 4) AS grade_4_count,
+                   count(*) FILTER (WHERE grade = 5) AS grade_5_count
+            FROM reviews
+            WHERE is_active
+            GROUP BY product_id
+        ) AS a
+        WHERE p.id = a.product_id
+        """
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for column in reversed(AGGREGATE_COLUMNS):
+        op.drop_column('products', column)
@@ -0,0 +1,29 @@
+"""reviews product index
+
+Revision ID: f2b8d4c6e913
+Revises: e5c7a9d2b816
+Create Date: 2026-10-19 13:05:44.390218
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f2b8d4c6e913'
+down_revision: Union[str, Sequence[str], None] = 'e5c7a9d2b816'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_reviews_product_id_is_active_comment_date', 'reviews',
+                    ['product_id', 'is_active', sa.text('comment_date DESC')], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_reviews_product_id_is_active_comment_date', table_name='reviews')
@@ -1,8 +1,12 @@
 from .categories import Category
 from .products import Product
+from .product_stock_shards import ProductStockShard
 from .orders import Order, OrderItem
 from .users import User
 from .reviews import Review
 from .cart_items import CartItem
+from .idempotency_keys import IdempotencyKey
+from .stock_reservations import StockReservation
 
-__all__ = ["Category", "CartItem", "Product", "User", "Review", "Order", "OrderItem"]
\ No newline at end of file
+__all__ = ["Category", "CartItem", "Product", "ProductStockShard", "User", "Review", "Order", "OrderItem",
+           "IdempotencyKey", "StockReservation"]
\ No newline at end of file
@@ -1,7 +1,7 @@
 from decimal import Decimal
 from datetime import datetime
 
-from sqlalchemy import DateTime, ForeignKey, Integer, UniqueConstraint, func, String, Numeric
+from sqlalchemy import DateTime, ForeignKey, Index, Integer, UniqueConstraint, func, String, Numeric, text
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from app.database import Base
@@ -9,10 +9,14 @@ from app.database import Base
 
 class Order(Base):
     __tablename__ = "orders"
+    __table_args__ = (
+        # Покрывает фильтр по пользователю и keyset-пагинацию по (created_at DESC, id)
+        Index("ix_orders_user_id_created_at_id", "user_id", text("created_at DESC"), "id"),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True)
     user_id: Mapped[int] = mapped_column(
-        ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True
+        ForeignKey("users.id", ondelete="CASCADE"), nullable=False
     )
     status: Mapped[str] = mapped_column(String(20), default="pending", nullable=False)
     total_amount: Mapped[Decimal] = mapped_column(Numeric(10, 2), default=0, nullable=False)
@@ -42,6 +46,10 @@ class OrderItem(Base):
     quantity: Mapped[int] = mapped_column(Integer, nullable=False)
     unit_price: Mapped[Decimal] = mapped_column(Numeric(10, 2), nullable=False)
     total_price: Mapped[Decimal] = mapped_column(Numeric(10, 2), nullable=False)
+    # Снимок товара на момент покупки, чтобы не джойнить products при чтении заказов
+    product_name: Mapped[str] = mapped_column(String(100), nullable=False)
+    product_image_url: Mapped[str | None] = mapped_column(String(200), nullable=True)
+    product_category_id: Mapped[int | None] = mapped_column(Integer, nullable=True)
 
     order: Mapped["Order"] = relationship("Order", back_populates="items")
     product: Mapped["Product"] = relationship("Product", back_populates="order_items")
\ No newline at end of file
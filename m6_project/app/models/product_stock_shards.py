@@ -0,0 +1,19 @@
+from sqlalchemy import CheckConstraint, ForeignKey, Integer
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.database import Base
+
+
+class ProductStockShard(Base):
+    """
+    Часть остатка товара в режиме шардирования (products.stock_sharded): списание блокирует
+    одну случайную строку, а не строку товара, поэтому параллельные заказы не ждут друг друга.
+    """
+    __tablename__ = "product_stock_shards"
+    __table_args__ = (
+        CheckConstraint("stock >= 0", name="ck_product_stock_shards_stock_non_negative"),
+    )
+
+    product_id: Mapped[int] = mapped_column(ForeignKey("products.id", ondelete="CASCADE"), primary_key=True)
+    shard: Mapped[int] = mapped_column(Integer, primary_key=True)
+    stock: Mapped[int] = mapped_column(Integer, nullable=False)
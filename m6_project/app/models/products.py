@@ -1,10 +1,23 @@
 from decimal import Decimal
-from sqlalchemy.dialects.postgresql import TSVECTOR
-from sqlalchemy import String, Boolean, Integer, Numeric, ForeignKey, DateTime, func, Computed, Index
-from sqlalchemy.orm import Mapped, mapped_column, relationship
+from sqlalchemy import (
+    DDL, String, Boolean, Integer, Numeric, ForeignKey, DateTime, event, func, Computed, Index, case, select,
+)
+from sqlalchemy.orm import Mapped, column_property, mapped_column, relationship
 from datetime import datetime
 
-from app.database import Base
+from app.database import Base, IS_SQLITE
+from app.models.product_stock_shards import ProductStockShard
+
+if not IS_SQLITE:
+    # Диалект PostgreSQL не нужен SQLite-режиму — не тратим время на его импорт
+    from sqlalchemy.dialects.postgresql import TSVECTOR
+
+
+TSV_EXPRESSION = """
+            setweight(to_tsvector('english', coalesce(name, '')), 'A')
+            || 
+            setweight(to_tsvector('english', coalesce(description, '')), 'B')
+            """
 
 
 class Product(Base):
@@ -16,24 +29,43 @@ class Product(Base):
     price: Mapped[Decimal] = mapped_column(Numeric(10, 2), nullable=False)
     image_url: Mapped[str | None] = mapped_column(String(200), nullable=True)
     stock: Mapped[int] = mapped_column(Integer, nullable=False)
+    # Остаток хранится в product_stock_shards, а stock не используется (0) — для товаров флеш-распродаж
+    stock_sharded: Mapped[bool] = mapped_column(Boolean, default=False, server_default="false", nullable=False)
     is_active: Mapped[bool] = mapped_column(Boolean, default=True)
     category_id: Mapped[int] = mapped_column(ForeignKey("categories.id"), nullable=False)
     seller_id: Mapped[int] = mapped_column(ForeignKey("users.id"), nullable=False)
     rating: Mapped[Decimal] = mapped_column(Numeric[Decimal](1, 2), default=0.0, nullable=False)
+    # Агрегаты отзывов обновляются вместе с записью отзыва; rating = rating_sum / review_count
+    rating_sum: Mapped[int] = mapped_column(Integer, default=0, server_default="0", nullable=False)
+    review_count: Mapped[int] = mapped_column(Integer, default=0, server_default="0", nullable=False)
+    grade_1_count: Mapped[int] = mapped_column(Integer, default=0, server_default="0", nullable=False)
+    grade_2_count: Mapped[int] = mapped_column(Integer, default=0, server_default="0", nullable=False)
+    grade_3_count: Mapped[int] = mapped_column(Integer, default=0, server_default="0", nullable=False)
+    grade_4_count: Mapped[int] = mapped_column(Integer, default=0, server_default="0", nullable=False)
+    grade_5_count: Mapped[int] = mapped_column(Integer, default=0, server_default="0", nullable=False)
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(), nullable=False)
     updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
 
-    tsv: Mapped[TSVECTOR] = mapped_column(
-        TSVECTOR,
-        Computed(
-            """
-            setweight(to_tsvector('english', coalesce(name, '')), 'A')
-            || 
-            setweight(to_tsvector('english', coalesce(description, '')), 'B')
-            """,
-            persisted=True,
-        ),
-        nullable=False,
+    # В SQLite вместо tsv используется FTS5-таблица products_fts (см. ниже)
+    if not IS_SQLITE:
+        tsv: Mapped[TSVECTOR] = mapped_column(
+            TSVECTOR,
+            Computed(TSV_EXPRESSION, persisted=True),
+            nullable=False,
+        )
+
+    # Доступный остаток для чтения: сумма шардов или сам stock. Подзапрос выполняется только для шардированных.
+    available_stock: Mapped[int] = column_property(
+        case(
+            (
+                stock_sharded,
+                select(func.coalesce(func.sum(ProductStockShard.stock), 0))
+                .where(ProductStockShard.product_id == id)
+                .correlate_except(ProductStockShard)
+                .scalar_subquery(),
+            ),
+            else_=stock,
+        )
     )
 
     category: Mapped["Category"] = relationship("Category", back_populates="products")
@@ -42,6 +74,40 @@ class Product(Base):
     cart_items: Mapped[list["CartItem"]] = relationship("CartItem", back_populates="product", cascade="all, delete-orphan")
     order_items: Mapped[list["OrderItem"]] = relationship("OrderItem", back_populates="product")
 
-    __table_args__ = (
-        Index("ix_products_tsv_gin", "tsv", postgresql_using="gin"),
+    if not IS_SQLITE:
+        __table_args__ = (
+            Index("ix_products_tsv_gin", "tsv", postgresql_using="gin"),
+        )
+
+
+# Полнотекстовый индекс для SQLite: внешняя FTS5-таблица над products, синхронизируемая триггерами.
+# Стемминг porter близок к конфигурации 'english' в PostgreSQL.
+SQLITE_FTS_DDL = (
+    """
+    CREATE VIRTUAL TABLE products_fts USING fts5(
+        name, description, content='products', content_rowid='id', tokenize='porter unicode61'
     )
+    """,
+    """
+    CREATE TRIGGER products_fts_insert AFTER INSERT ON products BEGIN
+        INSERT INTO products_fts(rowid, name, description) VALUES (new.id, new.name, new.description);
+    END
+    """,
+    """
+    CREATE TRIGGER products_fts_delete AFTER DELETE ON products BEGIN
+        INSERT INTO products_fts(products_fts, rowid, name, description)
+        VALUES ('delete', old.id, old.name, old.description);
+    END
+    """,
+    """
+    CREATE TRIGGER products_fts_update AFTER UPDATE OF name, description ON products BEGIN
+        INSERT INTO products_fts(products_fts, rowid, name, description)
+        VALUES ('delete', old.id, old.name, old.description);
+        INSERT INTO products_fts(rowid, name, description) VALUES (new.id, new.name, new.description);
+    END
+    """,
+)
+
+for _statement in SQLITE_FTS_DDL:
+    event.listen(Product.__table__, "after_create", DDL(_statement).execute_if(dialect="sqlite"))
+event.listen(Product.__table__, "before_drop", DDL("DROP TABLE IF EXISTS products_fts").execute_if(dialect="sqlite"))
@@ -1,5 +1,5 @@
 from datetime import datetime
-from sqlalchemy import Boolean, Integer, Text, CheckConstraint
+from sqlalchemy import Boolean, Index, Integer, Text, CheckConstraint, text
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from sqlalchemy import ForeignKey
 
@@ -10,6 +10,8 @@ class Review(Base):
     __tablename__ = "reviews"
     __table_args__ = (
         CheckConstraint("grade BETWEEN 1 AND 5", name="ck_reviews_grade_1_5"),
+        Index("ix_reviews_product_id_is_active_comment_date",
+              "product_id", "is_active", text("comment_date DESC")),
     )
 
     id: Mapped[int] = mapped_column(primary_key=True)
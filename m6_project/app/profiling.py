@@ -0,0 +1,220 @@
+import asyncio
+import json
+import os
+import secrets
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from functools import lru_cache
+from pathlib import Path
+from urllib.parse import parse_qs
+
+from fastapi import HTTPException, status
+from fastapi.responses import JSONResponse
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.auth import get_current_admin, get_current_user
+from app.config import PROFILE_DIR, PROFILE_MAX_FILES, PROFILE_SAMPLE_INTERVAL_MS
+from app.database import async_session_maker
+
+
+PROFILE_HEADER = "x-profile"
+PROFILE_QUERY_PARAM = "profile"
+PROFILE_ID_PATTERN = r"^\d{13}-[0-9a-f]{8}$"
+_TRUE_VALUES = ("1", "true", "yes", "on")
+_PROJECT_DIR = str(Path(__file__).resolve().parent.parent) + os.sep
+
+# Сэмплер видит весь поток event loop, поэтому одновременно профилируется один запрос на воркер
+_profile_lock = asyncio.Lock()
+
+
+@lru_cache(maxsize=4096)
+def _short_path(filename: str) -> str:
+    if "site-packages" + os.sep in filename:
+        return filename.rsplit("site-packages" + os.sep, 1)[1]
+    if filename.startswith(_PROJECT_DIR):
+        return filename[len(_PROJECT_DIR):]
+    return os.path.basename(filename)
+
+
+def _collapse(frame) -> str:
+    """
+    Стек кадра в формате collapsed stacks (корень слева, кадры через ';').
+    """
+    labels = []
+    while frame is not None:
+        code = frame.f_code
+        labels.append(f"{_short_path(code.co_filename)}:{code.co_qualname}")
+        frame = frame.f_back
+    return ";".join(reversed(labels))
+
+
+class StackSampler:
+    """
+    Раз в interval секунд снимает стек потока event loop из отдельного потока.
+    Ожидание БД видно как время в селекторе event loop, сериализация и bcrypt — как свои кадры.
+    """
+
+    def __init__(self, thread_id: int, interval: float):
+        self.stacks: Counter[str] = Counter()
+        self.samples = 0
+        self._thread_id = thread_id
+        self._interval = interval
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+
+    def _run(self) -> None:
+        while not self._stopped.wait(self._interval):
+            frame = sys._current_frames().get(self._thread_id)
+            if frame is not None:
+                self.stacks[_collapse(frame)] += 1
+                self.samples += 1
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        self._thread.join()
+
+
+def _new_profile_id() -> str:
+    # Миллисекунды в начале — имена файлов сортируются по времени создания
+    return f"{time.time_ns() // 1_000_000:013d}-{secrets.token_hex(4)}"
+
+
+def _profile_path(profile_id: str) -> Path:
+    return Path(PROFILE_DIR) / f"{profile_id}.json"
+
+
+def _save_profile(profile: dict) -> None:
+    """
+    Записывает профиль и удаляет самые старые сверх PROFILE_MAX_FILES.
+    """
+    directory = Path(PROFILE_DIR)
+    directory.mkdir(parents=True, exist_ok=True)
+    path = _profile_path(profile["id"])
+    tmp_path = path.with_suffix(".tmp")
+    tmp_path.write_text(json.dumps(profile, ensure_ascii=False), encoding="utf-8")
+    os.replace(tmp_path, path)
+    for old_path in sorted(directory.glob("*.json"))[:-PROFILE_MAX_FILES]:
+        old_path.unlink(missing_ok=True)
+
+
+def list_profiles() -> list[dict]:
+    """
+    Метаданные сохранённых профилей, новые первыми.
+    """
+    directory = Path(PROFILE_DIR)
+    if not directory.is_dir():
+        return []
+    profiles = []
+    for path in sorted(directory.glob("*.json"), reverse=True):
+        try:
+            profile = json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            continue  # файл удалили по кругу между glob и чтением
+        profile.pop("stacks", None)
+        profiles.append(profile)
+    return profiles
+
+
+def load_profile(profile_id: str) -> dict | None:
+    try:
+        return json.loads(_profile_path(profile_id).read_text(encoding="utf-8"))
+    except FileNotFoundError:
+        return None
+
+
+def _profiling_requested(scope: Scope) -> bool:
+    header = Headers(scope=scope).get(PROFILE_HEADER)
+    if header is not None:
+        return header.strip().lower() in _TRUE_VALUES
+    query = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+    return any(value.strip().lower() in _TRUE_VALUES for value in query.get(PROFILE_QUERY_PARAM, ()))
+
+
+async def _authorize_admin(scope: Scope) -> None:
+    """
+    Флаг профилирования принимается только от администратора — проверка та же, что у get_current_admin.
+    """
+    scheme, _, token = Headers(scope=scope).get("authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Not authenticated",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    async with async_session_maker() as db:
+        user = await get_current_user(token, db)
+    await get_current_admin(user)
+
+
+class ProfilingMiddleware:
+    """
+    ASGI-middleware: запрос с заголовком X-Profile: 1 или параметром ?profile=1 от администратора
+    выполняется под сэмплирующим профайлером. Collapsed stacks сохраняются на диск,
+    id профиля возвращается в заголовке X-Profile-Id.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not _profiling_requested(scope):
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            await _authorize_admin(scope)
+            if _profile_lock.locked():
+                raise HTTPException(
+                    status_code=status.HTTP_409_CONFLICT,
+                    detail="Another request is being profiled, retry later",
+                )
+        except HTTPException as exc:
+            response = JSONResponse({"detail": exc.detail}, status_code=exc.status_code, headers=exc.headers)
+            await response(scope, receive, send)
+            return
+
+        async with _profile_lock:
+            await self._profile(scope, receive, send)
+
+    async def _profile(self, scope: Scope, receive: Receive, send: Send) -> None:
+        profile_id = _new_profile_id()
+        status_code = 500
+
+        async def send_with_profile_id(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                MutableHeaders(scope=message).append("X-Profile-Id", profile_id)
+            await send(message)
+
+        interval = PROFILE_SAMPLE_INTERVAL_MS / 1000
+        sampler = StackSampler(threading.get_ident(), interval)
+        created_at = datetime.now(timezone.utc)
+        start = time.perf_counter()
+        sampler.start()
+        try:
+            await self.app(scope, receive, send_with_profile_id)
+        finally:
+            sampler.stop()
+            duration = time.perf_counter() - start
+            route = scope.get("route")
+            profile = {
+                "id": profile_id,
+                "created_at": created_at.isoformat(),
+                "method": scope["method"],
+                "path": scope["path"],
+                "route": getattr(route, "path", None),
+                "status_code": status_code,
+                "duration_ms": round(duration * 1000, 3),
+                "samples": sampler.samples,
+                "interval_ms": PROFILE_SAMPLE_INTERVAL_MS,
+                "stacks": "\n".join(f"{stack} {count}" for stack, count in sampler.stacks.most_common()),
+            }
+            await asyncio.to_thread(_save_profile, profile)
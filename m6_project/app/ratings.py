@@ -0,0 +1,11 @@
+from sqlalchemy import Numeric, case, cast, func
+
+
+def rating_from_aggregates(rating_sum, review_count):
+    """
+    Выражение рейтинга из агрегатов: O(1) вместо AVG по всем отзывам товара.
+    """
+    return case(
+        (review_count > 0, func.round(cast(rating_sum, Numeric(10, 2)) / review_count, 2)),
+        else_=0,
+    )
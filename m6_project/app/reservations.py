@@ -0,0 +1,227 @@
+"""
+Резервирование остатка под позиции корзины.
+
+При добавлении в корзину остаток сразу списывается (app/inventory.py) и записывается в stock_reservations
+с TTL: нехватка товара видна уже в корзине, а оформление заказа забирает резервы без повторной проверки
+остатка. Истёкшие резервы пачками удаляет фоновая очистка и возвращает их количество на склад.
+Включается STOCK_RESERVATIONS_ENABLED; резервы, созданные до выключения, по-прежнему снимаются
+корзиной и оформлением заказа.
+"""
+import asyncio
+import logging
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import (
+    STOCK_RESERVATION_SWEEP_BATCH, STOCK_RESERVATION_SWEEP_INTERVAL, STOCK_RESERVATION_TTL,
+    STOCK_RESERVATIONS_ENABLED,
+)
+from app.database import async_session_maker
+from app.inventory import decrement_stock, release_stock
+from app.invalidation import publish
+from app.models.products import Product as ProductModel
+from app.models.stock_reservations import StockReservation as ReservationModel
+
+
+logger = logging.getLogger("app.reservations")
+
+
+@dataclass
+class ReservationStats:
+    reserved: int = 0  # единиц товара зарезервировано корзинами
+    released: int = 0  # возвращено корзинами (уменьшение и удаление позиций)
+    expired: int = 0  # возвращено фоновой очисткой
+    converted: int = 0  # перешло в заказы
+    rejected: int = 0  # отказов корзине из-за нехватки остатка
+    sweeps: int = 0
+
+
+stats = ReservationStats()
+
+
+def _expires_at() -> datetime:
+    return datetime.now(timezone.utc) + timedelta(seconds=STOCK_RESERVATION_TTL)
+
+
+async def sync(db: AsyncSession, user_id: int, product: ProductModel, quantity: int) -> bool:
+    """
+    Приводит резерв пользователя по товару к quantity единиц и продлевает его TTL; quantity=0 снимает резерв.
+    Возвращает False, если для увеличения резерва не хватает остатка (резерв при этом не меняется).
+    """
+    # Блокировка строки резерва: фоновая очистка пропускает её и не вернёт остаток повторно
+    reservation = (await db.scalars(
+        select(ReservationModel)
+        .where(ReservationModel.user_id == user_id, ReservationModel.product_id == product.id)
+        .with_for_update()
+    )).first()
+    held = reservation.quantity if reservation is not None else 0
+
+    if quantity > held:
+        if not await decrement_stock(db, product, quantity - held):
+            stats.rejected += 1
+            return False
+        stats.reserved += quantity - held
+    elif quantity < held:
+        await release_stock(db, {product.id: held - quantity})
+        stats.released += held - quantity
+
+    if quantity == 0:
+        if reservation is not None:
+            await db.delete(reservation)
+    elif reservation is None:
+        db.add(ReservationModel(user_id=user_id, product_id=product.id, quantity=quantity, expires_at=_expires_at()))
+    else:
+        reservation.quantity = quantity
+        reservation.expires_at = _expires_at()
+    await db.flush()
+    return True
+
+
+async def take(db: AsyncSession, user_id: int, product_ids: list[int] | None = None) -> dict[int, int]:
+    """
+    Удаляет резервы пользователя (все или по товарам product_ids), включая истёкшие, но ещё не очищенные.
+    Возвращает {product_id: количество}; остаток по ним уже списан со склада.
+    """
+    query = delete(ReservationModel).where(ReservationModel.user_id == user_id)
+    if product_ids is not None:
+        query = query.where(ReservationModel.product_id.in_(product_ids))
+    result = await db.execute(
+        query.returning(ReservationModel.product_id, ReservationModel.quantity)
+        .execution_options(synchronize_session=False)
+    )
+    return {row.product_id: row.quantity for row in result}
+
+
+async def release(db: AsyncSession, user_id: int, product_ids: list[int] | None = None) -> list[int]:
+    """
+    Снимает резервы пользователя и возвращает остаток на склад. Возвращает id товаров, чей остаток изменился.
+    """
+    quantities = await take(db, user_id, product_ids)
+    await release_stock(db, quantities)
+    stats.released += sum(quantities.values())
+    return list(quantities)
+
+
+async def convert(
+    db: AsyncSession, user_id: int, wanted: dict[int, int]
+) -> tuple[dict[int, int], dict[int, int]]:
+    """
+    Забирает резервы пользователя в заказ с количествами wanted ({product_id: количество}).
+    Возвращает то, что ещё нужно списать (товары без резерва или с истёкшим и уже очищенным резервом),
+    и лишнее, что нужно вернуть на склад. Остатки меняет вызывающий код — одним проходом по id товаров
+    вместе с остальными списаниями заказа.
+    """
+    held = await take(db, user_id)
+    missing, surplus = {}, {}
+    for product_id in held.keys() | wanted.keys():
+        difference = wanted.get(product_id, 0) - held.get(product_id, 0)
+        if difference > 0:
+            missing[product_id] = difference
+        elif difference < 0:
+            surplus[product_id] = -difference
+    stats.converted += sum(held.values()) - sum(surplus.values())
+    stats.released += sum(surplus.values())
+    return missing, surplus
+
+
+async def sweep_batch(batch_size: int = STOCK_RESERVATION_SWEEP_BATCH) -> tuple[int, set[int]]:
+    """
+    Удаляет одну пачку истёкших резервов и возвращает их остаток на склад.
+    Возвращает число удалённых резервов и id товаров, чей остаток изменился.
+    """
+    expired = (
+        select(ReservationModel.id)
+        .where(ReservationModel.expires_at < datetime.now(timezone.utc))
+        .order_by(ReservationModel.expires_at)
+        .limit(batch_size)
+        # Резервы, которые сейчас меняет корзина или забирает заказ, и пачки других воркеров пропускаем
+        .with_for_update(skip_locked=True)
+    )
+    async with async_session_maker() as db:
+        rows = (await db.execute(
+            delete(ReservationModel)
+            .where(ReservationModel.id.in_(expired))
+            .returning(ReservationModel.product_id, ReservationModel.quantity)
+            .execution_options(synchronize_session=False)
+        )).all()
+        quantities: dict[int, int] = defaultdict(int)
+        for row in rows:
+            quantities[row.product_id] += row.quantity
+        await release_stock(db, quantities)
+        await db.commit()
+    stats.expired += sum(quantities.values())
+    return len(rows), set(quantities)
+
+
+async def sweep_expired(batch_size: int = STOCK_RESERVATION_SWEEP_BATCH) -> int:
+    """
+    Очищает все истёкшие резервы пачками (каждая — своя короткая транзакция). Возвращает число резервов.
+    """
+    total = 0
+    while True:
+        removed, product_ids = await sweep_batch(batch_size)
+        total += removed
+        if product_ids:
+            publish("products", sorted(product_ids))  # изменились остатки
+        if removed < batch_size:
+            return total
+
+
+async def _sweep_forever() -> None:
+    while True:
+        await asyncio.sleep(STOCK_RESERVATION_SWEEP_INTERVAL)
+        try:
+            removed = await sweep_expired()
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.warning("Stock reservation sweep failed", exc_info=True)
+            continue
+        stats.sweeps += 1
+        if removed:
+            logger.info("Released %s expired stock reservations", removed)
+
+
+_sweeper: asyncio.Task | None = None
+
+
+def start_sweeper() -> None:
+    """
+    Запускает периодическую очистку истёкших резервов в воркере. Воркеры не мешают друг другу:
+    пачки, заблокированные другим воркером, пропускаются.
+    """
+    global _sweeper
+    if not STOCK_RESERVATIONS_ENABLED or _sweeper is not None:
+        return
+    _sweeper = asyncio.create_task(_sweep_forever(), name="stock-reservation-sweeper")
+
+
+async def stop_sweeper() -> None:
+    global _sweeper
+    if _sweeper is not None:
+        _sweeper.cancel()
+        try:
+            await _sweeper
+        except asyncio.CancelledError:
+            pass
+        _sweeper = None
+
+
+def prometheus_lines() -> list[str]:
+    """
+    Метрики резервов для /metrics.
+    """
+    lines = ["# TYPE stock_reservation_units_total counter"]
+    for kind in ("reserved", "released", "expired", "converted"):
+        lines.append(f'stock_reservation_units_total{{result="{kind}"}} {getattr(stats, kind)}')
+    lines += [
+        "# TYPE stock_reservation_rejected_total counter",
+        f"stock_reservation_rejected_total {stats.rejected}",
+        "# TYPE stock_reservation_sweeps_total counter",
+        f"stock_reservation_sweeps_total {stats.sweeps}",
+    ]
+    return lines
@@ -0,0 +1,231 @@
+import gzip
+from collections import OrderedDict
+from collections.abc import Awaitable, Callable, Hashable
+from dataclasses import dataclass
+from time import monotonic
+
+from fastapi import Request, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import background, cache
+from app.config import REPLICA_MAX_LAG, RESPONSE_CACHE_ENABLED, RESPONSE_CACHE_MAX_BYTES
+from app.database import HAS_READ_REPLICA, async_read_session_maker, async_session_maker
+from app.singleflight import SingleFlight
+
+try:
+    import brotli
+except ImportError:  # brotli необязателен: без него хранится только gzip
+    brotli = None
+
+
+Fetch = Callable[[AsyncSession], Awaitable[bytes]]
+
+# Тела короче не сжимаем: выигрыш меньше накладных расходов (как minimum_size у GZipMiddleware)
+COMPRESS_MIN_SIZE = 500
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+
+@dataclass
+class CachedBody:
+    identity: bytes
+    gzip: bytes | None
+    br: bytes | None
+    fresh_until: float
+    stale_until: float
+
+    @property
+    def size(self) -> int:
+        return len(self.identity) + len(self.gzip or b"") + len(self.br or b"")
+
+
+def _compress(body: bytes) -> tuple[bytes | None, bytes | None]:
+    if len(body) < COMPRESS_MIN_SIZE:
+        return None, None
+    gzipped = gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+    brotlied = brotli.compress(body, quality=BROTLI_QUALITY) if brotli is not None else None
+    return gzipped, brotlied
+
+
+def _accepted_encodings(request: Request) -> set[str]:
+    """
+    Кодировки из Accept-Encoding, кроме явно запрещённых через q=0.
+    """
+    accepted = set()
+    for part in request.headers.get("accept-encoding", "").split(","):
+        coding, *params = part.split(";")
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if quality > 0:
+            accepted.add(coding.strip().lower())
+    return accepted
+
+
+class ResponseStore:
+    """
+    Общее хранилище тел ответов всех кэшируемых маршрутов: LRU с ограничением по байтам.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries: OrderedDict[tuple[str, Hashable], CachedBody] = OrderedDict()
+        self.bytes = 0
+        self.evictions = 0
+
+    def get(self, key: tuple[str, Hashable]) -> CachedBody | None:
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+        return entry
+
+    def put(self, key: tuple[str, Hashable], entry: CachedBody) -> None:
+        if entry.size > self.max_bytes:
+            return
+        self.discard(key)
+        self._entries[key] = entry
+        self.bytes += entry.size
+        while self.bytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self.bytes -= evicted.size
+            self.evictions += 1
+
+    def discard(self, key: tuple[str, Hashable]) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.bytes -= entry.size
+
+    def clear_route(self, route: str) -> None:
+        for key in [key for key in self._entries if key[0] == route]:
+            self.discard(key)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+store = ResponseStore(RESPONSE_CACHE_MAX_BYTES)
+_routes: dict[str, "CachedRoute"] = {}
+
+
+class CachedRoute:
+    """
+    Кэш ответов одного маршрута со stale-while-revalidate: свежая запись отдаётся как есть,
+    устаревшая (не старше stale_ttl) — тоже сразу, но одновременно запускается одно фоновое
+    обновление. Промах выполняет запрос к БД один раз на ключ (single-flight).
+    Записи сбрасываются событиями инвалидации пространств имён из namespaces.
+    """
+
+    def __init__(self, name: str, namespaces: tuple[str, ...], ttl: float, stale_ttl: float):
+        self.name = name
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        # Растёт при инвалидации: ответ, прочитанный до неё, не сохраняется
+        self.version = 0
+        self._invalidated_at = float("-inf")
+        self._flights = SingleFlight(f"response:{name}")
+        self._refreshing: set[Hashable] = set()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        for namespace in namespaces:
+            cache.subscribe(namespace, self._invalidate)
+        _routes[name] = self
+
+    def _invalidate(self, keys: list | None) -> None:
+        # По ключам товара не понять, какие страницы списка его содержат, — сбрасываем маршрут целиком
+        self.version += 1
+        self._invalidated_at = monotonic()
+        store.clear_route(self.name)
+
+    async def _load(self, key: Hashable, fetch: Fetch, db: AsyncSession) -> CachedBody:
+        version = self.version
+        if HAS_READ_REPLICA and monotonic() - self._invalidated_at < REPLICA_MAX_LAG:
+            # Реплика могла ещё не получить изменение, из-за которого маршрут сбросили:
+            # ответ с неё снова закэшировал бы старые данные
+            async with async_session_maker() as primary:
+                body = await fetch(primary)
+        else:
+            body = await fetch(db)
+        gzipped, brotlied = _compress(body)
+        now = monotonic()
+        entry = CachedBody(body, gzipped, brotlied, now + self.ttl, now + self.ttl + self.stale_ttl)
+        if version == self.version:
+            store.put((self.name, key), entry)
+        return entry
+
+    async def _refresh(self, key: Hashable, fetch: Fetch) -> None:
+        try:
+            async with async_read_session_maker() as db:
+                await self._load(key, fetch, db)
+            self.refreshes += 1
+        finally:
+            self._refreshing.discard(key)
+
+    async def get(
+        self,
+        request: Request,
+        key: Hashable,
+        fetch: Fetch,
+        db: AsyncSession,
+    ) -> Response:
+        """
+        Возвращает ответ из кэша или через fetch(db) -> JSON. Фоновое обновление открывает свою сессию.
+        """
+        if not RESPONSE_CACHE_ENABLED:
+            return self._response(request, CachedBody(await fetch(db), None, None, 0, 0), "BYPASS")
+
+        entry = store.get((self.name, key))
+        now = monotonic()
+        if entry is not None and now < entry.fresh_until:
+            self.hits += 1
+            return self._response(request, entry, "HIT")
+        if entry is not None and now < entry.stale_until:
+            self.stale_hits += 1
+            if key not in self._refreshing:
+                if background.submit(f"response_cache:{self.name}", self._refresh, key, fetch):
+                    self._refreshing.add(key)
+            return self._response(request, entry, "STALE")
+
+        self.misses += 1
+        entry = await self._flights.do((key, self.version), lambda: self._load(key, fetch, db))
+        return self._response(request, entry, "MISS")
+
+    def _response(self, request: Request, entry: CachedBody, status: str) -> Response:
+        headers = {"X-Cache": status}
+        body = entry.identity
+        if entry.gzip is not None:
+            headers["Vary"] = "Accept-Encoding"
+            accepted = _accepted_encodings(request)
+            if entry.br is not None and "br" in accepted:
+                body, headers["Content-Encoding"] = entry.br, "br"
+            elif "gzip" in accepted:
+                body, headers["Content-Encoding"] = entry.gzip, "gzip"
+        return Response(content=body, media_type="application/json", headers=headers)
+
+
+def prometheus_lines() -> list[str]:
+    """
+    Метрики кэша ответов для /metrics.
+    """
+    lines = [
+        "# TYPE response_cache_bytes gauge",
+        f"response_cache_bytes {store.bytes}",
+        "# TYPE response_cache_entries gauge",
+        f"response_cache_entries {len(store)}",
+        "# TYPE response_cache_evictions_total counter",
+        f"response_cache_evictions_total {store.evictions}",
+        "# TYPE response_cache_requests_total counter",
+    ]
+    for name, route in _routes.items():
+        for result, value in (("hit", route.hits), ("stale", route.stale_hits), ("miss", route.misses)):
+            lines.append(f'response_cache_requests_total{{route="{name}",result="{result}"}} {value}')
+    lines.append("# TYPE response_cache_refreshes_total counter")
+    for name, route in _routes.items():
+        lines.append(f'response_cache_refreshes_total{{route="{name}"}} {route.refreshes}')
+    return lines
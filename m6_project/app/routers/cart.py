@@ -1,11 +1,16 @@
 from decimal import Decimal
-from fastapi import APIRouter, Depends, HTTPException, Response, status
+from fastapi import APIRouter, Depends, Header, HTTPException, status
 from sqlalchemy import delete, select
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
 
+from app import reservations
 from app.auth import get_current_user
+from app.config import STOCK_RESERVATIONS_ENABLED
+from app.dataloader import product_loader
 from app.db_depends import get_async_db
+from app.idempotency import execute_idempotent
+from app.invalidation import publish
 from app.models.cart_items import CartItem as CartItemModel
 from app.models.products import Product as ProductModel
 from app.models.users import User as UserModel
@@ -19,20 +24,34 @@ from app.schemas import (
 
 router = APIRouter(prefix="/cart", tags=["cart"])
 
+IdempotencyKeyHeader = Header(None, max_length=255,
+                              description="Ключ идемпотентности для безопасных повторов запроса")
 
-async def _ensure_product_available(db: AsyncSession, product_id: int) -> None:
-    result = await db.scalars(
-        select(ProductModel).where(
-            ProductModel.id == product_id,
-            ProductModel.is_active == True,
-        )
-    )
-    product = result.first()
-    if not product:
+
+async def _ensure_product_available(db: AsyncSession, product_id: int) -> ProductModel:
+    product = await product_loader(db).load(product_id)
+    if product is None or not product.is_active:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Product not found or inactive",
         )
+    return product
+
+
+async def _reserve(
+    db: AsyncSession, user_id: int, product: ProductModel, quantity: int, changed_products: list[int]
+) -> None:
+    """
+    Резервирует остаток под новое количество позиции (если резервы включены).
+    """
+    if not STOCK_RESERVATIONS_ENABLED:
+        return
+    if not await reservations.sync(db, user_id, product, quantity):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Not enough stock for product {product.name}",
+        )
+    changed_products.append(product.id)
 
 
 async def _get_cart_item(
@@ -78,70 +97,148 @@ async def get_cart(
     )
 
 
-@router.post("/items", response_model=CartItemSchema, status_code=status.HTTP_201_CREATED)
-async def add_item_to_cart(
-    payload: CartItemCreate,
-    db: AsyncSession = Depends(get_async_db),
-    current_user: UserModel = Depends(get_current_user),
-):
-    await _ensure_product_available(db, payload.product_id)
+async def _add_item(
+    db: AsyncSession, user_id: int, payload: CartItemCreate, changed_products: list[int]
+) -> CartItemModel:
+    product = await _ensure_product_available(db, payload.product_id)
 
-    cart_item = await _get_cart_item(db, current_user.id, payload.product_id)
+    cart_item = await _get_cart_item(db, user_id, payload.product_id)
+    quantity = (cart_item.quantity if cart_item else 0) + payload.quantity
+    await _reserve(db, user_id, product, quantity, changed_products)
     if cart_item:
         cart_item.quantity += payload.quantity
     else:
         cart_item = CartItemModel(
-            user_id=current_user.id,
+            user_id=user_id,
             product_id=payload.product_id,
             quantity=payload.quantity,
         )
         db.add(cart_item)
 
-    await db.commit()
-    updated_item = await _get_cart_item(db, current_user.id, payload.product_id)
+    await db.flush()
+    updated_item = await _get_cart_item(db, user_id, payload.product_id)
     return updated_item
 
 
+async def _update_item(
+    db: AsyncSession, user_id: int, product_id: int, payload: CartItemUpdate, changed_products: list[int]
+) -> CartItemModel:
+    product = await _ensure_product_available(db, product_id)
+
+    cart_item = await _get_cart_item(db, user_id, product_id)
+    if not cart_item:
+        raise HTTPException(status_code=404, detail="Cart item not found")
+    await _reserve(db, user_id, product, payload.quantity, changed_products)
+
+    cart_item.quantity = payload.quantity
+    await db.flush()
+    updated_item = await _get_cart_item(db, user_id, product_id)
+    return updated_item
+
+
+async def _remove_item(db: AsyncSession, user_id: int, product_id: int, changed_products: list[int]) -> None:
+    cart_item = await _get_cart_item(db, user_id, product_id)
+    if not cart_item:
+        raise HTTPException(status_code=404, detail="Cart item not found")
+
+    # Резерв снимаем и при выключенных резервах: он мог остаться с того времени, когда они были включены
+    changed_products.extend(await reservations.release(db, user_id, [product_id]))
+    await db.delete(cart_item)
+    await db.flush()
+
+
+async def _clear(db: AsyncSession, user_id: int, changed_products: list[int]) -> None:
+    changed_products.extend(await reservations.release(db, user_id))
+    await db.execute(delete(CartItemModel).where(CartItemModel.user_id == user_id))
+
+
+@router.post("/items", response_model=CartItemSchema, status_code=status.HTTP_201_CREATED)
+async def add_item_to_cart(
+    payload: CartItemCreate,
+    idempotency_key: str | None = IdempotencyKeyHeader,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: UserModel = Depends(get_current_user),
+):
+    changed_products: list[int] = []  # остатки меняются только при резервировании
+    response = await execute_idempotent(
+        db,
+        user_id=current_user.id,
+        key=idempotency_key,
+        endpoint="cart:add_item",
+        payload=payload,
+        response_model=CartItemSchema,
+        status_code=status.HTTP_201_CREATED,
+        handler=lambda: _add_item(db, current_user.id, payload, changed_products),
+    )
+    if changed_products:
+        publish("products", changed_products)
+    return response
+
+
 @router.put("/items/{product_id}", response_model=CartItemSchema)
 async def update_cart_item(
     product_id: int,
     payload: CartItemUpdate,
+    idempotency_key: str | None = IdempotencyKeyHeader,
     db: AsyncSession = Depends(get_async_db),
     current_user: UserModel = Depends(get_current_user),
 ):
-    await _ensure_product_available(db, product_id)
-
-    cart_item = await _get_cart_item(db, current_user.id, product_id)
-    if not cart_item:
-        raise HTTPException(status_code=404, detail="Cart item not found")
-
-    cart_item.quantity = payload.quantity
-    await db.commit()
-    updated_item = await _get_cart_item(db, current_user.id, product_id)
-    return updated_item
+    changed_products: list[int] = []
+    response = await execute_idempotent(
+        db,
+        user_id=current_user.id,
+        key=idempotency_key,
+        endpoint="cart:update_item",
+        payload={"product_id": product_id, "quantity": payload.quantity},
+        response_model=CartItemSchema,
+        status_code=status.HTTP_200_OK,
+        handler=lambda: _update_item(db, current_user.id, product_id, payload, changed_products),
+    )
+    if changed_products:
+        publish("products", changed_products)
+    return response
 
 
 @router.delete("/items/{product_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def remove_item_from_cart(
     product_id: int,
+    idempotency_key: str | None = IdempotencyKeyHeader,
     db: AsyncSession = Depends(get_async_db),
     current_user: UserModel = Depends(get_current_user),
 ):
-    cart_item = await _get_cart_item(db, current_user.id, product_id)
-    if not cart_item:
-        raise HTTPException(status_code=404, detail="Cart item not found")
-
-    await db.delete(cart_item)
-    await db.commit()
-    return Response(status_code=status.HTTP_204_NO_CONTENT)
+    changed_products: list[int] = []
+    response = await execute_idempotent(
+        db,
+        user_id=current_user.id,
+        key=idempotency_key,
+        endpoint="cart:remove_item",
+        payload={"product_id": product_id},
+        response_model=None,
+        status_code=status.HTTP_204_NO_CONTENT,
+        handler=lambda: _remove_item(db, current_user.id, product_id, changed_products),
+    )
+    if changed_products:
+        publish("products", changed_products)
+    return response
 
 
 @router.delete("/", status_code=status.HTTP_204_NO_CONTENT)
 async def clear_cart(
+    idempotency_key: str | None = IdempotencyKeyHeader,
     db: AsyncSession = Depends(get_async_db),
     current_user: UserModel = Depends(get_current_user),
 ):
-    await db.execute(delete(CartItemModel).where(CartItemModel.user_id == current_user.id))
-    await db.commit()
-    return Response(status_code=status.HTTP_204_NO_CONTENT)
+    changed_products: list[int] = []
+    response = await execute_idempotent(
+        db,
+        user_id=current_user.id,
+        key=idempotency_key,
+        endpoint="cart:clear",
+        response_model=None,
+        status_code=status.HTTP_204_NO_CONTENT,
+        handler=lambda: _clear(db, current_user.id, changed_products),
+    )
+    if changed_products:
+        publish("products", changed_products)
+    return response
 
@@ -1,10 +1,14 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from pydantic import TypeAdapter
 from sqlalchemy import select, update
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.models.categories import Category as CategoryModel
 from app.schemas import Category as CategorySchema, CategoryCreate
-from app.db_depends import get_async_db
+from app.config import CATEGORIES_CACHE_STALE_TTL, CATEGORIES_CACHE_TTL
+from app.db_depends import get_async_db, get_read_db
+from app.invalidation import publish
+from app.response_cache import CachedRoute
 
 
 # Создаём маршрутизатор с префиксом и тегом
@@ -13,14 +17,23 @@ router = APIRouter(
     tags=["categories"],
 )
 
+categories_adapter = TypeAdapter(list[CategorySchema])
+categories_cache = CachedRoute(
+    "categories:list", namespaces=("categories",), ttl=CATEGORIES_CACHE_TTL, stale_ttl=CATEGORIES_CACHE_STALE_TTL,
+)
+
 
 @router.get("/", response_model=list[CategorySchema])
-async def get_all_categories(db: AsyncSession = Depends(get_async_db)):
+async def get_all_categories(request: Request, db: AsyncSession = Depends(get_read_db)):
     """
     Возвращает список всех активных категорий.
     """
+    return await categories_cache.get(request, "active", _query_categories, db)
+
+
+async def _query_categories(db: AsyncSession) -> bytes:
     result = await db.scalars(select(CategoryModel).where(CategoryModel.is_active==True))
-    return result.all()
+    return categories_adapter.dump_json(categories_adapter.validate_python(result.all(), from_attributes=True))
 
 
 
@@ -43,6 +56,7 @@ async def create_category(category: CategoryCreate, db: AsyncSession = Depends(g
     db_category = CategoryModel(**category.model_dump())
     db.add(db_category)
     await db.commit()
+    publish("categories")  # новая категория меняет списки
     await db.refresh(db_category)
     return db_category
 
@@ -79,6 +93,7 @@ async def update_category(category_id: int, category: CategoryCreate, db: AsyncS
         .values(**update_data)
     )
     await db.commit()
+    publish("categories")
     await db.refresh(db_category)
     return db_category
 
@@ -101,5 +116,6 @@ async def delete_category(category_id: int, db: AsyncSession = Depends(get_async
         .values(is_active=False)
     )
     await db.commit()
+    publish("categories")
     await db.refresh(db_category)
     return db_category
\ No newline at end of file
@@ -0,0 +1,43 @@
+from fastapi import APIRouter, Depends, HTTPException, Path, status
+from fastapi.responses import PlainTextResponse
+
+from app.auth import get_current_admin
+from app.db_metrics import pool_snapshot, session_stats
+from app.models.users import User as UserModel
+from app.profiling import PROFILE_ID_PATTERN, list_profiles, load_profile
+
+
+router = APIRouter(prefix="/internal", tags=["internal"])
+
+
+@router.get("/pool")
+async def get_pool_stats(current_user: UserModel = Depends(get_current_admin)):
+    """
+    Возвращает состояние пулов соединений (только для 'admin'): занятые соединения, overflow,
+    время ожидания checkout и задержку установки соединения,
+    а также сколько запросов обошлись без соединения.
+    """
+    return {"pools": pool_snapshot(), "sessions": session_stats.snapshot()}
+
+
+@router.get("/profiles")
+async def get_profiles(current_user: UserModel = Depends(get_current_admin)):
+    """
+    Возвращает метаданные сохранённых профилей запросов (только для 'admin'), новые первыми.
+    """
+    return list_profiles()
+
+
+@router.get("/profiles/{profile_id}", response_class=PlainTextResponse)
+async def get_profile(
+    profile_id: str = Path(pattern=PROFILE_ID_PATTERN),
+    current_user: UserModel = Depends(get_current_admin),
+):
+    """
+    Возвращает профиль запроса в формате collapsed stacks (только для 'admin').
+    Подходит для flamegraph.pl и speedscope.
+    """
+    profile = load_profile(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Profile not found")
+    return PlainTextResponse(profile["stacks"] + "\n")
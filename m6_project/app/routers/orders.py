@@ -1,16 +1,24 @@
+from datetime import datetime
 from decimal import Decimal
+from typing import Literal
 
-from fastapi import APIRouter, Depends, HTTPException, Query, status
-from sqlalchemy import delete, func, select
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, status
+from sqlalchemy import and_, delete, func, or_, select
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
 
+from app import reservations
 from app.auth import get_current_user
+from app.dataloader import product_loader
 from app.db_depends import get_async_db
+from app.idempotency import execute_idempotent
+from app.inventory import decrement_stock, release_stock
+from app.invalidation import publish
+from app.pagination import decode_cursor, encode_cursor
 from app.models.cart_items import CartItem as CartItemModel
 from app.models.orders import Order as OrderModel, OrderItem as OrderItemModel
 from app.models.users import User as UserModel
-from app.schemas import Order as OrderSchema, OrderList
+from app.schemas import Order as OrderSchema, OrderList, OrderSummaryList
 
 router = APIRouter(
     prefix="/orders",
@@ -18,51 +26,49 @@ router = APIRouter(
 )
 
 
-async def _load_order_with_items(db: AsyncSession, order_id: int) -> OrderModel | None:
+def _items_loader(include_product: bool):
+    """
+    Позиции заказа несут снимок товара, поэтому сам товар подгружается только по запросу.
+    """
+    items = selectinload(OrderModel.items)
+    if include_product:
+        return items.selectinload(OrderItemModel.product)
+    return items.noload(OrderItemModel.product)
+
+
+async def _load_order_with_items(
+    db: AsyncSession, order_id: int, include_product: bool = False
+) -> OrderModel | None:
     result = await db.scalars(
         select(OrderModel)
-        .options(
-            selectinload(OrderModel.items).selectinload(OrderItemModel.product),
-        )
+        .options(_items_loader(include_product))
         .where(OrderModel.id == order_id)
+        .execution_options(populate_existing=True)
     )
     return result.first()
 
 
-@router.post("/checkout", response_model=OrderSchema, status_code=status.HTTP_201_CREATED)
-async def checkout_order(
-    db: AsyncSession = Depends(get_async_db),
-    current_user: UserModel = Depends(get_current_user),
-):
-    """
-    Создаёт заказ на основе текущей корзины пользователя.
-    Сохраняет позиции заказа, вычитает остатки и очищает корзину.
-    """
+async def _checkout(db: AsyncSession, current_user: UserModel, changed_products: list[int]) -> OrderModel:
     cart_result = await db.scalars(
         select(CartItemModel)
-        .options(selectinload(CartItemModel.product))
         .where(CartItemModel.user_id == current_user.id)
         .order_by(CartItemModel.id)
     )
     cart_items = cart_result.all()
     if not cart_items:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Cart is empty")
+    # Товары корзины одним запросом; остаются в загрузчике для остальных проверок запроса
+    products = await product_loader(db).load_many(cart_item.product_id for cart_item in cart_items)
 
     order = OrderModel(user_id=current_user.id)
     total_amount = Decimal("0")
 
-    for cart_item in cart_items:
-        product = cart_item.product
+    for cart_item, product in zip(cart_items, products):
         if not product or not product.is_active:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail=f"Product {cart_item.product_id} is unavailable",
             )
-        if product.stock < cart_item.quantity:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"Not enough stock for product {product.name}",
-            )
 
         unit_price = product.price
         if unit_price is None:
@@ -78,16 +84,35 @@ async def checkout_order(
             quantity=cart_item.quantity,
             unit_price=unit_price,
             total_price=total_price,
+            product_name=product.name,
+            product_image_url=product.image_url,
+            product_category_id=product.category_id,
         )
         order.items.append(order_item)
 
-        product.stock -= cart_item.quantity
+    # Зарезервированное в корзине уже списано — остаток проверяем только для того, что без резерва
+    missing, surplus = await reservations.convert(
+        db, current_user.id, {cart_item.product_id: cart_item.quantity for cart_item in cart_items}
+    )
+    # Списываем недостающее и возвращаем лишнее резервов одним проходом в порядке id товара,
+    # чтобы встречные заказы брали блокировки в одном порядке и не взаимоблокировались.
+    # Товары, целиком покрытые резервом, остаток не меняют
+    products_by_id = {product.id: product for product in products}
+    for product_id in sorted(missing.keys() | surplus.keys()):
+        if product_id in surplus:
+            await release_stock(db, {product_id: surplus[product_id]})
+        elif not await decrement_stock(db, products_by_id[product_id], missing[product_id]):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Not enough stock for product {products_by_id[product_id].name}",
+            )
+        changed_products.append(product_id)
 
     order.total_amount = total_amount
     db.add(order)
 
     await db.execute(delete(CartItemModel).where(CartItemModel.user_id == current_user.id))
-    await db.commit()
+    await db.flush()
 
     created_order = await _load_order_with_items(db, order.id)
     if not created_order:
@@ -98,42 +123,122 @@ async def checkout_order(
     return created_order
 
 
-@router.get("/", response_model=OrderList)
+@router.post("/checkout", response_model=OrderSchema, status_code=status.HTTP_201_CREATED)
+async def checkout_order(
+    idempotency_key: str | None = Header(None, max_length=255,
+                                         description="Ключ идемпотентности для безопасных повторов запроса"),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: UserModel = Depends(get_current_user),
+):
+    """
+    Создаёт заказ на основе текущей корзины пользователя.
+    Сохраняет позиции заказа, вычитает остатки и очищает корзину.
+    Повтор с тем же Idempotency-Key возвращает уже созданный заказ.
+    """
+    changed_products: list[int] = []  # повтор по ключу не вызывает _checkout и остатки не меняет
+    response = await execute_idempotent(
+        db,
+        user_id=current_user.id,
+        key=idempotency_key,
+        endpoint="orders:checkout",
+        response_model=OrderSchema,
+        status_code=status.HTTP_201_CREATED,
+        handler=lambda: _checkout(db, current_user, changed_products),
+    )
+    if changed_products:
+        publish("products", changed_products)  # изменились остатки
+    return response
+
+
+@router.get("/", response_model=OrderList | OrderSummaryList)
 async def list_orders(
     page: int = Query(1, ge=1),
     page_size: int = Query(10, ge=1, le=100),
+    cursor: str | None = Query(None, description="Курсор из next_cursor; при указании page игнорируется"),
+    view: Literal["full", "summary"] = Query("full", description="summary — только заголовки заказов"),
+    include_product: bool = Query(False, description="Добавить текущие данные товара в позиции"),
     db: AsyncSession = Depends(get_async_db),
     current_user: UserModel = Depends(get_current_user),
 ):
     """
-    Возвращает заказы текущего пользователя с простой пагинацией.
+    Возвращает заказы текущего пользователя от новых к старым.
+    Поддерживает постраничную и курсорную (keyset) пагинацию по (created_at, id).
+    total считается только для постраничного режима: курсорные страницы не пересчитывают все заказы.
     """
-    total = await db.scalar(
-        select(func.count(OrderModel.id)).where(OrderModel.user_id == current_user.id)
-    )
-    result = await db.scalars(
-        select(OrderModel)
-        .options(selectinload(OrderModel.items).selectinload(OrderItemModel.product))
-        .where(OrderModel.user_id == current_user.id)
-        .order_by(OrderModel.created_at.desc())
-        .offset((page - 1) * page_size)
-        .limit(page_size)
+    total = None
+    if cursor is None:
+        total = await db.scalar(
+            select(func.count(OrderModel.id)).where(OrderModel.user_id == current_user.id)
+        ) or 0
+
+    if view == "summary":
+        items_count = (
+            select(func.count(OrderItemModel.id))
+            .where(OrderItemModel.order_id == OrderModel.id)
+            .correlate(OrderModel)
+            .scalar_subquery()
+            .label("items_count")
+        )
+        stmt = select(OrderModel, items_count)
+    else:
+        stmt = select(OrderModel).options(_items_loader(include_product))
+    stmt = (
+        stmt.where(OrderModel.user_id == current_user.id)
+        .order_by(OrderModel.created_at.desc(), OrderModel.id)
+        .limit(page_size + 1)
     )
-    orders = result.all()
-
-    return OrderList(items=orders, total=total or 0, page=page, page_size=page_size)
+    if cursor is not None:
+        cursor_created_at, cursor_id = decode_cursor(cursor, datetime, int)
+        stmt = stmt.where(or_(
+            OrderModel.created_at < cursor_created_at,
+            and_(OrderModel.created_at == cursor_created_at, OrderModel.id > cursor_id),
+        ))
+    else:
+        stmt = stmt.offset((page - 1) * page_size)
+
+    result = await db.execute(stmt)
+    rows = result.all()
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+
+    next_cursor = None
+    if has_more:
+        last_order = rows[-1][0]
+        next_cursor = encode_cursor(last_order.created_at, last_order.id)
+    current_page = None if cursor is not None else page
+
+    if view == "summary":
+        items = [
+            {
+                "id": order.id,
+                "user_id": order.user_id,
+                "status": order.status,
+                "total_amount": order.total_amount,
+                "created_at": order.created_at,
+                "updated_at": order.updated_at,
+                "items_count": count,
+            }
+            for order, count in rows
+        ]
+        return OrderSummaryList(items=items, total=total, page=current_page,
+                                page_size=page_size, next_cursor=next_cursor)
+
+    orders = [row[0] for row in rows]
+    return OrderList(items=orders, total=total, page=current_page,
+                     page_size=page_size, next_cursor=next_cursor)
 
 
 @router.get("/{order_id}", response_model=OrderSchema)
 async def get_order(
     order_id: int,
+    include_product: bool = Query(False, description="Добавить текущие данные товара в позиции"),
     db: AsyncSession = Depends(get_async_db),
     current_user: UserModel = Depends(get_current_user),
 ):
     """
     Возвращает детальную информацию по заказу, если он принадлежит пользователю.
     """
-    order = await _load_order_with_items(db, order_id)
+    order = await _load_order_with_items(db, order_id, include_product)
     if not order or order.user_id != current_user.id:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Order not found")
     return order
\ No newline at end of file
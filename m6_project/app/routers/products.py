@@ -1,20 +1,66 @@
-from fastapi import APIRouter, HTTPException, Query, status, Depends
-from sqlalchemy import select, func, desc, update, and_
+from contextlib import asynccontextmanager
+
+from fastapi import APIRouter, HTTPException, Query, Request, Response, status, Depends
+from sqlalchemy import ARRAY, Integer, any_, bindparam, select, func, desc, update, and_
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.models.products import Product as ProductModel
 from app.models.categories import Category as CategoryModel
 from app.models.users import User as UserModel
 from app.auth import get_current_seller
-from app.schemas import Product as ProductSchema, ProductCreate, ProductList
-from app.db_depends import get_async_db
+from app.cache import register_cache
+from app.config import (
+    PRODUCT_CACHE_SIZE, PRODUCT_CACHE_TTL, PRODUCT_LIST_CACHE_PAGES, PRODUCT_LIST_CACHE_STALE_TTL,
+    PRODUCT_LIST_CACHE_TTL, REPLICA_MAX_LAG,
+)
+from app.inventory import set_stock
+from app.invalidation import publish
+from app.response_cache import CachedRoute
+from app.database import HAS_READ_REPLICA, IS_SQLITE, async_session_maker
+from app.schemas import (
+    PRODUCT_BATCH_MAX_IDS, PRODUCT_ID_MAX, Product as ProductSchema, ProductBatch, ProductBatchRequest, ProductCreate, ProductList,
+)
+from app.db_depends import get_async_db, get_read_db
+from app.search import apply_product_search
+from app.singleflight import register_group
 
 
 router = APIRouter(prefix="/products", tags=["products"])
 
+# JSON карточек активных товаров по id. Записи удаляются событиями шины инвалидации (app/invalidation.py).
+product_cache = register_cache("products", PRODUCT_CACHE_SIZE, PRODUCT_CACHE_TTL)
+# Одинаковые одновременные запросы каталога выполняются один раз, остальные получают готовый JSON
+list_flights = register_group("products:list")
+product_flights = register_group("products:get")
+# Первые страницы каталога и категорий: допускают несколько секунд устаревания. Сбрасываются только
+# событиями "catalog" (создание, изменение, удаление товара); изменения остатков и рейтингов
+# из заказов, корзины и отзывов страницы догоняют за TTL
+list_cache = CachedRoute(
+    "products:list", namespaces=("catalog",), ttl=PRODUCT_LIST_CACHE_TTL, stale_ttl=PRODUCT_LIST_CACHE_STALE_TTL,
+)
+
+
+def _json_response(body: bytes) -> Response:
+    return Response(content=body, media_type="application/json")
+
+
+@asynccontextmanager
+async def _fill_session(db: AsyncSession, product_ids: list[int]):
+    """
+    Сессия для заполнения product_cache. Товары, инвалидированные меньше REPLICA_MAX_LAG секунд назад,
+    читаются с основной БД: реплика могла ещё не получить изменение, и старая карточка
+    прожила бы в кэше до TTL.
+    """
+    if HAS_READ_REPLICA and any(product_cache.invalidated_within(product_id, REPLICA_MAX_LAG) for product_id in product_ids):
+        async with async_session_maker() as primary:
+            yield primary
+    else:
+        yield db
+
 
 @router.get("/", response_model=ProductList)
 async def get_all_products(
+    request: Request,
     page: int = Query(1, ge=1),
     page_size: int = Query(20, ge=1, le=100),
     category_id: int | None = Query(None, description="ID категории для фильтрации"),
@@ -23,7 +69,7 @@ async def get_all_products(
     max_price: float | None = Query(None, ge=0, description="Максимальная цена товара"),
     in_stock: bool | None = Query(None, description="true — только товары в наличии, false — только без остатка"),
     seller_id: int | None = Query(None, description="ID продавца для фильтрации"),
-    db: AsyncSession = Depends(get_async_db),
+    db: AsyncSession = Depends(get_read_db),
 ):
     if min_price is not None and max_price is not None and min_price > max_price:
         raise HTTPException(
@@ -31,6 +77,30 @@ async def get_all_products(
             detail="min_price не может быть больше max_price",
         )
 
+    search_value = " ".join(search.split()).lower() if search else ""  # Поиск не зависит от регистра и пробелов
+    if page <= PRODUCT_LIST_CACHE_PAGES and not search_value and (min_price, max_price, in_stock, seller_id) == (None,) * 4:
+        return await list_cache.get(request, (category_id, page, page_size), lambda session: _query_products(
+            session, page, page_size, category_id, search_value, min_price, max_price, in_stock, seller_id,
+        ), db)
+
+    key = (page, page_size, category_id, search_value, min_price, max_price, in_stock, seller_id)
+    body = await list_flights.do(key, lambda: _query_products(
+        db, page, page_size, category_id, search_value, min_price, max_price, in_stock, seller_id,
+    ))
+    return _json_response(body)
+
+
+async def _query_products(
+    db: AsyncSession,
+    page: int,
+    page_size: int,
+    category_id: int | None,
+    search_value: str,
+    min_price: float | None,
+    max_price: float | None,
+    in_stock: bool | None,
+    seller_id: int | None,
+) -> bytes:
     filters = [ProductModel.is_active.is_(True)]
 
     if category_id is not None:
@@ -40,65 +110,37 @@ async def get_all_products(
     if max_price is not None:
         filters.append(ProductModel.price <= max_price)
     if in_stock is not None:
-        filters.append(ProductModel.stock > 0 if in_stock else ProductModel.stock == 0)
+        filters.append(ProductModel.available_stock > 0 if in_stock else ProductModel.available_stock == 0)
     if seller_id is not None:
         filters.append(ProductModel.seller_id == seller_id)
 
     # Базовый запрос total
     total_stmt = select(func.count()).select_from(ProductModel).where(*filters)
+    products_stmt = select(ProductModel).where(*filters)
 
-    rank_col = None
-    if search:  # Проверяем, передан ли параметр search
-        search_value = search.strip()  # Удаляем пробелы в начале/конце
-        if search_value:  # Проверяем, что после trim не пустая строка
-            # Например websearch_to_tsquery('english', 'cats -dogs "cute animals"') вернёт tsquery соответствующий поиску:
-            # слову cats
-            # без слова dogs
-            # и точной фразе "cute animals"
-            ts_query = func.websearch_to_tsquery('english', search_value)
-            # Добавляем full-text фильтр @@
-            filters.append(ProductModel.tsv.op('@@')(ts_query))
-            # Ранг с "coverage density" (ts_rank_cd) устойчивее к длинным текстам
-            rank_col = func.ts_rank_cd(ProductModel.tsv, ts_query).label("rank")
-            # total с учётом полнотекстового фильтра
-            total_stmt = select(func.count()).select_from(ProductModel).where(*filters)
+    if search_value:
+        # Полнотекстовый фильтр и ранг зависят от СУБД (см. app/search.py)
+        total_stmt, _ = apply_product_search(total_stmt, search_value)
+        products_stmt, rank_col = apply_product_search(products_stmt, search_value)
+        products_stmt = products_stmt.add_columns(rank_col.label("rank")).order_by(desc("rank"), ProductModel.id)
+    else:
+        products_stmt = products_stmt.order_by(ProductModel.id)
 
     total = await db.scalar(total_stmt) or 0
 
-    # Основной запрос (если есть поиск — добавим ранг в выборку и сортировку)
-    if rank_col is not None:
-        products_stmt = (
-            select(ProductModel, rank_col)
-            .where(*filters)
-            .order_by(desc(rank_col), ProductModel.id)
-            .offset((page - 1) * page_size)
-            .limit(page_size)
-        )
-        result = await db.execute(products_stmt)
-        rows = result.all()
-        items = [row[0] for row in rows]    # сами объекты
-        # при желании можно вернуть ранг в ответе
-        # ranks = [row.rank for row in rows]
-    else:
-        products_stmt = (
-            select(ProductModel)
-            .where(*filters)
-            .order_by(ProductModel.id)
-            .offset((page - 1) * page_size)
-            .limit(page_size)
-        )
-        items = (await db.scalars(products_stmt)).all()
+    result = await db.execute(products_stmt.offset((page - 1) * page_size).limit(page_size))
+    items = [row[0] for row in result.all()]  # сами объекты, ранг в ответ не попадает
 
-    return {
+    return ProductList.model_validate({
         "items": items,
         "total": total,
         "page": page,
         "page_size": page_size,
-    }
+    }).model_dump_json().encode()
 
 
 @router.get("/category/{category_id}", response_model=list[ProductSchema])
-async def get_products_by_category(category_id: int, db: AsyncSession = Depends(get_async_db)):
+async def get_products_by_category(category_id: int, db: AsyncSession = Depends(get_read_db)):
     """
     Возвращает список активных товаров в указанной категории по её ID.
     """
@@ -117,19 +159,99 @@ async def get_products_by_category(category_id: int, db: AsyncSession = Depends(
     return result.all()
 
 
+def _ids_filter(ids: list[int]):
+    if IS_SQLITE:
+        return ProductModel.id.in_(ids)
+    # Один параметр-массив: текст запроса не зависит от числа id и переиспользуется в кэше подготовленных запросов
+    return ProductModel.id == any_(bindparam("ids", ids, type_=ARRAY(Integer)))
+
+
+async def _products_batch(db: AsyncSession, ids: list[int]) -> Response:
+    ids = list(dict.fromkeys(ids))  # повторы отдаём один раз, порядок первого вхождения
+    bodies: dict[int, bytes] = {}
+    for product_id in ids:
+        cached = product_cache.get(product_id)
+        if cached is not None:
+            bodies[product_id] = cached
+
+    to_load = [product_id for product_id in ids if product_id not in bodies]
+    if to_load:
+        versions = {product_id: product_cache.version(product_id) for product_id in to_load}
+        async with _fill_session(db, to_load) as session:
+            products = (await session.scalars(
+                select(ProductModel).where(_ids_filter(to_load), ProductModel.is_active == True)
+            )).all()
+        for product in products:
+            body = ProductSchema.model_validate(product).model_dump_json().encode()
+            product_cache.set(product.id, body, version=versions[product.id])
+            bodies[product.id] = body
+
+    # Карточки в кэше уже сериализованы — собираем ответ ProductBatch из готовых фрагментов JSON
+    items = b",".join(bodies[product_id] for product_id in ids if product_id in bodies)
+    missing = ",".join(str(product_id) for product_id in ids if product_id not in bodies)
+    return _json_response(b'{"items":[' + items + b'],"missing":[' + missing.encode() + b"]}")
+
+
+@router.get("/batch", response_model=ProductBatch)
+async def get_products_batch(
+    ids: str = Query(..., description="ID товаров через запятую, например 1,2,3"),
+    db: AsyncSession = Depends(get_read_db),
+):
+    """
+    Возвращает активные товары по списку ID одним запросом к БД, в порядке запроса.
+    Для длинных списков — POST /products/batch.
+    """
+    try:
+        product_ids = [int(value) for value in ids.split(",") if value.strip()]
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                            detail="ids должен быть списком целых чисел через запятую")
+    if not product_ids:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Не указан ни один ID")
+    if len(product_ids) > PRODUCT_BATCH_MAX_IDS:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                            detail=f"Не больше {PRODUCT_BATCH_MAX_IDS} ID за запрос")
+    if not all(1 <= product_id <= PRODUCT_ID_MAX for product_id in product_ids):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                            detail=f"ID товаров должны быть от 1 до {PRODUCT_ID_MAX}")
+    return await _products_batch(db, product_ids)
+
+
+@router.post("/batch", response_model=ProductBatch)
+async def post_products_batch(batch: ProductBatchRequest, db: AsyncSession = Depends(get_read_db)):
+    """
+    То же, что GET /products/batch, но список ID передаётся в теле запроса.
+    """
+    return await _products_batch(db, batch.ids)
+
+
 @router.get("/{product_id}", response_model=ProductSchema)
-async def get_product(product_id: int, db: AsyncSession = Depends(get_async_db)):
+async def get_product(product_id: int, db: AsyncSession = Depends(get_read_db)):
     """
     Возвращает детальную информацию о товаре по его ID.
     """
-    result = await db.scalars(
-        select(ProductModel).where(ProductModel.id == product_id, ProductModel.is_active == True)
-    )
-    product = result.first()
-    if not product:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
-                            detail="Product not found or inactive")
-    return product
+    cached = product_cache.get(product_id)
+    if cached is not None:
+        return _json_response(cached)
+    # Версия ключа в ключе схлопывания: запрос, пришедший после инвалидации товара,
+    # не присоединится к более раннему чтению
+    version = product_cache.version(product_id)
+    body = await product_flights.do((product_id, version), lambda: _query_product(db, product_id, version))
+    return _json_response(body)
+
+
+async def _query_product(db: AsyncSession, product_id: int, version: tuple[int, int]) -> bytes:
+    async with _fill_session(db, [product_id]) as session:
+        result = await session.scalars(
+            select(ProductModel).where(ProductModel.id == product_id, ProductModel.is_active == True)
+        )
+        product = result.first()
+        if not product:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
+                                detail="Product not found or inactive")
+        body = ProductSchema.model_validate(product).model_dump_json().encode()
+    product_cache.set(product_id, body, version=version)
+    return body
 
 
 @router.post("/", response_model=ProductSchema, status_code=status.HTTP_201_CREATED)
@@ -149,6 +271,7 @@ async def create_product(
     db_product = ProductModel(**product.model_dump(), seller_id=current_user.id)
     db.add(db_product)
     await db.commit()
+    publish("catalog")  # новый товар меняет списки
     await db.refresh(db_product)  # Для получения id и is_active из базы
     return db_product
 
@@ -174,10 +297,15 @@ async def update_product(
     )
     if not category_result.first():
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Category not found or inactive")
+    values = product.model_dump()
+    if db_product.stock_sharded:
+        await set_stock(db, product_id, values.pop("stock"))
     await db.execute(
-        update(ProductModel).where(ProductModel.id == product_id).values(**product.model_dump())
+        update(ProductModel).where(ProductModel.id == product_id).values(**values)
     )
     await db.commit()
+    publish("products", [product_id])
+    publish("catalog")
     await db.refresh(db_product)  # Для консистентности данных
     return db_product
 
@@ -203,5 +331,7 @@ async def delete_product(
         update(ProductModel).where(ProductModel.id == product_id).values(is_active=False)
     )
     await db.commit()
+    publish("products", [product_id])
+    publish("catalog")
     await db.refresh(product)  # Для возврата is_active = False
     return product
@@ -1,5 +1,8 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy import select, update, func
+from datetime import datetime
+from typing import Literal
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy import Select, and_, or_, select, tuple_, update
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.models.reviews import Review as ReviewModel
@@ -7,38 +10,108 @@ from app.models.products import Product as ProductModel
 from app.models.categories import Category as CategoryModel
 from app.models.users import User as UserModel
 from app.auth import get_current_buyer, get_current_admin
-from app.schemas import Review as ReviewSchema, ReviewCreate
-from app.db_depends import get_async_db
+from app.schemas import Review as ReviewSchema, ReviewCreate, ReviewList
+from app.dataloader import product_loader
+from app.db_depends import get_async_db, get_read_db
+from app.invalidation import publish
+from app.pagination import decode_cursor, encode_cursor
+from app.ratings import rating_from_aggregates
 
 
 router = APIRouter(prefix="/reviews", tags=["reviews"])
 
-async def update_product_rating(db: AsyncSession, product_id: int):
-    result = await db.execute(
-        select(func.avg(ReviewModel.grade)).where(
-            ReviewModel.product_id == product_id,
-            ReviewModel.is_active == True
+ReviewSort = Literal["newest", "highest", "lowest"]
+
+async def update_product_rating(db: AsyncSession, product_id: int, grade: int, delta: int):
+    """
+    Атомарно добавляет (delta=1) или убирает (delta=-1) оценку из агрегатов товара.
+    Не коммитит — изменение попадает в транзакцию записи отзыва.
+    """
+    rating_sum = ProductModel.rating_sum + delta * grade
+    review_count = ProductModel.review_count + delta
+    grade_column = f"grade_{grade}_count"
+    await db.execute(
+        update(ProductModel)
+        .where(ProductModel.id == product_id)
+        .values(
+            rating_sum=rating_sum,
+            review_count=review_count,
+            rating=rating_from_aggregates(rating_sum, review_count),
+            **{grade_column: getattr(ProductModel, grade_column) + delta},
         )
+        .execution_options(synchronize_session=False)
     )
-    avg_rating = result.scalar() or 0.0
-    product = await db.get(ProductModel, product_id)
-    product.rating = avg_rating
-    await db.commit()
 
 
-@router.get("/", response_model=list[ReviewSchema])
-async def get_all_reviews(db: AsyncSession = Depends(get_async_db)):
+async def _paginate_reviews(
+    db: AsyncSession, stmt: Select, sort: ReviewSort, cursor: str | None, page_size: int
+) -> tuple[list[ReviewModel], str | None]:
+    """
+    Keyset-пагинация отзывов: сортировка всегда заканчивается (comment_date DESC, id DESC),
+    чтобы курсор однозначно задавал позицию.
+    """
+    recency = (ReviewModel.comment_date.desc(), ReviewModel.id.desc())
+    if sort == "newest":
+        stmt = stmt.order_by(*recency)
+    elif sort == "highest":
+        stmt = stmt.order_by(ReviewModel.grade.desc(), *recency)
+    else:
+        stmt = stmt.order_by(ReviewModel.grade.asc(), *recency)
+
+    if cursor is not None:
+        if sort == "newest":
+            comment_date, review_id = decode_cursor(cursor, datetime, int)
+            stmt = stmt.where(
+                tuple_(ReviewModel.comment_date, ReviewModel.id) < tuple_(comment_date, review_id)
+            )
+        else:
+            grade, comment_date, review_id = decode_cursor(cursor, int, datetime, int)
+            after_same_grade = and_(
+                ReviewModel.grade == grade,
+                tuple_(ReviewModel.comment_date, ReviewModel.id) < tuple_(comment_date, review_id),
+            )
+            next_grades = ReviewModel.grade < grade if sort == "highest" else ReviewModel.grade > grade
+            stmt = stmt.where(or_(next_grades, after_same_grade))
+
+    reviews = list((await db.scalars(stmt.limit(page_size + 1))).all())
+    next_cursor = None
+    if len(reviews) > page_size:
+        reviews = reviews[:page_size]
+        last = reviews[-1]
+        if sort == "newest":
+            next_cursor = encode_cursor(last.comment_date, last.id)
+        else:
+            next_cursor = encode_cursor(last.grade, last.comment_date, last.id)
+    return reviews, next_cursor
+
+
+@router.get("/", response_model=ReviewList)
+async def get_all_reviews(
+    page_size: int = Query(20, ge=1, le=100),
+    cursor: str | None = Query(None, description="Курсор из next_cursor предыдущей страницы"),
+    sort: ReviewSort = Query("newest", description="newest, highest или lowest"),
+    db: AsyncSession = Depends(get_read_db),
+):
     """
-    Возвращает список всех активных отзывов.
+    Возвращает активные отзывы постранично.
     """
-    result = await db.scalars(select(ReviewModel).where(ReviewModel.is_active == True))
-    return result.all()
+    reviews, next_cursor = await _paginate_reviews(
+        db, select(ReviewModel).where(ReviewModel.is_active == True), sort, cursor, page_size
+    )
+    return ReviewList(items=reviews, page_size=page_size, next_cursor=next_cursor)
 
 
-@router.get("/products/{product_id}/reviews/", response_model=list[ReviewSchema])
-async def get_reviews_by_product(product_id: int, db: AsyncSession = Depends(get_async_db)):
+@router.get("/products/{product_id}/reviews/", response_model=ReviewList)
+async def get_reviews_by_product(
+    product_id: int,
+    page_size: int = Query(20, ge=1, le=100),
+    cursor: str | None = Query(None, description="Курсор из next_cursor предыдущей страницы"),
+    sort: ReviewSort = Query("newest", description="newest, highest или lowest"),
+    include_distribution: bool = Query(False, description="Добавить распределение оценок"),
+    db: AsyncSession = Depends(get_read_db),
+):
     """
-    Возвращает список активных отзывов в по указанному продукту по его ID.
+    Возвращает активные отзывы по указанному продукту постранично.
     """
     result = await db.scalars(
         select(ProductModel).where(ProductModel.id == product_id,
@@ -48,11 +121,21 @@ async def get_reviews_by_product(product_id: int, db: AsyncSession = Depends(get
     if not product:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
                             detail="Product not found or inactive")
-    result = await db.scalars(
+    reviews, next_cursor = await _paginate_reviews(
+        db,
         select(ReviewModel).where(ReviewModel.product_id == product_id,
-                                  ReviewModel.is_active == True)
+                                  ReviewModel.is_active == True),
+        sort, cursor, page_size,
     )
-    return result.all()
+
+    grade_distribution = None
+    if include_distribution:
+        # Гистограмма поддерживается на товаре вместе с агрегатами рейтинга
+        grade_distribution = {
+            grade: getattr(product, f"grade_{grade}_count") for grade in range(1, 6)
+        }
+    return ReviewList(items=reviews, page_size=page_size, next_cursor=next_cursor,
+                      grade_distribution=grade_distribution)
 
 
 @router.post("/", response_model=ReviewSchema, status_code=status.HTTP_201_CREATED)
@@ -64,18 +147,16 @@ async def create_review(
     """
     Создаёт новый отзыв, привязанный к текущему покупателю (только для 'buyer').
     """
-    product_result = await db.scalars(
-        select(ProductModel).where(ProductModel.id == review.product_id, ProductModel.is_active == True)
-    )
-    if not product_result.first():
+    product = await product_loader(db).load(review.product_id)
+    if product is None or not product.is_active:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Product not found or inactive")
 
     db_review = ReviewModel(**review.model_dump(), user_id=current_user.id)
     db.add(db_review)
+    await update_product_rating(db=db, product_id=review.product_id, grade=review.grade, delta=1)
     await db.commit()
+    publish("products", [review.product_id])  # изменились rating и review_count
     await db.refresh(db_review)  # Для получения id и is_active из базы
-
-    await update_product_rating(db=db, product_id=review.product_id)
     return db_review
 
 
@@ -95,11 +176,15 @@ async def delete_review(
     if not review:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Review not found or inactive")
 
-    await db.execute(
-        update(ReviewModel).where(ReviewModel.id == review_id).values(is_active=False)
+    result = await db.execute(
+        update(ReviewModel)
+        .where(ReviewModel.id == review_id, ReviewModel.is_active == True)
+        .values(is_active=False)
     )
+    if result.rowcount:  # Конкурентное удаление уже могло вычесть оценку
+        await update_product_rating(db=db, product_id=review.product_id, grade=review.grade, delta=-1)
     await db.commit()
+    if result.rowcount:
+        publish("products", [review.product_id])
     await db.refresh(review)  # Для возврата is_active = False
-
-    await update_product_rating(db=db, product_id=review.product_id)
     return review
@@ -10,6 +10,7 @@ from app.schemas import UserCreate, User as UserSchema
 from app.db_depends import get_async_db
 from app.config import SECRET_KEY, ALGORITHM
 from app.schemas import UserCreate, User as UserSchema, RefreshTokenRequest
+from app.invalidation import publish
 from app.auth import hash_password, verify_password, create_access_token, create_refresh_token
 
 
@@ -37,6 +38,7 @@ async def create_user(user: UserCreate, db: AsyncSession = Depends(get_async_db)
     # Добавление в сессию и сохранение в базе
     db.add(db_user)
     await db.commit()
+    publish("users", [db_user.email])
     return db_user
 
 
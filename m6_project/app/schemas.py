@@ -1,6 +1,6 @@
-from pydantic import BaseModel, Field, ConfigDict, EmailStr
+from pydantic import AliasChoices, BaseModel, Field, ConfigDict, EmailStr
 from decimal import Decimal
-from typing import Optional
+from typing import Annotated, Optional
 from datetime import datetime
 
 
@@ -52,9 +52,12 @@ class Product(BaseModel):
     description: str | None = Field(None, description="Описание товара")
     price: Decimal = Field(..., description="Цена товара в рублях", gt=0, decimal_places=2)
     image_url: str | None = Field(None, description="URL изображения товара")
-    stock: int = Field(..., description="Количество товара на складе")
+    # available_stock учитывает шардированные остатки (см. app/inventory.py)
+    stock: int = Field(..., validation_alias=AliasChoices("available_stock", "stock"),
+                       description="Количество товара на складе")
     category_id: int = Field(..., description="ID категории")
     rating: Decimal = Field(..., description="Рейтинг товара на основе отзывов", ge=0, le=5, decimal_places=2)
+    review_count: int = Field(0, ge=0, description="Количество активных отзывов")
     is_active: bool = Field(..., description="Активность товара")
     created_at: datetime = Field(..., description="Дата создания товара")
     updated_at: datetime = Field(..., description="Дата обновления товара")
@@ -115,6 +118,18 @@ class Review(BaseModel):
     model_config = ConfigDict(from_attributes=True)
 
 
+class ReviewList(BaseModel):
+    """
+    Страница отзывов с курсорной пагинацией.
+    """
+    items: list[Review] = Field(description="Отзывы для текущей страницы")
+    page_size: int = Field(ge=1, description="Количество элементов на странице")
+    next_cursor: str | None = Field(None, description="Курсор следующей страницы, если она есть")
+    grade_distribution: dict[int, int] | None = Field(
+        None, description="Количество активных отзывов по каждой оценке (1-5)"
+    )
+
+
 class ProductList(BaseModel):
     """
     Список пагинации для товаров.
@@ -127,6 +142,26 @@ class ProductList(BaseModel):
     model_config = ConfigDict(from_attributes=True)  # Для чтения из ORM-объектов
 
 
+PRODUCT_BATCH_MAX_IDS = 500
+PRODUCT_ID_MAX = 2 ** 31 - 1  # products.id — INTEGER; большие значения asyncpg не передаст в запрос
+ProductId = Annotated[int, Field(ge=1, le=PRODUCT_ID_MAX)]
+
+
+class ProductBatchRequest(BaseModel):
+    """
+    Модель запроса пакета товаров по ID (POST /products/batch).
+    """
+    ids: list[ProductId] = Field(min_length=1, max_length=PRODUCT_BATCH_MAX_IDS, description="ID товаров в нужном порядке")
+
+
+class ProductBatch(BaseModel):
+    """
+    Товары по списку ID в порядке запроса и ID, которых нет среди активных товаров.
+    """
+    items: list[Product] = Field(description="Найденные товары")
+    missing: list[int] = Field(description="ID несуществующих или неактивных товаров")
+
+
 class CartItemBase(BaseModel):
     product_id: int = Field(description="ID товара")
     quantity: int = Field(ge=1, description="Количество товара")
@@ -167,7 +202,10 @@ class OrderItem(BaseModel):
     quantity: int = Field(..., ge=1, description="Количество")
     unit_price: Decimal = Field(..., ge=0, description="Цена за единицу на момент покупки")
     total_price: Decimal = Field(..., ge=0, description="Сумма по позиции")
-    product: Product | None = Field(None, description="Полная информация о товаре")
+    product_name: str = Field(..., description="Название товара на момент покупки")
+    product_image_url: str | None = Field(None, description="URL изображения товара на момент покупки")
+    product_category_id: int | None = Field(None, description="ID категории товара на момент покупки")
+    product: Product | None = Field(None, description="Текущая информация о товаре (только с include_product=true)")
 
     model_config = ConfigDict(from_attributes=True)
 
@@ -184,10 +222,34 @@ class Order(BaseModel):
     model_config = ConfigDict(from_attributes=True)
 
 
+class OrderSummary(BaseModel):
+    """Заголовок заказа без позиций — для краткого режима списка."""
+    id: int = Field(..., description="ID заказа")
+    user_id: int = Field(..., description="ID пользователя")
+    status: str = Field(..., description="Текущий статус заказа")
+    total_amount: Decimal = Field(..., ge=0, description="Общая стоимость")
+    created_at: datetime = Field(..., description="Когда заказ был создан")
+    updated_at: datetime = Field(..., description="Когда последний раз обновлялся")
+    items_count: int = Field(..., ge=0, description="Количество позиций в заказе")
+
+    model_config = ConfigDict(from_attributes=True)
+
+
 class OrderList(BaseModel):
     items: list[Order] = Field(..., description="Заказы на текущей странице")
-    total: int = Field(ge=0, description="Общее количество заказов")
-    page: int = Field(ge=1, description="Текущая страница")
+    total: int | None = Field(None, ge=0, description="Общее количество заказов (None при курсорной пагинации)")
+    page: int | None = Field(None, ge=1, description="Текущая страница (None при курсорной пагинации)")
+    page_size: int = Field(ge=1, description="Размер страницы")
+    next_cursor: str | None = Field(None, description="Курсор следующей страницы, если она есть")
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+class OrderSummaryList(BaseModel):
+    items: list[OrderSummary] = Field(..., description="Заголовки заказов на текущей странице")
+    total: int | None = Field(None, ge=0, description="Общее количество заказов (None при курсорной пагинации)")
+    page: int | None = Field(None, ge=1, description="Текущая страница (None при курсорной пагинации)")
     page_size: int = Field(ge=1, description="Размер страницы")
+    next_cursor: str | None = Field(None, description="Курсор следующей страницы, если она есть")
 
     model_config = ConfigDict(from_attributes=True)
\ No newline at end of file
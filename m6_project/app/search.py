@@ -0,0 +1,75 @@
+import re
+
+from sqlalchemy import ColumnElement, Select, false, func, literal, literal_column, select
+from sqlalchemy.sql import column, table
+
+from app.database import IS_SQLITE
+from app.models.products import Product as ProductModel
+
+
+# FTS5-таблица создаётся DDL-событиями модели Product и не входит в метаданные (см. app/models/products.py)
+products_fts = table("products_fts", column("rowid"), column("name"), column("description"))
+# Веса колонок для bm25: как setweight 'A'/'B' и веса ts_rank_cd по умолчанию (1.0 и 0.4)
+FTS_COLUMN_WEIGHTS = (1.0, 0.4)
+
+_TOKEN_RE = re.compile(r'(-?)"([^"]*)"|(-?)([^\s"]+)')
+_WORD_RE = re.compile(r"\w+")
+
+
+def websearch_to_fts5(query: str) -> str | None:
+    """
+    Переводит синтаксис websearch_to_tsquery (слова, "фраза", -исключение, or) в запрос FTS5 MATCH.
+    Возвращает None, если в запросе нет ни одного искомого слова.
+    """
+    groups: list[tuple[list[str], list[str]]] = [([], [])]
+    for match in _TOKEN_RE.finditer(query):
+        negated = bool(match.group(1) or match.group(3))
+        raw = match.group(2) if match.group(2) is not None else match.group(4)
+        if match.group(4) is not None and raw.lower() == "or" and not negated:
+            if groups[-1][0]:
+                groups.append(([], []))
+            continue
+        words = _WORD_RE.findall(raw)
+        if not words:
+            continue
+        term = '"' + " ".join(words) + '"'
+        groups[-1][1 if negated else 0].append(term)
+
+    # FTS5 не умеет отрицание без положительного операнда: группы из одних исключений отбрасываем
+    clauses = [
+        " AND ".join(positives) + "".join(f" NOT {term}" for term in negatives)
+        for positives, negatives in groups
+        if positives
+    ]
+    return " OR ".join(f"({clause})" for clause in clauses) or None
+
+
+def apply_product_search(stmt: Select, query: str) -> tuple[Select, ColumnElement]:
+    """
+    Добавляет к запросу по products полнотекстовый фильтр и возвращает (запрос, ранг).
+    Чем больше ранг, тем релевантнее товар. PostgreSQL: tsv + websearch_to_tsquery + ts_rank_cd,
+    SQLite: FTS5 MATCH + bm25.
+    """
+    if IS_SQLITE:
+        fts_query = websearch_to_fts5(query)
+        if fts_query is None:
+            return stmt.where(false()), literal(0.0)
+        fts = literal_column(products_fts.name)
+        matches = (
+            select(
+                products_fts.c.rowid.label("product_id"),
+                # bm25 тем меньше, чем лучше совпадение, — меняем знак
+                (-func.bm25(fts, *FTS_COLUMN_WEIGHTS)).label("rank"),
+            )
+            .where(fts.match(fts_query))
+            .subquery("fts_matches")
+        )
+        return stmt.join(matches, matches.c.product_id == ProductModel.id), matches.c.rank
+
+    # Например websearch_to_tsquery('english', 'cats -dogs "cute animals"') вернёт tsquery соответствующий поиску:
+    # слову cats
+    # без слова dogs
+    # и точной фразе "cute animals"
+    ts_query = func.websearch_to_tsquery('english', query)
+    # Ранг с "coverage density" (ts_rank_cd) устойчивее к длинным текстам
+    return stmt.where(ProductModel.tsv.op('@@')(ts_query)), func.ts_rank_cd(ProductModel.tsv, ts_query)
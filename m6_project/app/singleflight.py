@@ -0,0 +1,88 @@
+import asyncio
+from collections.abc import Awaitable, Callable, Hashable
+from typing import TypeVar
+
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """
+    Схлопывание одинаковых одновременных запросов: пока выполняется запрос с некоторым ключом,
+    остальные запросы с тем же ключом ждут его результата, а не идут в БД сами.
+    Результатом удобно делать уже сериализованный ответ — тогда и JSON собирается один раз.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._calls: dict[Hashable, asyncio.Future] = {}
+        self.executions = 0
+        self.collapsed = 0
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[T]]) -> T:
+        while True:
+            future = self._calls.get(key)
+            if future is None:
+                break
+            self.collapsed += 1
+            try:
+                # shield: отмена одного ожидающего не должна отменять общий результат
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise
+                # Отменили сам выполняющий запрос — выполняем запрос заново
+                self.collapsed -= 1
+
+        future = asyncio.get_running_loop().create_future()
+        self._calls[key] = future
+        self.executions += 1
+        try:
+            result = await func()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as exc:
+            # Ожидающие получают ту же ошибку (например, HTTPException 404)
+            future.set_exception(exc)
+            future.exception()  # помечаем как полученную, если ожидающих не было
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            if self._calls.get(key) is future:
+                del self._calls[key]
+
+    def in_flight(self) -> int:
+        return len(self._calls)
+
+
+_groups: dict[str, SingleFlight] = {}
+
+
+def register_group(name: str) -> SingleFlight:
+    """
+    Создаёт группу схлопывания (или возвращает уже созданную).
+    """
+    group = _groups.get(name)
+    if group is None:
+        group = _groups[name] = SingleFlight(name)
+    return group
+
+
+def prometheus_lines() -> list[str]:
+    """
+    Метрики схлопывания для /metrics.
+    """
+    families = (
+        ("singleflight_executions_total", "counter", lambda group: group.executions),
+        ("singleflight_collapsed_total", "counter", lambda group: group.collapsed),
+        ("singleflight_in_flight", "gauge", lambda group: group.in_flight()),
+    )
+    lines = []
+    for metric, kind, value in families:
+        lines.append(f"# TYPE {metric} {kind}")
+        for name, group in _groups.items():
+            lines.append(f'{metric}{{group="{name}"}} {value(group)}')
+    return lines
@@ -0,0 +1,119 @@
+import logging
+from collections import Counter, deque
+from contextvars import ContextVar
+from dataclasses import dataclass
+from time import perf_counter
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.config import SLOW_REQUEST_MS, SLOW_REQUEST_QUERIES, SQL_DETECT_N_PLUS_ONE, SQL_N_PLUS_ONE_THRESHOLD
+from app.metrics import is_warmup
+
+
+logger = logging.getLogger("app.sql")
+
+
+@dataclass
+class RequestSqlStats:
+    statements: int = 0
+    db_time: float = 0.0
+    statement_counts: Counter | None = None  # заполняется только в режиме детектора N+1
+
+
+@dataclass
+class NPlusOneReport:
+    route: str
+    statement: str
+    count: int
+
+
+_current_stats: ContextVar[RequestSqlStats | None] = ContextVar("request_sql_stats", default=None)
+
+# Последние найденные N+1 — тесты могут проверять, что список пуст
+n_plus_one_reports: deque[NPlusOneReport] = deque(maxlen=100)
+
+
+def current_sql_stats() -> RequestSqlStats | None:
+    return _current_stats.get()
+
+
+def instrument_sql(engine: AsyncEngine) -> None:
+    """
+    Считает SQL-запросы и время в БД для текущего HTTP-запроса.
+    Контекст передаётся в greenlet SQLAlchemy, поэтому ContextVar виден в обработчиках событий.
+    """
+    @event.listens_for(engine.sync_engine, "before_cursor_execute")
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if _current_stats.get() is not None:
+            context._request_sql_start = perf_counter()
+
+    @event.listens_for(engine.sync_engine, "after_cursor_execute")
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        stats = _current_stats.get()
+        start = getattr(context, "_request_sql_start", None)
+        if stats is None or start is None:
+            return
+        stats.statements += 1
+        stats.db_time += perf_counter() - start
+        if stats.statement_counts is not None:
+            stats.statement_counts[statement] += 1
+
+
+def _route_name(scope: Scope) -> str:
+    route = scope.get("route")
+    return getattr(route, "path", None) or scope.get("path", "")
+
+
+class SqlStatsMiddleware:
+    """
+    ASGI-middleware: добавляет заголовок Server-Timing с числом запросов и временем в БД,
+    логирует медленные запросы и, в режиме детектора, повторяющиеся SQL (N+1).
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        # Первые запросы прогрева медленные (компиляция SQL) — в журнал медленных запросов они не попадают
+        if scope["type"] != "http" or is_warmup(scope):
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestSqlStats(statement_counts=Counter() if SQL_DETECT_N_PLUS_ONE else None)
+        token = _current_stats.set(stats)
+        start = perf_counter()
+
+        async def send_with_timing(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                total_ms = (perf_counter() - start) * 1000
+                headers = MutableHeaders(scope=message)
+                headers.append(
+                    "Server-Timing",
+                    f'db;dur={stats.db_time * 1000:.2f};desc="{stats.statements} queries", '
+                    f"app;dur={total_ms:.2f}",
+                )
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current_stats.reset(token)
+            self._report(scope, stats, (perf_counter() - start) * 1000)
+
+    @staticmethod
+    def _report(scope: Scope, stats: RequestSqlStats, total_ms: float) -> None:
+        route = _route_name(scope)
+        if total_ms >= SLOW_REQUEST_MS or stats.statements >= SLOW_REQUEST_QUERIES:
+            logger.warning(
+                "Slow request %s %s: %.1f ms total, %d queries, %.1f ms in DB",
+                scope["method"], route, total_ms, stats.statements, stats.db_time * 1000,
+            )
+        if stats.statement_counts:
+            for statement, count in stats.statement_counts.items():
+                if count >= SQL_N_PLUS_ONE_THRESHOLD:
+                    n_plus_one_reports.append(NPlusOneReport(route=route, statement=statement, count=count))
+                    logger.warning("Possible N+1 in %s %s: statement executed %d times: %s",
+                                   scope["method"], route, count, statement)
@@ -0,0 +1,101 @@
+"""
+Холодный старт воркера: время от запуска процесса до первого байта ответа и задержки
+первых запросов — с прогревом в lifespan (STARTUP_WARMUP=1) и без него.
+
+Каждый раунд запускает отдельный uvicorn с той же БД (DATABASE_URL из окружения),
+ждёт первого успешного ответа на --path и замеряет первые --requests последовательных запросов
+(включая первый).
+
+Запуск из m6_project:
+    python -m benchmarks.bench_cold_start --path /products/1 --rounds 3
+"""
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import httpx
+
+
+PROJECT_DIR = Path(__file__).resolve().parent.parent
+STARTUP_TIMEOUT = 60.0
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _percentile(sorted_values: list[float], percent: float) -> float:
+    rank = max(int(round(percent / 100 * len(sorted_values) + 0.5)) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+def _run_once(warmup: bool, path: str, requests: int) -> dict[str, float]:
+    port = _free_port()
+    env = {**os.environ, "STARTUP_WARMUP": "1" if warmup else "0"}
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=PROJECT_DIR, env=env,
+    )
+    try:
+        with httpx.Client(base_url=f"http://127.0.0.1:{port}", timeout=30) as client:
+            # Ждём, пока воркер начнёт принимать соединения и вернёт первый ответ
+            while True:
+                if server.poll() is not None:
+                    raise SystemExit(f"uvicorn завершился с кодом {server.returncode}")
+                if time.perf_counter() - started > STARTUP_TIMEOUT:
+                    raise SystemExit("Воркер не ответил за отведённое время")
+                try:
+                    request_start = time.perf_counter()
+                    response = client.get(path)
+                except httpx.TransportError:
+                    time.sleep(0.005)
+                    continue
+                break
+            first_byte = time.perf_counter() - started
+            first_request = time.perf_counter() - request_start
+            if response.status_code >= 500:
+                raise SystemExit(f"{path} вернул {response.status_code}")
+
+            latencies = [first_request]
+            for _ in range(requests - 1):
+                request_start = time.perf_counter()
+                client.get(path)
+                latencies.append(time.perf_counter() - request_start)
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+    latencies.sort()
+    return {
+        "time_to_first_byte_ms": first_byte * 1000,
+        "first_request_ms": first_request * 1000,
+        "first_n_p50_ms": _percentile(latencies, 50) * 1000,
+        "first_n_p95_ms": _percentile(latencies, 95) * 1000,
+        "first_n_max_ms": latencies[-1] * 1000,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Холодный старт воркера с прогревом и без")
+    parser.add_argument("--path", default="/products/1", help="запрос, который ждём после старта")
+    parser.add_argument("--requests", type=int, default=100, help="сколько первых запросов замерить")
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args()
+
+    for warmup in (False, True):
+        runs = [_run_once(warmup, args.path, args.requests) for _ in range(args.rounds)]
+        print(f"STARTUP_WARMUP={int(warmup)} (median of {args.rounds} runs):")
+        for metric in runs[0]:
+            print(f"  {metric:24} {statistics.median(run[metric] for run in runs):9.2f}")
+
+
+if __name__ == "__main__":
+    main()
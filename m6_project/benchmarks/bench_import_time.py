@@ -0,0 +1,94 @@
+"""
+Время импорта приложения по данным python -X importtime и бюджет на него.
+
+Несколько раз импортирует app.main в свежем процессе, печатает медианное время импорта,
+вклад пакетов верхнего уровня и самые дорогие модули. Затем проверяет бюджет из
+benchmarks/import_budget.json: общий лимит в миллисекундах и список модулей, которые
+не должны загружаться при импорте (они подгружаются лениво, при первом использовании).
+
+Запуск из m6_project:
+    python -m benchmarks.bench_import_time --runs 7
+    python -m benchmarks.bench_import_time --budget-ms 600   # лимит под конкретную машину CI
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+from pathlib import Path
+
+
+PROJECT_DIR = Path(__file__).resolve().parent.parent
+BUDGET_FILE = Path(__file__).resolve().parent / "import_budget.json"
+TARGET_MODULE = "app.main"
+
+
+def _import_profile() -> dict[str, tuple[int, int]]:
+    """
+    Импортирует приложение в отдельном процессе. Возвращает {модуль: (self, cumulative)} в микросекундах.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {TARGET_MODULE}"],
+        cwd=PROJECT_DIR,
+        check=True, capture_output=True, text=True,
+    )
+    modules = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line.removeprefix("import time:").split("|")
+        modules[name.strip()] = (int(self_us), int(cumulative_us))
+    return modules
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Время импорта приложения и бюджет на него")
+    parser.add_argument("--runs", type=int, default=7)
+    parser.add_argument("--top", type=int, default=15, help="сколько самых дорогих модулей показать")
+    parser.add_argument("--budget-ms", type=float, help="перекрывает total_ms из import_budget.json")
+    args = parser.parse_args()
+
+    budget = json.loads(BUDGET_FILE.read_text(encoding="utf-8"))
+    budget_ms = args.budget_ms or budget["total_ms"]
+
+    _import_profile()  # первый запуск компилирует .pyc, в замер не идёт
+    profiles = [_import_profile() for _ in range(args.runs)]
+    totals = [profile[TARGET_MODULE][1] / 1000 for profile in profiles]
+    total_ms = statistics.median(totals)
+
+    self_by_module: dict[str, list[int]] = defaultdict(list)
+    for profile in profiles:
+        for name, (self_us, _) in profile.items():
+            self_by_module[name].append(self_us)
+    median_self = {name: statistics.median(values) / 1000 for name, values in self_by_module.items()}
+    by_package: dict[str, float] = defaultdict(float)
+    for name, self_ms in median_self.items():
+        by_package[name.split(".")[0]] += self_ms
+
+    print(f"import {TARGET_MODULE}: median {total_ms:.1f} ms (min {min(totals):.1f}, max {max(totals):.1f})")
+    print("\nby top-level package (self time):")
+    for package, self_ms in sorted(by_package.items(), key=lambda item: -item[1])[:args.top]:
+        print(f"  {package:30} {self_ms:8.1f} ms")
+    print("\nmost expensive modules (self time):")
+    for name, self_ms in sorted(median_self.items(), key=lambda item: -item[1])[:args.top]:
+        print(f"  {name:50} {self_ms:8.1f} ms")
+
+    failures = []
+    if total_ms > budget_ms:
+        failures.append(f"import time {total_ms:.1f} ms exceeds budget {budget_ms:.0f} ms")
+    imported = set(profiles[0])
+    for module in budget["lazy_modules"]:
+        if module in imported:
+            failures.append(f"{module} is imported eagerly, it must be loaded on first use")
+
+    if failures:
+        print("\nFAIL:")
+        for failure in failures:
+            print(f"  {failure}")
+        sys.exit(1)
+    print(f"\nOK: within {budget_ms:.0f} ms budget, lazy modules are not imported")
+
+
+if __name__ == "__main__":
+    main()
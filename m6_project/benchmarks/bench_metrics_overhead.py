@@ -0,0 +1,142 @@
+"""
+Накладные расходы MetricsMiddleware на GET /products/{id}.
+
+Оба варианта работают в одном процессе: приложение собирается с METRICS_ENABLED=0, а вариант
+с метриками — то же приложение, обёрнутое в MetricsMiddleware. Запросы идут через ASGI-транспорт
+httpx без сети. Варианты чередуются через запрос (порядок пары тоже меняется), поэтому дрейф частоты
+CPU и шум процесса попадают в оба варианта одинаково. В раунде сравниваются медианы задержек
+запросов — единичные паузы GC и планировщика на них не влияют, — а итог берётся медианой по раундам.
+
+БД подменяется заглушкой, а кэш карточек товаров (app/routers/products.py) отключается, чтобы
+каждый запрос доходил до «базы» и измерялась именно обвязка запроса; --db-latency-ms добавляет
+имитацию задержки базы.
+
+Запуск из m6_project: python -m benchmarks.bench_metrics_overhead --requests 2000 --rounds 20
+"""
+import argparse
+import asyncio
+import gc
+import os
+import statistics
+import sys
+from datetime import datetime, timezone
+from decimal import Decimal
+from pathlib import Path
+from time import perf_counter
+from types import SimpleNamespace
+
+
+PROJECT_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_DIR))
+# Middleware добавляется сам при импорте app.main — базовый вариант собираем без него
+os.environ["METRICS_ENABLED"] = "0"
+os.environ.setdefault("SECRET_KEY", "benchmark-secret-key")
+
+TARGET_OVERHEAD_PERCENT = 2.0
+
+
+class _FakeResult:
+    def __init__(self, row):
+        self._row = row
+
+    def first(self):
+        return self._row
+
+
+class _FakeSession:
+    def __init__(self, row, latency: float):
+        self._row = row
+        self._latency = latency
+
+    async def scalars(self, statement):
+        if self._latency:
+            await asyncio.sleep(self._latency)
+        return _FakeResult(self._row)
+
+
+async def _timed_get(client) -> float:
+    start = perf_counter()
+    response = await client.get("/products/1")
+    elapsed = perf_counter() - start
+    assert response.status_code == 200, response.text
+    return elapsed
+
+
+async def _measure_round(clients: dict, requests: int) -> tuple[float, float]:
+    """
+    Прогоняет requests пар запросов и возвращает медианы задержки (без метрик, с метриками), мкс.
+    """
+    timings: dict[bool, list[float]] = {False: [], True: []}
+    gc.collect()
+    for index in range(requests):
+        order = (False, True) if index % 2 else (True, False)
+        for enabled in order:
+            timings[enabled].append(await _timed_get(clients[enabled]))
+    return statistics.median(timings[False]) * 1_000_000, statistics.median(timings[True]) * 1_000_000
+
+
+async def run(args: argparse.Namespace) -> list[tuple[float, float]]:
+    """
+    Возвращает медианы задержки (без метрик, с метриками) в мкс — по паре на раунд.
+    """
+    import httpx
+
+    from app.db_depends import get_read_db
+    from app.main import app
+    from app.metrics import MetricsMiddleware
+    from app.routers import products
+
+    product = SimpleNamespace(
+        id=1, name="Product", description="Описание", price=Decimal("10.50"), image_url=None,
+        stock=100, category_id=1, rating=Decimal("4.50"), review_count=12, is_active=True,
+        created_at=datetime.now(timezone.utc), updated_at=datetime.now(timezone.utc),
+    )
+    session = _FakeSession(product, args.db_latency_ms / 1000)
+
+    async def fake_db():
+        yield session
+
+    app.dependency_overrides[get_read_db] = fake_db
+    # Иначе после первого запроса карточка отдаётся из кэша воркера и заглушка БД не вызывается
+    products.product_cache.maxsize = 0
+
+    clients = {
+        enabled: httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=MetricsMiddleware(app) if enabled else app), base_url="http://bench",
+        )
+        for enabled in (False, True)
+    }
+    try:
+        await _measure_round(clients, min(args.requests, 500))  # прогрев
+        pairs = []
+        for round_number in range(1, args.rounds + 1):
+            off, on = await _measure_round(clients, args.requests)
+            pairs.append((off, on))
+            print(f"round {round_number}: off {off:.1f} us, on {on:.1f} us, {(on - off) / off * 100:+.2f}%")
+        return pairs
+    finally:
+        for client in clients.values():
+            await client.aclose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Накладные расходы /metrics middleware")
+    parser.add_argument("--requests", type=int, default=2000, help="пар запросов в раунде")
+    parser.add_argument("--rounds", type=int, default=20)
+    parser.add_argument("--db-latency-ms", type=float, default=0.0)
+    args = parser.parse_args()
+
+    pairs = asyncio.run(run(args))
+    overheads = [(on - off) / off * 100 for off, on in pairs]
+    overhead = statistics.median(overheads)
+    spread = statistics.quantiles(overheads, n=4) if len(overheads) >= 2 else [overhead, overhead, overhead]
+    off = statistics.median(pair[0] for pair in pairs)
+    on = statistics.median(pair[1] for pair in pairs)
+    print(f"median latency: off {off:.1f} us, on {on:.1f} us")
+    print(f"overhead: median {overhead:+.2f}%, IQR {spread[0]:+.2f}%..{spread[2]:+.2f}%")
+    print(f"target < {TARGET_OVERHEAD_PERCENT}%: {'OK' if overhead < TARGET_OVERHEAD_PERCENT else 'FAIL'}")
+    sys.exit(0 if overhead < TARGET_OVERHEAD_PERCENT else 1)
+
+
+if __name__ == "__main__":
+    main()
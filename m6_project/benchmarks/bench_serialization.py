@@ -0,0 +1,253 @@
+"""
+Микробенчмарк сериализации ответов из schemas.py.
+
+Для Product, ProductList, Cart, Order и OrderList при 1/20/100/1000 элементах измеряет
+валидацию из ORM-объектов (from_attributes) вместе с выдачей JSON разными путями:
+- fastapi: validate + dump_python(mode="json") + json.dumps, как в FastAPI с JSONResponse;
+- dump_json: validate + model_dump_json, JSON собирается в pydantic-core;
+- type_adapter: заранее созданный TypeAdapter, validate_python + dump_json;
+- jsonable_encoder: validate + jsonable_encoder + json.dumps (старый путь FastAPI);
+- construct: model_construct без валидации + model_dump_json (только Product/ProductList).
+
+Статистика в духе pytest-benchmark (min/median/mean/stddev на вызов). Результаты дописываются
+в JSONL-историю, текущий прогон сравнивается с предыдущим по медиане.
+
+Запуск из m6_project:
+    python -m benchmarks.bench_serialization
+    python -m benchmarks.bench_serialization --schemas Product,Cart --sizes 1,100 --fail-on-regression
+"""
+import argparse
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from collections.abc import Callable
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from pathlib import Path
+
+import pydantic
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+
+
+PROJECT_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_DIR))
+
+from app.models import CartItem as CartItemModel, Order as OrderModel, OrderItem as OrderItemModel  # noqa: E402
+from app.models import Product as ProductModel  # noqa: E402
+from app.schemas import Cart, Order, OrderList, Product, ProductList  # noqa: E402
+
+
+SIZES = (1, 20, 100, 1000)
+ORDER_LIST_ITEMS_PER_ORDER = 3
+DEFAULT_HISTORY = PROJECT_DIR / "benchmarks" / "results" / "serialization.jsonl"
+NOW = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+
+def _product(product_id: int) -> ProductModel:
+    return ProductModel(
+        id=product_id, name=f"Wireless headphones {product_id}", description="Compact wireless headphones " * 5,
+        price=Decimal("129.90"), image_url=f"/media/products/{product_id}.jpg", stock=42, available_stock=42, is_active=True,
+        category_id=7, seller_id=3, rating=Decimal("4.35"), review_count=128,
+        created_at=NOW - timedelta(days=product_id), updated_at=NOW,
+    )
+
+
+def _order(order_id: int, items_count: int) -> OrderModel:
+    items = [
+        OrderItemModel(
+            id=order_id * 1000 + index, order_id=order_id, product_id=index + 1, quantity=2,
+            unit_price=Decimal("129.90"), total_price=Decimal("259.80"),
+            product_name=f"Wireless headphones {index + 1}", product_image_url=f"/media/products/{index + 1}.jpg",
+            product_category_id=7,
+        )
+        for index in range(items_count)
+    ]
+    return OrderModel(
+        id=order_id, user_id=5, status="delivered", total_amount=Decimal("259.80") * items_count,
+        created_at=NOW - timedelta(hours=order_id), updated_at=NOW, items=items,
+    )
+
+
+def _fixtures(size: int) -> dict[str, tuple[type[pydantic.BaseModel], object]]:
+    """
+    ORM-объекты того же вида, что возвращают обработчики, по схемам ответа.
+    Product при size > 1 — это список товаров (как у /products/category/{id}).
+    """
+    products = [_product(product_id) for product_id in range(1, size + 1)]
+    cart_items = [
+        CartItemModel(id=index, user_id=5, product_id=product.id, quantity=1, product=product)
+        for index, product in enumerate(products, start=1)
+    ]
+    return {
+        "Product": (Product, products[0] if size == 1 else products),
+        "ProductList": (ProductList, {"items": products, "total": size * 10, "page": 1, "page_size": size}),
+        "Cart": (Cart, {
+            "user_id": 5, "items": cart_items, "total_quantity": size,
+            "total_price": Decimal("129.90") * size,
+        }),
+        "Order": (Order, _order(1, size)),
+        "OrderList": (OrderList, {
+            "items": [_order(order_id, ORDER_LIST_ITEMS_PER_ORDER) for order_id in range(1, size + 1)],
+            "total": size * 10, "page": None, "page_size": size, "next_cursor": "eyJpZCI6MX0",
+        }),
+    }
+
+
+def _serializers(schema: type[pydantic.BaseModel], data: object) -> dict[str, Callable[[], object]]:
+    many = isinstance(data, list)
+    adapter = TypeAdapter(list[schema] if many else schema)
+
+    def validate():
+        if many:
+            return [schema.model_validate(item, from_attributes=True) for item in data]
+        return schema.model_validate(data, from_attributes=True)
+
+    def fastapi_path():
+        return json.dumps(adapter.dump_python(adapter.validate_python(data, from_attributes=True), mode="json"))
+
+    def dump_json():
+        value = validate()
+        return adapter.dump_json(value) if many else value.model_dump_json()
+
+    def type_adapter():
+        return adapter.dump_json(adapter.validate_python(data, from_attributes=True))
+
+    def encoder():
+        return json.dumps(jsonable_encoder(validate()))
+
+    serializers = {
+        "fastapi": fastapi_path,
+        "dump_json": dump_json,
+        "type_adapter": type_adapter,
+        "jsonable_encoder": encoder,
+    }
+
+    if schema is Product or schema is ProductList:
+        fields = tuple(Product.model_fields)
+
+        def construct_product(product):
+            return Product.model_construct(**{name: getattr(product, name) for name in fields})
+
+        def construct():
+            if schema is ProductList:
+                value = ProductList.model_construct(
+                    **{**data, "items": [construct_product(product) for product in data["items"]]}
+                )
+                return value.model_dump_json()
+            if many:
+                return adapter.dump_json([construct_product(product) for product in data])
+            return construct_product(data).model_dump_json()
+
+        serializers["construct"] = construct
+    return serializers
+
+
+def _measure(func: Callable[[], object], min_time: float, rounds: int) -> dict[str, float]:
+    """
+    Подбирает число вызовов на раунд так, чтобы раунд длился не меньше min_time, и снимает rounds раундов.
+    """
+    func()  # прогрев: кэши валидаторов pydantic и атрибутов SQLAlchemy
+    loops = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(loops):
+            func()
+        if time.perf_counter() - start >= min_time:
+            break
+        loops *= 2
+    timings = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for _ in range(loops):
+            func()
+        timings.append((time.perf_counter() - start) / loops * 1_000_000)
+    return {
+        "min_us": round(min(timings), 3),
+        "median_us": round(statistics.median(timings), 3),
+        "mean_us": round(statistics.mean(timings), 3),
+        "stddev_us": round(statistics.stdev(timings), 3) if len(timings) > 1 else 0.0,
+        "rounds": rounds,
+        "loops": loops,
+    }
+
+
+def _git_revision() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=PROJECT_DIR, check=True, capture_output=True, text=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _last_run(history: Path) -> dict | None:
+    if not history.exists():
+        return None
+    lines = history.read_text(encoding="utf-8").strip().splitlines()
+    return json.loads(lines[-1]) if lines else None
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Микробенчмарк сериализации схем ответа")
+    parser.add_argument("--schemas", default="Product,ProductList,Cart,Order,OrderList")
+    parser.add_argument("--sizes", default=",".join(map(str, SIZES)))
+    parser.add_argument("--rounds", type=int, default=7)
+    parser.add_argument("--min-time", type=float, default=0.05, help="минимальная длительность раунда, секунды")
+    parser.add_argument("--history", type=Path, default=DEFAULT_HISTORY, help="JSONL с историей прогонов")
+    parser.add_argument("--no-save", dest="save", action="store_false", help="не дописывать прогон в историю")
+    parser.add_argument("--max-regression", type=float, default=15.0, help="допустимый рост медианы, %%")
+    parser.add_argument("--fail-on-regression", action="store_true")
+    args = parser.parse_args()
+
+    schemas = args.schemas.split(",")
+    sizes = [int(size) for size in args.sizes.split(",")]
+    previous = _last_run(args.history)
+    previous_results = previous["results"] if previous else {}
+
+    results: dict[str, dict] = {}
+    regressions = []
+    print(f"{'benchmark':40} {'median us':>11} {'per item us':>12} {'stddev':>9} {'vs prev':>9}")
+    for size in sizes:
+        fixtures = _fixtures(size)
+        for schema_name in schemas:
+            schema, data = fixtures[schema_name]
+            for path, func in _serializers(schema, data).items():
+                name = f"{schema_name}[{size}]/{path}"
+                stats = _measure(func, args.min_time, args.rounds)
+                results[name] = stats
+                change = ""
+                before = previous_results.get(name)
+                if before:
+                    percent = (stats["median_us"] - before["median_us"]) / before["median_us"] * 100
+                    change = f"{percent:+.1f}%"
+                    if percent > args.max_regression:
+                        regressions.append((name, percent))
+                print(f"{name:40} {stats['median_us']:>11.1f} {stats['median_us'] / size:>12.2f} "
+                      f"{stats['stddev_us']:>9.1f} {change:>9}")
+
+    if args.save:
+        args.history.parent.mkdir(parents=True, exist_ok=True)
+        run = {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "git_revision": _git_revision(),
+            "python": platform.python_version(),
+            "pydantic": pydantic.VERSION,
+            "results": results,
+        }
+        with args.history.open("a", encoding="utf-8") as history:
+            history.write(json.dumps(run) + "\n")
+
+    if regressions:
+        print(f"\nregressions over {args.max_regression:.0f}% vs {previous.get('git_revision') or 'previous run'}:")
+        for name, percent in regressions:
+            print(f"  {name}: {percent:+.1f}%")
+        if args.fail_on_regression:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
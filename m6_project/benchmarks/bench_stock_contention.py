@@ -0,0 +1,139 @@
+"""
+Конкурентное списание остатка одного товара: обычная строка products.stock против шардированного
+режима (app/inventory.py).
+
+--workers корутин в течение --duration секунд выполняют короткие транзакции, как оформление заказа:
+чтение товара, списание --quantity единиц, commit. Для каждого режима выводятся транзакции в секунду
+и задержки p50/p99. Перед прогоном остаток товара заменяется большим значением, после — остаток
+и режим товара восстанавливаются.
+
+На SQLite запись сериализуется всей базой, поэтому разницы между режимами не будет — запускать на PostgreSQL
+(DATABASE_URL из окружения) с пулом не меньше --workers (DB_POOL_SIZE + DB_MAX_OVERFLOW).
+
+Запуск из m6_project:
+    python -m benchmarks.bench_stock_contention --product-id 1 --workers 50 --duration 10 --shards 16
+"""
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+from pathlib import Path
+
+
+PROJECT_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_DIR))
+
+from sqlalchemy import update  # noqa: E402
+
+from app.database import IS_SQLITE, async_engine, async_session_maker  # noqa: E402
+from app.inventory import decrement_stock, disable_sharding, enable_sharding  # noqa: E402
+from app.models.products import Product as ProductModel  # noqa: E402
+
+
+BENCH_STOCK = 10 ** 9
+
+
+def _percentile(sorted_values: list[float], percent: float) -> float:
+    rank = max(int(round(percent / 100 * len(sorted_values) + 0.5)) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+async def _prepare(product_id: int, sharded: bool, shards: int) -> None:
+    async with async_session_maker() as db:
+        await disable_sharding(db, product_id)
+        await db.execute(update(ProductModel).where(ProductModel.id == product_id).values(stock=BENCH_STOCK))
+        if sharded:
+            await enable_sharding(db, product_id, shards)
+        await db.commit()
+
+
+async def _worker(product_id: int, quantity: int, deadline: float, latencies: list[float], failures: list[int]) -> None:
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        try:
+            async with async_session_maker() as db:
+                product = await db.get(ProductModel, product_id)
+                if not await decrement_stock(db, product, quantity):
+                    raise RuntimeError("Остаток закончился")
+                await db.commit()
+        except Exception:
+            failures.append(1)
+            continue
+        latencies.append(time.perf_counter() - started)
+
+
+async def _run_mode(args: argparse.Namespace, sharded: bool) -> dict[str, float]:
+    await _prepare(args.product_id, sharded, args.shards)
+    latencies: list[float] = []
+    failures: list[int] = []
+    started = time.perf_counter()
+    deadline = started + args.duration
+    await asyncio.gather(*(
+        _worker(args.product_id, args.quantity, deadline, latencies, failures) for _ in range(args.workers)
+    ))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "tx": len(latencies),
+        "failed": len(failures),
+        "tps": len(latencies) / elapsed,
+        "p50_ms": _percentile(latencies, 50) * 1000 if latencies else 0.0,
+        "p99_ms": _percentile(latencies, 99) * 1000 if latencies else 0.0,
+        "mean_ms": statistics.fmean(latencies) * 1000 if latencies else 0.0,
+    }
+
+
+async def run(args: argparse.Namespace) -> dict[str, dict[str, float]]:
+    async with async_session_maker() as db:
+        product = await db.get(ProductModel, args.product_id)
+        if product is None:
+            raise SystemExit(f"Товар {args.product_id} не найден")
+        was_sharded = product.stock_sharded
+        await disable_sharding(db, args.product_id)
+        await db.commit()
+        await db.refresh(product)
+        original_stock = product.stock
+
+    try:
+        return {
+            "single-row": await _run_mode(args, sharded=False),
+            f"sharded x{args.shards}": await _run_mode(args, sharded=True),
+        }
+    finally:
+        async with async_session_maker() as db:
+            await disable_sharding(db, args.product_id)
+            await db.execute(
+                update(ProductModel).where(ProductModel.id == args.product_id).values(stock=original_stock)
+            )
+            if was_sharded:
+                await enable_sharding(db, args.product_id, args.shards)
+            await db.commit()
+        await async_engine.dispose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Конкурентное списание остатка: строка против шардов")
+    parser.add_argument("--product-id", type=int, required=True, help="товар для прогона (остаток восстанавливается)")
+    parser.add_argument("--workers", type=int, default=50, help="одновременных транзакций")
+    parser.add_argument("--duration", type=float, default=10.0, help="длительность каждого режима, секунды")
+    parser.add_argument("--quantity", type=int, default=1, help="единиц в одном списании")
+    parser.add_argument("--shards", type=int, default=16)
+    args = parser.parse_args()
+    if IS_SQLITE:
+        print("Внимание: SQLite сериализует запись, результаты режимов будут одинаковыми", file=sys.stderr)
+
+    results = asyncio.run(run(args))
+    print(f"{'режим':<14} {'tx':>8} {'ошибки':>7} {'tx/s':>9} {'p50, ms':>9} {'p99, ms':>9}")
+    for mode, stats in results.items():
+        print(
+            f"{mode:<14} {stats['tx']:>8} {stats['failed']:>7} {stats['tps']:>9.1f} "
+            f"{stats['p50_ms']:>9.2f} {stats['p99_ms']:>9.2f}"
+        )
+    single, sharded = results.values()
+    if single["tps"]:
+        print(f"Ускорение: x{sharded['tps'] / single['tps']:.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,523 @@
+"""
+Генератор синтетических данных для нагрузочного тестирования.
+
+Заполняет схему (после alembic upgrade head) категориями с глубоким деревом, пользователями,
+товарами, отзывами с распределением Ципфа по популярности товаров, корзинами и заказами
+за несколько лет. Строки генерируются пачками в пуле процессов и грузятся через COPY
+по нескольким соединениям параллельно. С DATABASE_URL=sqlite+aiosqlite:///файл данные пишутся
+в SQLite (схема создаётся по моделям, вставка в одном соединении).
+
+Результат детерминирован при одинаковых --seed и параметрах масштаба: id, тексты, цены
+и даты каждой пачки зависят только от seed и номеров строк, а не от порядка выполнения.
+Пароль всех пользователей — DATASET_PASSWORD (хеш один на всех, соль не детерминирована).
+
+Запуск из m6_project:
+    python -m benchmarks.generate_dataset --truncate --products 1000000 --users 200000 \\
+        --reviews 5000000 --orders 2000000 --workers 8 --seed 42
+"""
+import argparse
+import asyncio
+import bisect
+import itertools
+import random
+import sqlite3
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, time as dt_time, timedelta, timezone
+from decimal import Decimal
+
+import asyncpg
+from sqlalchemy.engine import make_url
+
+
+DATASET_PASSWORD = "password123"
+DEFAULT_END_DATE = "2025-01-01"
+ORDER_STATUSES = ("pending", "paid", "shipped", "delivered", "cancelled")
+ORDER_STATUS_WEIGHTS = (5, 10, 10, 70, 5)
+# Оценки смещены к высоким, как на реальных витринах
+GRADE_WEIGHTS = (5, 6, 12, 30, 47)
+ADJECTIVES = (
+    "wireless", "smart", "portable", "premium", "compact", "classic", "ergonomic", "waterproof",
+    "organic", "cotton", "leather", "vintage", "digital", "foldable", "lightweight", "durable",
+)
+NOUNS = (
+    "phone", "laptop", "headphones", "watch", "book", "speaker", "camera", "backpack", "lamp",
+    "keyboard", "mouse", "jacket", "sneakers", "kettle", "blender", "chair", "monitor", "tablet",
+)
+COMMENT_WORDS = (
+    "great", "quality", "fast", "delivery", "works", "as", "described", "battery", "cheap", "broke",
+    "after", "week", "recommend", "love", "it", "size", "fits", "perfect", "not", "worth", "price",
+)
+
+COLUMNS = {
+    "categories": ("id", "name", "parent_id", "is_active"),
+    "users": ("id", "email", "hashed_password", "is_active", "role"),
+    "products": (
+        "id", "name", "description", "price", "image_url", "stock", "is_active", "category_id", "seller_id",
+        "rating", "rating_sum", "review_count", "grade_1_count", "grade_2_count", "grade_3_count",
+        "grade_4_count", "grade_5_count", "created_at", "updated_at",
+    ),
+    "reviews": ("id", "user_id", "product_id", "comment", "comment_date", "grade", "is_active"),
+    "orders": ("id", "user_id", "status", "total_amount", "created_at", "updated_at"),
+    "order_items": (
+        "id", "order_id", "product_id", "quantity", "unit_price", "total_price",
+        "product_name", "product_image_url", "product_category_id",
+    ),
+    "cart_items": ("id", "user_id", "product_id", "quantity", "created_at", "updated_at"),
+}
+# Порядок очистки: дочерние таблицы раньше родительских. Генератор пишет не во все из них, но при очистке
+# строки, оставшиеся от прошлых прогонов, иначе привязались бы к новым товарам и пользователям с теми же id
+TABLES = (
+    "order_items", "orders", "cart_items", "stock_reservations", "product_stock_shards", "reviews",
+    "idempotency_keys", "products", "categories", "users",
+)
+# Таблицы с последовательностью id
+SERIAL_TABLES = tuple(table for table in TABLES if table != "product_stock_shards")
+
+# Общие данные воркеров пула процессов, заполняются в _init_worker
+_ctx: dict = {}
+
+
+def _rng(seed: int, *parts: object) -> random.Random:
+    """
+    Отдельный генератор для каждой сущности/пачки — результат не зависит от порядка выполнения.
+    """
+    return random.Random(f"{seed}:" + ":".join(map(str, parts)))
+
+
+def _random_datetime(rng: random.Random, start: datetime, end: datetime) -> datetime:
+    return start + timedelta(seconds=rng.uniform(0, (end - start).total_seconds()))
+
+
+def _category_tree(depth: int, fanout: int) -> tuple[list[tuple], list[int]]:
+    """
+    Дерево категорий в ширину: fanout корней, у каждой категории fanout детей до глубины depth.
+    Возвращает строки categories и id листьев (товары привязываются только к ним).
+    """
+    rows, level, next_id = [], [None], 1
+    for depth_index in range(depth):
+        new_level = []
+        for parent_id in level:
+            for child in range(fanout):
+                name = f"{NOUNS[(next_id + child) % len(NOUNS)].title()} L{depth_index + 1}-{next_id}"
+                rows.append((next_id, name[:50], parent_id, True))
+                new_level.append(next_id)
+                next_id += 1
+        level = new_level
+    return rows, level
+
+
+def _product_attrs(product_id: int) -> tuple:
+    """
+    Неизменяемые атрибуты товара по его id: (name, description, price, image_url, category_id, seller_id).
+    Нужны и при генерации товаров, и для снимка товара в позициях заказов.
+    """
+    rng = _rng(_ctx["seed"], "product", product_id)
+    adjective, noun = rng.choice(ADJECTIVES), rng.choice(NOUNS)
+    name = f"{adjective.title()} {noun} {product_id}"
+    description = f"{adjective} {noun} " + " ".join(rng.choices(COMMENT_WORDS, k=rng.randint(5, 30)))
+    price = Decimal(rng.lognormvariate(3.5, 1.0)).quantize(Decimal("0.01")) + Decimal("1.00")
+    image_url = f"/media/products/{product_id}.jpg" if rng.random() < 0.8 else None
+    category_id = rng.choice(_ctx["leaf_category_ids"])
+    seller_id = rng.randint(1, _ctx["sellers"])
+    return name, description[:500], min(price, Decimal("99999.99")), image_url, category_id, seller_id
+
+
+def _init_worker(ctx: dict) -> None:
+    _ctx.update(ctx)
+
+
+def _products_batch(first_id: int, review_counts: list[int], first_review_id: int) -> list[tuple[str, list]]:
+    """
+    Товары first_id.. и их отзывы. Агрегаты рейтинга считаются по сгенерированным отзывам.
+    """
+    seed, start, end = _ctx["seed"], _ctx["start"], _ctx["end"]
+    buyers_from, users = _ctx["sellers"] + 1, _ctx["users"]
+    products, reviews = [], []
+    review_id = first_review_id
+    for product_id, review_count in enumerate(review_counts, start=first_id):
+        name, description, price, image_url, category_id, seller_id = _product_attrs(product_id)
+        rng = _rng(seed, "product-rows", product_id)
+        created_at = _random_datetime(rng, start, end)
+        grades_weights = [weight * rng.uniform(0.5, 1.5) for weight in GRADE_WEIGHTS]
+        grade_counts = [0] * 5
+        for _ in range(review_count):
+            grade = rng.choices(range(1, 6), grades_weights)[0]
+            is_active = rng.random() > 0.02
+            if is_active:
+                grade_counts[grade - 1] += 1
+            comment = " ".join(rng.choices(COMMENT_WORDS, k=rng.randint(3, 25))) if rng.random() < 0.7 else None
+            comment_date = _random_datetime(rng, created_at, end).replace(tzinfo=None)
+            reviews.append((review_id, rng.randint(buyers_from, users), product_id, comment, comment_date, grade, is_active))
+            review_id += 1
+        active_count = sum(grade_counts)
+        rating_sum = sum(grade * count for grade, count in enumerate(grade_counts, start=1))
+        rating = (Decimal(rating_sum) / active_count).quantize(Decimal("0.01")) if active_count else Decimal("0")
+        stock = 0 if rng.random() < 0.05 else rng.randint(1, 500)
+        products.append((
+            product_id, name, description, price, image_url, stock, rng.random() > 0.03, category_id, seller_id,
+            rating, rating_sum, active_count, *grade_counts, created_at, created_at,
+        ))
+    return [("products", products), ("reviews", reviews)]
+
+
+def _orders_batch(
+    first_user_id: int,
+    order_counts: list[int],
+    first_order_id: int,
+    item_counts: list[int],
+    first_item_id: int,
+    cart_counts: list[int],
+    first_cart_id: int,
+) -> list[tuple[str, list]]:
+    """
+    Заказы с позициями и корзины пользователей first_user_id.. Товары выбираются по популярности.
+    """
+    seed, start, end = _ctx["seed"], _ctx["start"], _ctx["end"]
+    ranked_ids, cum_weights = _ctx["ranked_product_ids"], _ctx["cum_weights"]
+    attrs_cache: dict[int, tuple] = {}
+
+    def popular_products(rng: random.Random, count: int) -> list[int]:
+        chosen = []
+        count = min(count, len(ranked_ids))
+        while len(chosen) < count:
+            product_id = ranked_ids[bisect.bisect(cum_weights, rng.random() * cum_weights[-1])]
+            if product_id not in chosen:
+                chosen.append(product_id)
+        return chosen
+
+    def attrs(product_id: int) -> tuple:
+        if product_id not in attrs_cache:
+            attrs_cache[product_id] = _product_attrs(product_id)
+        return attrs_cache[product_id]
+
+    orders, items, cart_items = [], [], []
+    order_id, item_id, cart_id = first_order_id, first_item_id, first_cart_id
+    item_counts_iter = iter(item_counts)
+    for user_id, order_count, cart_count in zip(
+        itertools.count(first_user_id), order_counts, cart_counts
+    ):
+        rng = _rng(seed, "user-orders", user_id)
+        for _ in range(order_count):
+            created_at = _random_datetime(rng, start, end)
+            total = Decimal("0.00")
+            for product_id in popular_products(rng, next(item_counts_iter)):
+                name, _, price, image_url, category_id, _ = attrs(product_id)
+                quantity = rng.choices((1, 2, 3, 4), (70, 20, 7, 3))[0]
+                total_price = price * quantity
+                total += total_price
+                items.append((item_id, order_id, product_id, quantity, price, total_price, name, image_url, category_id))
+                item_id += 1
+            status = rng.choices(ORDER_STATUSES, ORDER_STATUS_WEIGHTS)[0]
+            updated_at = min(created_at + timedelta(days=rng.uniform(0, 10)), end)
+            orders.append((order_id, user_id, status, total, created_at, updated_at))
+            order_id += 1
+        for product_id in popular_products(rng, cart_count):
+            created_at = _random_datetime(rng, end - timedelta(days=30), end)
+            cart_items.append((cart_id, user_id, product_id, rng.randint(1, 3), created_at, created_at))
+            cart_id += 1
+    return [("orders", orders), ("order_items", items), ("cart_items", cart_items)]
+
+
+def _split_counts(rng: random.Random, total: int, weights: list[float]) -> list[int]:
+    """
+    Раскладывает total по весам: целая часть ожидания плюс случайное округление дробной.
+    """
+    weight_sum = sum(weights)
+    counts = []
+    for weight in weights:
+        expected = total * weight / weight_sum
+        whole = int(expected)
+        counts.append(whole + (rng.random() < expected - whole))
+    return counts
+
+
+def _batches(counts: list[int], batch_size: int):
+    """
+    Нарезает последовательность сущностей на пачки: (индекс первой, срез counts, id первой дочерней строки).
+    """
+    first_child_id = 1
+    for offset in range(0, len(counts), batch_size):
+        chunk = counts[offset:offset + batch_size]
+        yield offset, chunk, first_child_id
+        first_child_id += sum(chunk)
+
+
+class Loader(ABC):
+    """
+    Генерирует пачки в пуле процессов и записывает их в базу. Запись зависит от СУБД — см. наследников.
+    """
+
+    def __init__(self, parallelism: int):
+        self.parallelism = parallelism
+        self.executor: ProcessPoolExecutor | None = None
+        self.semaphore = asyncio.Semaphore(parallelism * 2)  # ограничивает число готовых пачек в памяти
+        self.rows: dict[str, int] = {}
+
+    @abstractmethod
+    async def write(self, tables: list[tuple[str, list]]) -> None:
+        """
+        Записывает пачку строк нескольких таблиц одной транзакцией.
+        """
+
+    @abstractmethod
+    async def prepare(self, truncate: bool) -> None:
+        """
+        Открывает соединения и проверяет (или очищает) таблицы.
+        """
+
+    @abstractmethod
+    async def finish(self, analyze: bool) -> None:
+        """
+        Завершает загрузку: последовательности id, статистика планировщика.
+        """
+
+    async def close(self) -> None:
+        pass
+
+    async def copy(self, table: str, rows: list[tuple]) -> None:
+        await self.write([(table, rows)])
+
+    async def _load_batch(self, func, args: tuple) -> None:
+        async with self.semaphore:
+            tables = await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+            await self.write(tables)
+
+    async def load(self, label: str, func, batches) -> None:
+        started = time.perf_counter()
+        await asyncio.gather(*(self._load_batch(func, args) for args in batches))
+        print(f"{label}: {time.perf_counter() - started:.1f}s")
+
+    def _count(self, tables: list[tuple[str, list]]) -> None:
+        for table, rows in tables:
+            self.rows[table] = self.rows.get(table, 0) + len(rows)
+
+
+class PostgresLoader(Loader):
+    """
+    COPY по пулу соединений asyncpg: пачки пишутся параллельно, каждая в своей транзакции.
+    """
+
+    def __init__(self, dsn: str, parallelism: int):
+        super().__init__(parallelism)
+        self.dsn = dsn
+        self.pool: asyncpg.Pool | None = None
+
+    async def write(self, tables: list[tuple[str, list]]) -> None:
+        async with self.pool.acquire() as conn, conn.transaction():
+            for table, rows in tables:
+                if rows:
+                    await conn.copy_records_to_table(table, records=rows, columns=COLUMNS[table])
+        self._count(tables)
+
+    async def prepare(self, truncate: bool) -> None:
+        self.pool = await asyncpg.create_pool(self.dsn, min_size=self.parallelism, max_size=self.parallelism)
+        async with self.pool.acquire() as conn:
+            if truncate:
+                await conn.execute(f"TRUNCATE {', '.join(TABLES)} RESTART IDENTITY CASCADE")
+            elif await conn.fetchval("SELECT EXISTS (SELECT 1 FROM products) OR EXISTS (SELECT 1 FROM users)"):
+                raise SystemExit("База не пуста: запустите с --truncate, чтобы очистить таблицы")
+
+    async def finish(self, analyze: bool) -> None:
+        async with self.pool.acquire() as conn:
+            for table in SERIAL_TABLES:
+                await conn.execute(
+                    f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), "
+                    f"coalesce((SELECT max(id) FROM {table}), 0) + 1, false)"
+                )
+            if analyze:
+                await conn.execute("ANALYZE")
+
+    async def close(self) -> None:
+        if self.pool is not None:
+            await self.pool.close()
+
+
+class SqliteLoader(Loader):
+    """
+    SQLite-режим (DATABASE_URL=sqlite+aiosqlite:///...): схема создаётся по моделям, как при старте
+    приложения, строки пишутся executemany в одном соединении — писатель в SQLite всегда один.
+    Генерация пачек по-прежнему идёт параллельно в пуле процессов.
+    """
+
+    def __init__(self, dsn: str, parallelism: int):
+        super().__init__(parallelism)
+        self.path = make_url(dsn).database
+        self.conn: sqlite3.Connection | None = None
+
+    async def write(self, tables: list[tuple[str, list]]) -> None:
+        with self.conn:
+            for table, rows in tables:
+                if rows:
+                    columns = COLUMNS[table]
+                    self.conn.executemany(
+                        f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+                        rows,
+                    )
+        self._count(tables)
+
+    async def prepare(self, truncate: bool) -> None:
+        from sqlalchemy import create_engine
+
+        from app.database import Base, IS_SQLITE
+        import app.models  # noqa: F401 — регистрирует все модели в метаданных
+
+        if not IS_SQLITE:
+            raise SystemExit("Для SQLite задайте DATABASE_URL=sqlite+aiosqlite:///путь: от него зависит схема моделей")
+        if not self.path or self.path == ":memory:":
+            raise SystemExit("База SQLite в памяти не переживёт генератор — укажите файл")
+        engine = create_engine(f"sqlite:///{self.path}")
+        Base.metadata.create_all(engine)
+        engine.dispose()
+
+        sqlite3.register_adapter(Decimal, float)
+        # Тот же формат, в котором даты хранит SQLAlchemy (см. app/database.py)
+        sqlite3.register_adapter(datetime, lambda value: value.strftime("%Y-%m-%d %H:%M:%S.%f"))
+        self.conn = sqlite3.connect(self.path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=OFF")
+        if truncate:
+            with self.conn:
+                for table in TABLES:
+                    self.conn.execute(f"DELETE FROM {table}")
+        elif self.conn.execute("SELECT EXISTS (SELECT 1 FROM products) OR EXISTS (SELECT 1 FROM users)").fetchone()[0]:
+            raise SystemExit("База не пуста: запустите с --truncate, чтобы очистить таблицы")
+
+    async def finish(self, analyze: bool) -> None:
+        if analyze:
+            self.conn.execute("ANALYZE")
+
+    async def close(self) -> None:
+        if self.conn is not None:
+            self.conn.close()
+
+
+async def generate(args: argparse.Namespace) -> None:
+    from app.auth import hash_password
+
+    end = datetime.combine(date.fromisoformat(args.end_date), dt_time.min, tzinfo=timezone.utc)
+    start = end - timedelta(days=365 * args.years)
+    category_rows, leaf_category_ids = _category_tree(args.category_depth, args.category_fanout)
+
+    # Популярность товаров: ранг Ципфа -> id товара через детерминированную перестановку,
+    # чтобы популярные товары не были просто первыми по id
+    ranked_product_ids = list(range(1, args.products + 1))
+    _rng(args.seed, "popularity").shuffle(ranked_product_ids)
+    rank_weights = [1 / rank ** args.zipf_exponent for rank in range(1, args.products + 1)]
+    product_weights = [0.0] * args.products
+    for product_id, weight in zip(ranked_product_ids, rank_weights):
+        product_weights[product_id - 1] = weight
+    review_counts = _split_counts(_rng(args.seed, "review-counts"), args.reviews, product_weights)
+
+    buyers = args.users - args.sellers
+    activity_rng = _rng(args.seed, "user-activity")
+    # Активность покупателей тоже неравномерна; продавцы не покупают
+    buyer_weights = [activity_rng.paretovariate(1.5) for _ in range(buyers)]
+    order_counts = [0] * args.sellers + _split_counts(_rng(args.seed, "order-counts"), args.orders, buyer_weights)
+    items_rng = _rng(args.seed, "order-items")
+    extra_items = args.items_per_order - 1  # сверх обязательной первой позиции
+    item_counts = [
+        min(1 + int(items_rng.expovariate(1 / extra_items)), 20) if extra_items > 0 else 1
+        for _ in range(sum(order_counts))
+    ]
+    cart_rng = _rng(args.seed, "carts")
+    cart_counts = [0] * args.sellers + [
+        cart_rng.randint(1, 5) if cart_rng.random() < args.cart_ratio else 0 for _ in range(buyers)
+    ]
+
+    ctx = {
+        "seed": args.seed,
+        "start": start,
+        "end": end,
+        "users": args.users,
+        "sellers": args.sellers,
+        "leaf_category_ids": leaf_category_ids,
+        "ranked_product_ids": ranked_product_ids,
+        "cum_weights": list(itertools.accumulate(rank_weights)),
+    }
+    hashed_password = hash_password(DATASET_PASSWORD)
+
+    loader_class = SqliteLoader if make_url(args.dsn).get_backend_name() == "sqlite" else PostgresLoader
+    loader = loader_class(args.dsn, args.workers)
+    try:
+        await loader.prepare(args.truncate)
+        with ProcessPoolExecutor(args.workers, initializer=_init_worker, initargs=(ctx,)) as executor:
+            loader.executor = executor
+            started = time.perf_counter()
+            await loader.copy("categories", category_rows)
+
+            user_rows = [
+                (user_id, f"user{user_id}@example.com", hashed_password, True,
+                 "seller" if user_id <= args.sellers else "buyer")
+                for user_id in range(1, args.users + 1)
+            ]
+            await asyncio.gather(*(
+                loader.copy("users", user_rows[offset:offset + args.batch_size])
+                for offset in range(0, len(user_rows), args.batch_size)
+            ))
+            print(f"categories, users: {time.perf_counter() - started:.1f}s")
+
+            await loader.load("products, reviews", _products_batch, (
+                (offset + 1, chunk, first_review_id)
+                for offset, chunk, first_review_id in _batches(review_counts, args.batch_size)
+            ))
+
+            user_batch = max(args.batch_size // max(args.orders // max(buyers, 1), 1), 1)
+            order_batches = []
+            first_item_id, first_cart_id = 1, 1
+            for offset, chunk, first_order_id in _batches(order_counts, user_batch):
+                batch_items = item_counts[first_order_id - 1:first_order_id - 1 + sum(chunk)]
+                batch_carts = cart_counts[offset:offset + user_batch]
+                order_batches.append((
+                    offset + 1, chunk, first_order_id, batch_items, first_item_id, batch_carts, first_cart_id,
+                ))
+                first_item_id += sum(batch_items)
+                first_cart_id += sum(batch_carts)
+            await loader.load("orders, order items, carts", _orders_batch, order_batches)
+
+        await loader.finish(args.analyze)
+    finally:
+        await loader.close()
+
+    for table, count in loader.rows.items():
+        print(f"  {table}: {count}")
+    print(f"total: {time.perf_counter() - started:.1f}s")
+
+
+def _default_dsn() -> str:
+    from app.config import DATABASE_URL
+
+    # asyncpg не понимает суффикс драйвера SQLAlchemy; SQLite-адрес оставляем как есть
+    return DATABASE_URL.replace("postgresql+asyncpg://", "postgresql://", 1)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Генератор синтетических данных магазина")
+    parser.add_argument("--dsn", help="PostgreSQL или sqlite+aiosqlite:///файл, по умолчанию DATABASE_URL")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--products", type=int, default=1_000_000)
+    parser.add_argument("--users", type=int, default=200_000)
+    parser.add_argument("--sellers", type=int, default=2_000)
+    parser.add_argument("--category-depth", type=int, default=4)
+    parser.add_argument("--category-fanout", type=int, default=6)
+    parser.add_argument("--reviews", type=int, default=5_000_000)
+    parser.add_argument("--zipf-exponent", type=float, default=1.07, help="показатель Ципфа для популярности товаров")
+    parser.add_argument("--orders", type=int, default=2_000_000)
+    parser.add_argument("--items-per-order", type=float, default=2.5, help="среднее число позиций в заказе")
+    parser.add_argument("--years", type=int, default=3, help="за сколько лет генерировать заказы")
+    parser.add_argument("--end-date", default=DEFAULT_END_DATE, help="дата «сейчас» для данных, YYYY-MM-DD")
+    parser.add_argument("--cart-ratio", type=float, default=0.1, help="доля покупателей с непустой корзиной")
+    parser.add_argument("--batch-size", type=int, default=20_000)
+    parser.add_argument("--workers", type=int, default=4, help="процессов генерации и соединений COPY")
+    parser.add_argument("--truncate", action="store_true", help="очистить таблицы перед загрузкой")
+    parser.add_argument("--no-analyze", dest="analyze", action="store_false")
+    args = parser.parse_args()
+    if not 0 < args.sellers < args.users:
+        parser.error("--sellers должно быть больше 0 и меньше --users")
+    args.dsn = args.dsn or _default_dsn()
+    asyncio.run(generate(args))
+
+
+if __name__ == "__main__":
+    main()
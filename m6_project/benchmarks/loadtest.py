@@ -0,0 +1,340 @@
+"""
+Нагрузочный тест основных сценариев магазина.
+
+Виртуальные пользователи параллельно выполняют сценарии (просмотр каталога, поиск,
+карточка товара, вход, корзина, оформление заказа, отзывы) и пишут задержки по каждому
+эндпоинту. По умолчанию приложение работает в этом же процессе через ASGI-транспорт
+(с той же БД, что указана в DATABASE_URL), с --url — идёт на запущенный сервер.
+
+Запуск из m6_project:
+    python -m benchmarks.loadtest --users 20 --duration 30 --output results.json
+    python -m benchmarks.loadtest --url http://localhost:8000 --compare results.json
+
+В базе должны быть активные товары в наличии (см. benchmarks/generate_dataset.py).
+Покупатели loadtest-buyer-N@example.com создаются при первом запуске.
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import random
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+
+import httpx
+
+
+PROJECT_DIR = Path(__file__).resolve().parent.parent
+BUYER_EMAIL = "loadtest-buyer-{}@example.com"
+BUYER_PASSWORD = "loadtest-password"
+SEARCH_TERMS = ("phone", "laptop", "wireless headphones", "book", "cotton -polyester", "\"smart watch\"")
+DEFAULT_SCENARIOS = "browse=30,search=15,product_page=30,login=5,cart=10,checkout=5,review=5"
+
+
+@dataclass
+class EndpointStats:
+    latencies: list[float] = field(default_factory=list)
+    statuses: dict[int, int] = field(default_factory=lambda: defaultdict(int))
+    errors: int = 0  # 5xx и сетевые ошибки
+
+
+class Recorder:
+    """
+    Собирает задержки по шаблону эндпоинта (например, "GET /products/{id}").
+    """
+
+    def __init__(self):
+        self.endpoints: dict[str, EndpointStats] = defaultdict(EndpointStats)
+
+    async def request(self, client: httpx.AsyncClient, name: str, method: str, url: str, **kwargs) -> httpx.Response | None:
+        stats = self.endpoints[name]
+        start = time.perf_counter()
+        try:
+            response = await client.request(method, url, **kwargs)
+        except httpx.HTTPError:
+            stats.latencies.append(time.perf_counter() - start)
+            stats.errors += 1
+            return None
+        stats.latencies.append(time.perf_counter() - start)
+        stats.statuses[response.status_code] += 1
+        if response.status_code >= 500:
+            stats.errors += 1
+        return response
+
+
+@dataclass
+class VirtualUser:
+    email: str
+    headers: dict[str, str] = field(default_factory=dict)
+
+
+def _percentile(sorted_values: list[float], percent: float) -> float:
+    """
+    Перцентиль методом ближайшего ранга.
+    """
+    if not sorted_values:
+        return 0.0
+    rank = max(int(round(percent / 100 * len(sorted_values) + 0.5)) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+async def _login(client: httpx.AsyncClient, recorder: Recorder | None, user: VirtualUser) -> None:
+    data = {"username": user.email, "password": BUYER_PASSWORD}
+    if recorder is None:
+        response = await client.post("/users/token", data=data)
+    else:
+        response = await recorder.request(client, "POST /users/token", "POST", "/users/token", data=data)
+    if response is not None and response.status_code == 200:
+        user.headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+async def _prepare(client: httpx.AsyncClient, users: int) -> tuple[list[VirtualUser], list[int], list[int]]:
+    """
+    Создаёт покупателей (если их ещё нет), логинит их и собирает id товаров и категорий.
+    """
+    virtual_users = []
+    for number in range(users):
+        user = VirtualUser(email=BUYER_EMAIL.format(number))
+        response = await client.post("/users/", json={"email": user.email, "password": BUYER_PASSWORD, "role": "buyer"})
+        if response.status_code not in (201, 400):
+            raise SystemExit(f"Не удалось создать покупателя {user.email}: {response.status_code} {response.text}")
+        await _login(client, None, user)
+        if not user.headers:
+            raise SystemExit(f"Не удалось войти как {user.email}")
+        virtual_users.append(user)
+
+    response = await client.get("/products/", params={"page_size": 100, "in_stock": True})
+    response.raise_for_status()
+    product_ids = [product["id"] for product in response.json()["items"]]
+    if not product_ids:
+        raise SystemExit("В базе нет активных товаров в наличии")
+    response = await client.get("/categories/")
+    response.raise_for_status()
+    category_ids = [category["id"] for category in response.json()]
+    return virtual_users, product_ids, category_ids
+
+
+class Scenarios:
+    """
+    Сценарии виртуального пользователя. Каждый — короткая последовательность запросов.
+    """
+
+    def __init__(self, client: httpx.AsyncClient, recorder: Recorder, product_ids: list[int], category_ids: list[int]):
+        self.client = client
+        self.recorder = recorder
+        self.product_ids = product_ids
+        self.category_ids = category_ids
+
+    async def _get(self, name: str, url: str, **kwargs):
+        return await self.recorder.request(self.client, name, "GET", url, **kwargs)
+
+    async def browse(self, user: VirtualUser) -> None:
+        params = {"page": random.randint(1, 5), "page_size": 20}
+        if self.category_ids and random.random() < 0.5:
+            params["category_id"] = random.choice(self.category_ids)
+        await self._get("GET /products/", "/products/", params=params)
+        await self._get("GET /categories/", "/categories/")
+
+    async def search(self, user: VirtualUser) -> None:
+        params = {"search": random.choice(SEARCH_TERMS), "page_size": 20}
+        if random.random() < 0.5:
+            params.update(min_price=10, max_price=500, in_stock=True)
+        await self._get("GET /products/?search", "/products/", params=params)
+
+    async def product_page(self, user: VirtualUser) -> None:
+        product_id = random.choice(self.product_ids)
+        await self._get("GET /products/{id}", f"/products/{product_id}")
+        await self._get(
+            "GET /reviews/products/{id}/reviews/", f"/reviews/products/{product_id}/reviews/",
+            params={"page_size": 10, "include_distribution": True},
+        )
+
+    async def login(self, user: VirtualUser) -> None:
+        await _login(self.client, self.recorder, user)
+
+    async def _add_to_cart(self, user: VirtualUser) -> int:
+        product_id = random.choice(self.product_ids)
+        await self.recorder.request(
+            self.client, "POST /cart/items", "POST", "/cart/items",
+            json={"product_id": product_id, "quantity": 1}, headers=user.headers,
+        )
+        return product_id
+
+    async def cart(self, user: VirtualUser) -> None:
+        product_id = await self._add_to_cart(user)
+        await self.recorder.request(
+            self.client, "PUT /cart/items/{id}", "PUT", f"/cart/items/{product_id}",
+            json={"quantity": random.randint(1, 3)}, headers=user.headers,
+        )
+        await self._get("GET /cart/", "/cart/", headers=user.headers)
+
+    async def checkout(self, user: VirtualUser) -> None:
+        await self._add_to_cart(user)
+        await self.recorder.request(self.client, "POST /orders/checkout", "POST", "/orders/checkout", headers=user.headers)
+        await self._get("GET /orders/", "/orders/", params={"view": "summary"}, headers=user.headers)
+
+    async def review(self, user: VirtualUser) -> None:
+        await self.recorder.request(
+            self.client, "POST /reviews/", "POST", "/reviews/",
+            json={"product_id": random.choice(self.product_ids), "grade": random.randint(1, 5), "comment": "loadtest"},
+            headers=user.headers,
+        )
+
+
+def _parse_scenarios(value: str) -> dict[str, int]:
+    weights = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if not hasattr(Scenarios, name) or name.startswith("_"):
+            raise argparse.ArgumentTypeError(f"Неизвестный сценарий: {name}")
+        weights[name] = int(weight or 1)
+    return weights
+
+
+async def _run_user(scenarios: Scenarios, user: VirtualUser, weights: dict[str, int], deadline: float) -> int:
+    names, counts = list(weights), list(weights.values())
+    iterations = 0
+    while time.perf_counter() < deadline:
+        await getattr(scenarios, random.choices(names, counts)[0])(user)
+        iterations += 1
+    return iterations
+
+
+@contextlib.asynccontextmanager
+async def _client(url: str | None):
+    if url:
+        async with httpx.AsyncClient(base_url=url, timeout=30) as client:
+            yield client
+        return
+    sys.path.insert(0, str(PROJECT_DIR))
+    from app.main import app
+
+    async with app.router.lifespan_context(app):
+        # Исключения приложения превращаются в 500 и попадают в статистику, а не обрывают тест
+        transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+        async with httpx.AsyncClient(transport=transport, base_url="http://loadtest", timeout=30) as client:
+            yield client
+
+
+def _git_revision() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=PROJECT_DIR, check=True, capture_output=True, text=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _summary(recorder: Recorder, elapsed: float) -> dict:
+    endpoints = {}
+    for name, stats in sorted(recorder.endpoints.items()):
+        latencies = sorted(stats.latencies)
+        endpoints[name] = {
+            "requests": len(latencies),
+            "errors": stats.errors,
+            "statuses": {str(code): count for code, count in sorted(stats.statuses.items())},
+            "rps": round(len(latencies) / elapsed, 2),
+            "mean_ms": round(sum(latencies) / len(latencies) * 1000, 3) if latencies else 0.0,
+            "p50_ms": round(_percentile(latencies, 50) * 1000, 3),
+            "p95_ms": round(_percentile(latencies, 95) * 1000, 3),
+            "p99_ms": round(_percentile(latencies, 99) * 1000, 3),
+        }
+    total = sum(endpoint["requests"] for endpoint in endpoints.values())
+    return {
+        "requests": total,
+        "errors": sum(endpoint["errors"] for endpoint in endpoints.values()),
+        "rps": round(total / elapsed, 2),
+        "endpoints": endpoints,
+    }
+
+
+def _print_report(summary: dict) -> None:
+    header = f"{'endpoint':40} {'req':>7} {'err':>5} {'rps':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}"
+    print(header)
+    print("-" * len(header))
+    for name, endpoint in summary["endpoints"].items():
+        print(
+            f"{name:40} {endpoint['requests']:>7} {endpoint['errors']:>5} {endpoint['rps']:>8.1f} "
+            f"{endpoint['p50_ms']:>9.2f} {endpoint['p95_ms']:>9.2f} {endpoint['p99_ms']:>9.2f}"
+        )
+    print("-" * len(header))
+    print(f"total: {summary['requests']} requests, {summary['errors']} errors, {summary['rps']:.1f} req/s")
+
+
+def _compare(summary: dict, baseline_path: Path, max_regression: float) -> bool:
+    """
+    Сравнивает p95 по эндпоинтам с прошлым прогоном. Возвращает False, если есть регрессии сверх порога.
+    """
+    baseline = json.loads(baseline_path.read_text(encoding="utf-8"))["summary"]["endpoints"]
+    ok = True
+    print(f"\ncompare p95 with {baseline_path} (max regression {max_regression:.0f}%):")
+    for name, endpoint in summary["endpoints"].items():
+        previous = baseline.get(name)
+        if not previous or not previous["p95_ms"]:
+            continue
+        change = (endpoint["p95_ms"] - previous["p95_ms"]) / previous["p95_ms"] * 100
+        regressed = change > max_regression
+        ok = ok and not regressed
+        print(f"  {name:40} {previous['p95_ms']:>9.2f} -> {endpoint['p95_ms']:>9.2f} ms ({change:+.1f}%)"
+              f"{'  REGRESSION' if regressed else ''}")
+    return ok
+
+
+async def run(args: argparse.Namespace) -> dict:
+    async with _client(args.url) as client:
+        virtual_users, product_ids, category_ids = await _prepare(client, args.users)
+        recorder = Recorder()
+        scenarios = Scenarios(client, recorder, product_ids, category_ids)
+        start = time.perf_counter()
+        deadline = start + args.duration
+        iterations = await asyncio.gather(
+            *(_run_user(scenarios, user, args.scenarios, deadline) for user in virtual_users)
+        )
+        elapsed = time.perf_counter() - start
+
+    return {
+        "started_at": datetime.now(timezone.utc).isoformat(),
+        "git_revision": _git_revision(),
+        "target": args.url or "asgi",
+        "config": {
+            "users": args.users,
+            "duration": args.duration,
+            "scenarios": args.scenarios,
+            "seed": args.seed,
+        },
+        "elapsed_seconds": round(elapsed, 3),
+        "iterations": sum(iterations),
+        "summary": _summary(recorder, elapsed),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Нагрузочный тест сценариев магазина")
+    parser.add_argument("--url", help="адрес запущенного сервера; без него приложение работает в процессе")
+    parser.add_argument("--users", type=int, default=10, help="число виртуальных пользователей")
+    parser.add_argument("--duration", type=float, default=30.0, help="длительность, секунды")
+    parser.add_argument("--scenarios", type=_parse_scenarios, default=_parse_scenarios(DEFAULT_SCENARIOS),
+                        help=f"веса сценариев, по умолчанию {DEFAULT_SCENARIOS}")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--output", type=Path, help="куда сохранить результаты в JSON")
+    parser.add_argument("--compare", type=Path, help="JSON прошлого прогона для сравнения p95")
+    parser.add_argument("--max-regression", type=float, default=10.0, help="допустимый рост p95, %%")
+    args = parser.parse_args()
+    random.seed(args.seed)
+
+    result = asyncio.run(run(args))
+    _print_report(result["summary"])
+    if args.output:
+        args.output.write_text(json.dumps(result, indent=2, ensure_ascii=False), encoding="utf-8")
+    if args.compare and not _compare(result["summary"], args.compare, args.max_regression):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()